@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark the lean pycocotools adapter (coco_adapter module) against the stock COCO/COCOeval workflow.
+
+Synthetic COCO-compatible structures (as produced by evaluation.convert_to_coco_structures()) of increasing size are
+evaluated with both workflows; the time spent in loading the results (COCO.loadRes()), summarizing the statistics
+(COCOeval.summarize()), and in total (including evaluate() and accumulate(), which are shared) is reported.
+
+Usage: python benchmarks/bench_coco_adapter.py
+"""
+import time
+import contextlib
+
+import numpy as np
+
+import pycocotools.coco
+import pycocotools.cocoeval
+
+from macvi_usv_odce_toolkit import coco_adapter
+
+
+def synthetic_structures(num_images, detections_per_image, seed=0, width=1280, height=720):
+    rng = np.random.RandomState(seed)
+
+    images = [{'id': i, 'width': width, 'height': height, 'file_name': f'{i:06d}.png'} for i in range(num_images)]
+    annotations = []
+    detections = []
+    for image_id in range(num_images):
+        for _ in range(detections_per_image):
+            w, h = rng.randint(4, 200), rng.randint(4, 160)
+            x, y = rng.randint(0, width - w), rng.randint(0, height - h)
+            annotations.append({
+                'id': len(annotations),
+                'image_id': image_id,
+                'category_id': 0,
+                'bbox': [x, y, w, h],
+                'iscrowd': int(rng.rand() < 0.05),
+                'area': int(w * h * rng.uniform(0.5, 1.0)),
+                'segmentation': [],
+                'ignore': 0,
+            })
+            detections.append({
+                'image_id': image_id,
+                'category_id': 0,
+                'bbox': [float(x + rng.randint(-5, 6)), float(y + rng.randint(-5, 6)), float(w), float(h)],
+                'score': 1,
+                'ignore': 0,
+            })
+
+    dataset = {
+        'info': {'year': 2023},
+        'categories': [{'id': 0, 'name': 'obstacle', 'supercategory': 'obstacle'}],
+        'annotations': annotations,
+        'images': images,
+    }
+    return dataset, detections
+
+
+def run(coco_class, cocoeval_class, dataset, detections, print_results=False):
+    timings = {}
+    with contextlib.redirect_stdout(None):
+        start_time = time.perf_counter()
+        if coco_class is pycocotools.coco.COCO:
+            coco_dataset = coco_class()
+            coco_dataset.dataset = dataset
+            coco_dataset.createIndex()
+        else:
+            coco_dataset = coco_class(dataset)
+        if print_results:
+            print(detections)
+
+        load_start = time.perf_counter()
+        coco_results = coco_dataset.loadRes(detections)
+        timings['loadRes'] = time.perf_counter() - load_start
+
+        coco_evaluation = cocoeval_class(coco_dataset, coco_results, iouType='bbox')
+        coco_evaluation.params.iouThrs = np.array([0.3, 0.3])
+        coco_evaluation.evaluate()
+        coco_evaluation.accumulate()
+
+        summarize_start = time.perf_counter()
+        coco_evaluation.summarize()
+        timings['summarize'] = time.perf_counter() - summarize_start
+        timings['total'] = time.perf_counter() - start_time
+
+    return timings, coco_evaluation.stats
+
+
+def main():
+    indices = list(coco_adapter.STATS_PRECISION_INDICES + coco_adapter.STATS_RECALL_INDICES)
+
+    print(f"{'images':>7s} {'dets':>7s} | {'loadRes [ms]':>21s} | {'summarize [ms]':>17s} | {'total [s]':>15s}")
+    print(f"{'':>7s} {'':>7s} | {'stock':>10s} {'lean':>10s} | {'stock':>8s} {'lean':>8s} | {'stock':>7s} {'lean':>7s}")
+    for num_images, detections_per_image in ((1000, 10), (4000, 10), (4000, 40)):
+        dataset, detections = synthetic_structures(num_images, detections_per_image)
+        # Each workflow modifies the structures in place, so give each its own copy
+        stock, stock_stats = run(
+            pycocotools.coco.COCO,
+            pycocotools.cocoeval.COCOeval,
+            *synthetic_structures(num_images, detections_per_image),
+            print_results=True,
+        )
+        lean, lean_stats = run(coco_adapter.LeanCOCO, coco_adapter.LeanCOCOeval, dataset, detections)
+        assert np.array_equal(stock_stats[indices], lean_stats[indices]), "Results differ!"
+
+        print(
+            f"{num_images:7d} {len(detections):7d} | "
+            f"{1000 * stock['loadRes']:10.1f} {1000 * lean['loadRes']:10.1f} | "
+            f"{1000 * stock['summarize']:8.2f} {1000 * lean['summarize']:8.2f} | "
+            f"{stock['total']:7.2f} {lean['total']:7.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ignore-region check of detections with the mask pyramid on synthetic high-resolution frames.
+
+Compares the per-box reference (utils.bbox_in_mask, one pass over each box's pixels) with the mask pyramid
+(mask_pyramid.MaskPyramid; building the pyramid, and deciding all boxes), and with mask_pyramid.boxes_in_mask(), which
+builds the pyramid only when the boxes cover a large part of the frame. Frames range from 720p to 4K; the decisions
+are checked to be identical.
+
+Usage: python benchmarks/bench_mask_pyramid.py
+"""
+import timeit
+
+import numpy as np
+
+from macvi_usv_odce_toolkit import mask_pyramid
+from macvi_usv_odce_toolkit import matching
+from macvi_usv_odce_toolkit import utils
+
+RESOLUTIONS = (
+    ('720p', 1280, 720),
+    ('1080p', 1920, 1080),
+    ('1440p', 2560, 1440),
+    ('4K', 3840, 2160),
+)
+
+
+def synthetic_ignore_mask(width, height, seed=0):
+    # Ignore regions: a band above the horizon, and a few blobs (e.g., own boat, reflections)
+    rng = np.random.RandomState(seed)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    mask[:int(height * 0.3), :] = 1
+    for _ in range(8):
+        cx, cy = rng.uniform(0, width), rng.uniform(height * 0.3, height)
+        rx, ry = rng.uniform(0.02, 0.1) * width, rng.uniform(0.02, 0.1) * height
+        yy, xx = np.ogrid[:height, :width]
+        mask[((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1] = 1
+    return mask
+
+
+def synthetic_detections(width, height, num_boxes, scale, seed=1):
+    # Boxes with log-normal sizes (relative to frame width), anywhere in the frame
+    rng = np.random.RandomState(seed)
+    wh = np.clip(rng.lognormal(mean=np.log(scale * width), sigma=0.7, size=(num_boxes, 2)), 2, None)
+    xy = rng.uniform(0, 1, size=(num_boxes, 2)) * [width, height] - wh / 2
+    return np.round(np.concatenate([np.clip(xy, 0, None), wh], axis=1))
+
+
+def bench(function, repeat=3):
+    number = 1
+    while timeit.timeit(function, number=number) < 0.2:
+        number *= 2
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    thr = matching.IGNORE_OVERLAP_THRESHOLD
+    print(f"Ignore-region check of detections (threshold {thr})")
+    print(
+        f"{'frame':>6} {'boxes':>6} {'box size':>9} {'reference':>11} {'pyramid':>11} {'(build)':>11} "
+        f"{'auto':>11} {'exact':>6} {'speed-up':>9}"
+    )
+    for name, width, height in RESOLUTIONS:
+        mask = synthetic_ignore_mask(width, height)
+        for num_boxes, scale in ((20, 0.03), (100, 0.03), (100, 0.1), (500, 0.05)):
+            boxes = synthetic_detections(width, height, num_boxes, scale)
+
+            expected = np.array([utils.bbox_in_mask(mask, box, thr=thr) for box in boxes], dtype=bool)
+            pyramid = mask_pyramid.MaskPyramid(mask)
+            assert np.array_equal(pyramid.boxes_in_mask(boxes, thr=thr), expected)
+            assert np.array_equal(mask_pyramid.boxes_in_mask(mask, boxes, thr=thr), expected)
+
+            t_reference = bench(lambda: [utils.bbox_in_mask(mask, box, thr=thr) for box in boxes])
+            t_build = bench(lambda: mask_pyramid.MaskPyramid(mask))
+            t_pyramid = bench(lambda: mask_pyramid.MaskPyramid(mask).boxes_in_mask(boxes, thr=thr))
+            t_auto = bench(lambda: mask_pyramid.boxes_in_mask(mask, boxes, thr=thr))
+            print(
+                f"{name:>6} {num_boxes:6d} {scale:8.0%}w {t_reference * 1e3:9.2f}ms {t_pyramid * 1e3:9.2f}ms "
+                f"{t_build * 1e3:9.2f}ms {t_auto * 1e3:9.2f}ms {pyramid.num_exact_sums:6d} "
+                f"{t_reference / t_auto:8.1f}x"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark spatial candidate pruning for IoU computation on synthetic crowded frames.
+
+Compares brute-force IoU (pycocotools.mask.iou, all N x M pairs) with the pruned computation
+(utils.compute_sparse_iou), and frame-level evaluation (matching.evaluate_frame) with and without pruning against
+pycocotools' per-image evaluation (COCOeval.evaluate) of the same frame.
+
+Usage: python benchmarks/bench_spatial_pruning.py
+"""
+import timeit
+import contextlib
+
+import numpy as np
+
+import pycocotools.coco
+import pycocotools.cocoeval
+import pycocotools.mask
+
+from macvi_usv_odce_toolkit import matching
+from macvi_usv_odce_toolkit import utils
+
+
+def crowded_frame(num_boxes, seed=0, width=3840, height=2160):
+    rng = np.random.RandomState(seed)
+    xy = rng.uniform(0, 1, size=(num_boxes, 2)) * [width, height]
+    wh = rng.lognormal(mean=3.0, sigma=0.8, size=(num_boxes, 2))
+    return np.round(np.concatenate([xy, wh], axis=1))
+
+
+def bench(function, repeat=5):
+    number = 1
+    while timeit.timeit(function, number=number) < 0.2:
+        number *= 2
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def pycocotools_frame_evaluation(gt_boxes, gt_areas, det_boxes):
+    with contextlib.redirect_stdout(None):
+        coco_dataset = pycocotools.coco.COCO()
+        coco_dataset.dataset = {
+            'images': [{'id': 0, 'width': 3840, 'height': 2160}],
+            'categories': [{'id': 0, 'name': 'obstacle'}],
+            'annotations': [
+                {'id': i + 1, 'image_id': 0, 'category_id': 0, 'bbox': list(bbox), 'area': area, 'iscrowd': 0}
+                for i, (bbox, area) in enumerate(zip(gt_boxes.tolist(), gt_areas.tolist()))
+            ],
+        }
+        coco_dataset.createIndex()
+        coco_results = coco_dataset.loadRes([
+            {'image_id': 0, 'category_id': 0, 'bbox': list(bbox), 'score': 1} for bbox in det_boxes.tolist()
+        ])
+        coco_evaluation = pycocotools.cocoeval.COCOeval(coco_dataset, coco_results, iouType='bbox')
+        coco_evaluation.params.iouThrs = np.array([0.3, 0.3])
+
+    def _evaluate():
+        with contextlib.redirect_stdout(None):
+            coco_evaluation.evaluate()
+
+    return _evaluate
+
+
+def main():
+    print("IoU computation (N detections x N ground-truth boxes)")
+    print(f"{'N':>6} {'pairs':>10} {'brute force':>12} {'pruned':>12} {'speed-up':>9}")
+    for num_boxes in (100, 500, 1000, 2000, 5000):
+        det_boxes = crowded_frame(num_boxes, seed=1)
+        gt_boxes = crowded_frame(num_boxes, seed=2)
+        iscrowd = [0] * num_boxes
+
+        t_dense = bench(lambda: pycocotools.mask.iou(det_boxes, gt_boxes, iscrowd))
+        t_sparse = bench(lambda: utils.compute_sparse_iou(det_boxes, gt_boxes))
+        num_pairs = len(utils.find_overlapping_pairs(det_boxes, gt_boxes)[0])
+        print(
+            f"{num_boxes:6d} {num_pairs:10d} {t_dense * 1e3:10.2f}ms {t_sparse * 1e3:10.2f}ms "
+            f"{t_dense / t_sparse:8.1f}x"
+        )
+
+    print()
+    print(f"Frame evaluation ({matching.MAX_DETECTIONS} detections, N ground-truth boxes)")
+    print(f"{'N':>6} {'pycocotools':>12} {'brute force':>12} {'pruned':>12} {'speed-up':>9}")
+    for num_boxes in (500, 1000, 2000, 5000):
+        gt_boxes = crowded_frame(num_boxes, seed=3)
+        gt_areas = gt_boxes[:, 2] * gt_boxes[:, 3]
+        gt_iscrowd = np.zeros(num_boxes, dtype=bool)
+        gt_ids = np.arange(1, num_boxes + 1)
+        det_boxes = gt_boxes[:matching.MAX_DETECTIONS] + 2
+
+        def _evaluate(prune):
+            ious = matching.compute_ious(det_boxes, gt_boxes, gt_iscrowd, prune=prune)
+            return matching.evaluate_frame(gt_boxes, gt_areas, gt_iscrowd, gt_ids, det_boxes, ious=ious)
+
+        t_coco = bench(pycocotools_frame_evaluation(gt_boxes, gt_areas, det_boxes), repeat=1)
+        t_dense = bench(lambda: _evaluate(False))
+        t_sparse = bench(lambda: _evaluate(True))
+        print(
+            f"{num_boxes:6d} {t_coco * 1e3:10.2f}ms {t_dense * 1e3:10.2f}ms {t_sparse * 1e3:10.2f}ms "
+            f"{t_coco / t_sparse:8.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
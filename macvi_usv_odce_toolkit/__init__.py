@@ -1,3 +1,5 @@
+__version__ = "1.0"
+
 from . import evaluation
 
 
@@ -77,4 +79,13 @@ def evaluate_detection_results_lars(lars_path, eval_set, results_json_file):
         # Setup 2: sea-edge based mask, ignore class information
         # mode='edge',
         # ignore_class=True,
-    )
\ No newline at end of file
+    )
+
+def evaluate_detections_lars(dataset, detections):
+    """
+    Evaluate in-memory detections (keyed by image ID) on a pre-loaded LaRS subset (dataset.LarsSubset), without
+    going through a results JSON file.
+
+    This function is a helper wrapper for evaluation.evaluate_detections() function.
+    """
+    return evaluation.evaluate_detections(dataset, detections)
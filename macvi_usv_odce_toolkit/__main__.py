@@ -5,10 +5,46 @@ import logging
 import time
 import zipfile
 import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import concurrent.futures
 
+from . import __version__
+from .dataset import LarsSubset, lars_file_exists, subset_fingerprint
+from . import diff
 from . import evaluation
+from . import hard_examples
+from . import partial
+from . import rank
+from . import render
+from . import result_store
+from . import results_io
+from . import sampling
+from . import sensitivity
+from . import submission
+from . import utils
+from . import validation
+from . import worker
 
-def _perform_full_evaluation(lars_path, eval_set, results_json_file):
+# Evaluation parameters that affect the results; part of the result store key
+_RESULT_STORE_PARAMETERS = {'iou_threshold': 0.3}
+
+# Size up to which non-seekable results files are spooled in memory (rather than to a temporary file on disk)
+_SPOOLED_FILE_MAX_SIZE = 16 * 1024 * 1024
+
+def _load_dataset_and_results(lars_path, eval_set, results_json_file, dataset=None, results=None):
+    # Load the dataset subset and the results, unless they were already loaded (e.g., by the validation)
+    if dataset is None or results is None:
+        logging.info("Loading dataset and results...")
+    if dataset is None:
+        dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+    if results is None:
+        results = results_io.load_results(results_json_file, dataset=dataset)
+    return dataset, results
+
+def _perform_full_evaluation(lars_path, eval_set, results_json_file, num_workers=None, dataset=None, results=None):
 
     logging.info("Evaluating...")
     start_time = time.time()
@@ -16,18 +52,248 @@ def _perform_full_evaluation(lars_path, eval_set, results_json_file):
         lars_path,
         eval_set,
         results_json_file,
+        dataset=dataset,
+        num_workers=num_workers,
+        results=results,
     )
     elapsed = time.time() - start_time
     logging.info("Evaluation complete in %.2f seconds!", elapsed)
 
     return results
 
+def _perform_columnar_evaluation(lars_path, eval_set, results_npz_file, dataset=None, results=None):
+
+    if results is not None:
+        # Already parsed (e.g., by the validation); the detection lists are evaluated in the same way as the columns
+        detections = {frame['image_id']: frame.get('detections', []) for frame in results['annotations']}
+    else:
+        logging.info("Loading results...")
+        detections = results_io.columns_to_detections(results_io.load_columns(results_npz_file))
+    if dataset is None:
+        logging.info("Loading dataset...")
+        dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+
+    logging.info("Evaluating...")
+    start_time = time.time()
+    results = evaluation.evaluate_detections(dataset, detections)
+    elapsed = time.time() - start_time
+    logging.info("Evaluation complete in %.2f seconds!", elapsed)
+
+    return results
+
+def _perform_streaming_evaluation(lars_path, eval_set, results_json_file, progress_interval=10.0, dataset=None,
+                                  results=None):
+
+    dataset, results = _load_dataset_and_results(lars_path, eval_set, results_json_file, dataset, results)
+
+    logging.info("Evaluating...")
+    num_frames = len(dataset)
+    start_time = time.time()
+    last_report_time = start_time
+    accumulator = None
+    for _, accumulator in evaluation.stream_detection_results(dataset, results):
+        now = time.time()
+        if progress_interval is not None and now - last_report_time >= progress_interval:
+            last_report_time = now
+            elapsed = now - start_time
+            eta = elapsed / accumulator.num_frames * (num_frames - accumulator.num_frames)
+            logging.info(
+                "Processed %d/%d frames (%.1f%%), elapsed %.1f s, ETA %.1f s; partial F_all: %.03f",
+                accumulator.num_frames,
+                num_frames,
+                100 * accumulator.num_frames / num_frames,
+                elapsed,
+                eta,
+                accumulator.f_scores()[0],
+            )
+
+    results = accumulator.f_scores() if accumulator is not None else (0, 0, 0, 0)
+    elapsed = time.time() - start_time
+    logging.info("Evaluation complete in %.2f seconds!", elapsed)
+
+    return results
+
+def _perform_stored_evaluation(lars_path, eval_set, results_json_file, evaluation_function, use_store=True,
+                               max_entries=result_store.DEFAULT_MAX_ENTRIES):
+    # Look up the results in the result store, and fall back to evaluation_function(results_json_file) if they are not
+    # there (or the store is disabled or unavailable).
+    if not use_store:
+        return evaluation_function(results_json_file)
+
+    if hasattr(results_json_file, 'read'):
+        # The file needs to be read twice (hashed in a streaming pass, then evaluated). Archive members can be rewound
+        # (by re-reading them from the start); other non-seekable files are spooled to a temporary file.
+        if not results_json_file.seekable():
+            spooled_file = tempfile.SpooledTemporaryFile(max_size=_SPOOLED_FILE_MAX_SIZE)
+            shutil.copyfileobj(results_json_file, spooled_file)
+            spooled_file.seek(0)
+            results_json_file = spooled_file
+        results_hash = utils.file_sha256(results_json_file)
+        results_json_file.seek(0)
+    else:
+        results_hash = utils.file_sha256(results_json_file)
+    key = result_store.make_key(results_hash, subset_fingerprint(lars_path, eval_set), _RESULT_STORE_PARAMETERS)
+
+    store = result_store.open_store(max_entries=max_entries)
+    if store is None:
+        return evaluation_function(results_json_file)
+
+    # Store errors (e.g., a locked or corrupted database) are not fatal; the results are evaluated and returned without
+    # the store
+    with store:
+        try:
+            results = store.get(key)
+        except (sqlite3.Error, ValueError) as e:
+            logging.warning("Failed to look up stored evaluation results: %s", e)
+            results = None
+        if results is not None:
+            logging.info("Using stored evaluation results (results file SHA-256: %s).", results_hash)
+            return tuple(results)
+
+        results = evaluation_function(results_json_file)
+        try:
+            store.put(key, [float(value) for value in results])
+        except sqlite3.Error as e:
+            logging.warning("Failed to store evaluation results: %s", e)
+
+    return results
+
+def _perform_sampled_evaluation(lars_path, eval_set, results_json_file, sample, seed=sampling.DEFAULT_SEED,
+                                confidence=sampling.DEFAULT_CONFIDENCE, dataset=None, results=None):
+
+    dataset, results = _load_dataset_and_results(lars_path, eval_set, results_json_file, dataset, results)
+
+    logging.info("Evaluating sampled frames...")
+    start_time = time.time()
+    report = sampling.evaluate_sampled_frames(dataset, results, sample, seed=seed, confidence=confidence)
+    elapsed = time.time() - start_time
+    logging.info(
+        "Evaluation of %d/%d frames complete in %.2f seconds!",
+        report['num_sampled_frames'],
+        report['num_frames'],
+        elapsed,
+    )
+
+    return report
+
+def _perform_shard_evaluation(lars_path, eval_set, results_json_file, shard_index, num_shards,
+                              shard_by=partial.SHARD_BY_SEQUENCE, dataset=None, results=None):
+
+    dataset, results = _load_dataset_and_results(lars_path, eval_set, results_json_file, dataset, results)
+
+    logging.info("Evaluating shard %d/%d...", shard_index, num_shards)
+    start_time = time.time()
+    shard_result = partial.evaluate_shard(
+        dataset,
+        results,
+        shard_index,
+        num_shards,
+        shard_by=shard_by,
+        metadata={
+            'dataset': subset_fingerprint(lars_path, eval_set),
+            'results': utils.file_sha256(results_json_file),
+        },
+        iou_threshold=_RESULT_STORE_PARAMETERS['iou_threshold'],
+    )
+    elapsed = time.time() - start_time
+    logging.info(
+        "Evaluation of %d/%d frames complete in %.2f seconds!",
+        len(shard_result['frame_index']),
+        len(dataset),
+        elapsed,
+    )
+
+    return shard_result
+
+def _perform_class_evaluation(lars_path, eval_set, results_json_file, dataset=None, results=None):
+
+    dataset, results = _load_dataset_and_results(lars_path, eval_set, results_json_file, dataset, results)
+
+    logging.info("Evaluating (per class)...")
+    start_time = time.time()
+    report = evaluation.evaluate_classes(dataset, results)
+    elapsed = time.time() - start_time
+    logging.info("Evaluation of %d classes complete in %.2f seconds!", len(report['classes']), elapsed)
+
+    return report
+
+def _perform_validation(lars_path, eval_set, results_json_file, max_examples=validation.DEFAULT_MAX_EXAMPLES,
+                        dataset=None):
+    # Returns the validation report, and the parsed results (None if the results file could not be parsed), so that
+    # the evaluation can reuse them
+
+    logging.info("Validating results file...")
+    start_time = time.time()
+    if dataset is None:
+        dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+    results = None
+    try:
+        results = results_io.load_results(results_json_file, dataset=dataset)
+    except (ValueError, OSError, zipfile.BadZipFile) as e:
+        file_format = "NPZ" if results_io.is_npz_results(results_json_file) else "JSON"
+        report = {'valid': False, 'num_frames': 0, 'num_detections': 0, 'warnings': [], 'errors': [{
+            'severity': 'error',
+            'code': f'invalid-{file_format.lower()}',
+            'message': f"Results file is not valid {file_format}: {e}",
+            'count': 1,
+            'examples': [],
+        }]}
+    else:
+        report = validation.validate_detection_results(dataset, results, max_examples=max_examples)
+    elapsed = time.time() - start_time
+
+    for issue in report['errors']:
+        logging.error("%s", validation.format_issue(issue))
+    for issue in report['warnings']:
+        logging.warning("%s", validation.format_issue(issue))
+    logging.info(
+        "Validation complete in %.2f seconds: %d error(s), %d warning(s).",
+        elapsed,
+        len(report['errors']),
+        len(report['warnings']),
+    )
+
+    return report, results
+
 def _display_extended_results(results):
     # Display extended results to stderr, using logging.info()
     logging.info("Results: F_all F_small F_medium F_large")
     logging.info("Setup_2: %.03f %.03f %.03f %.03f", *results)
     logging.info("")
 
+def _display_sampled_results(report):
+    # Display estimated results with their confidence bounds: extended to stderr, short to stdout
+    logging.info("Estimated results (%d/%d frames, %.0f%% confidence bounds):",
+                 report['num_sampled_frames'], report['num_frames'], 100 * report['confidence'])
+    for name, f, lower, upper in zip(
+        ("F_all", "F_small", "F_medium", "F_large"),
+        report['f_scores'],
+        report['lower'],
+        report['upper'],
+    ):
+        logging.info(" - %s: %.03f [%.03f, %.03f]", name, f, lower, upper)
+    logging.info("")
+
+    print("Estimated challenge results F1:")
+    print(json.dumps({
+        'F1': 100 * report['f_scores'][0],
+        'F1_lower': 100 * report['lower'][0],
+        'F1_upper': 100 * report['upper'][0],
+    }))
+
+def _display_class_results(report):
+    # Display per-class results to stderr, using logging.info()
+    logging.info("Per-class results: F_all F_small F_medium F_large (annotations, detections)")
+    for entry in report['classes']:
+        logging.info(
+            "Class %d: %.03f %.03f %.03f %.03f (%d, %d)",
+            entry['category_id'],
+            *entry['f_scores'],
+            entry['num_gt'],
+            entry['num_detections'],
+        )
+    logging.info("")
+
 def _display_final_results(results):
 
     # Display final results to stdout
@@ -40,14 +306,47 @@ def _display_final_results(results):
 
     print(json.dumps(res))
 
-def _collect_to_archive(archive, path, archive_path):
+class _ArchiveCancelled(Exception):
+    pass
+
+def _collect_to_archive(archive, path, archive_path, cancel_event=None):
+    # Stops with _ArchiveCancelled before the next file once cancel_event (if given) is set
+    if cancel_event is not None and cancel_event.is_set():
+        raise _ArchiveCancelled()
     if os.path.isfile(path):
         archive.write(path, archive_path)
     elif os.path.isdir(path):
         if archive_path:
             archive.write(path, archive_path)
         for nm in sorted(os.listdir(path)):
-            _collect_to_archive(archive, os.path.join(path, nm), os.path.join(archive_path, nm))
+            _collect_to_archive(archive, os.path.join(path, nm), os.path.join(archive_path, nm), cancel_event)
+
+def _build_submission_archive(archive_file, results_json_file, source_code_path, cancel_event=None):
+    # Build the submission archive; the (partially written) archive file is removed on failure or cancellation
+    start_time = time.time()
+    try:
+        with zipfile.ZipFile(archive_file, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            # Collect raw detection results JSON as detection_results.json
+            logging.info("Collecting raw results file %r...", results_json_file)
+            archive.write(results_json_file, "detection_results.json")
+
+            # Collect source code into source_code directory
+            logging.info("Collecting source code from %r...", source_code_path)
+            archive.writestr("source_code/", "")  # Create empty directory
+            _collect_to_archive(
+                archive,
+                source_code_path,
+                os.path.join("source_code", os.path.basename(source_code_path)),
+                cancel_event,
+            )
+            num_members = len(archive.infolist())
+    except BaseException:
+        if os.path.exists(archive_file):
+            os.remove(archive_file)
+        raise
+
+    elapsed = time.time() - start_time
+    logging.info("Archive with %d members complete in %.2f seconds!", num_members, elapsed)
 
 def cmd_evaluate(args):
     """
@@ -74,10 +373,169 @@ def cmd_evaluate(args):
     logging.info(" - evaluation subset: %r", eval_set)
     logging.info(" - results JSON file: %r", results_json_file)
     logging.info(" - output file: %r", output_file)
+    logging.info(" - validate: %r", not args.no_validate)
+    logging.info(" - use result store: %r", not args.no_cache)
+    logging.info(" - streaming: %r", args.streaming)
+    if args.streaming:
+        logging.info(" - progress interval: %r", args.progress_interval)
+    logging.info(" - sample: %r", args.sample)
+    if args.sample is not None:
+        logging.info(" - sample seed: %r", args.sample_seed)
+        logging.info(" - confidence: %r", args.confidence)
+    logging.info(" - per class: %r", args.per_class)
+    logging.info(" - shard: %r", args.shard)
+    if args.shard is not None:
+        logging.info(" - shard by: %r", args.shard_by)
+    logging.info(" - pycocotools workers: %r", args.coco_workers)
     logging.info("")
 
+    if sum((args.shard is not None, args.sample is not None, args.per_class)) > 1:
+        logging.error("Options --shard, --sample, and --per-class are mutually exclusive!")
+        sys.exit(-1)
+    if args.shard is not None and not output_file:
+        logging.error("Shard evaluation requires --output-file for the partial result!")
+        sys.exit(-1)
+
+    # The dataset subset and the parsed results are shared by the validation and the evaluation, so that neither is
+    # loaded twice; without validation, the results are parsed by the evaluation
+    dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+    parsed_results = None
+
+    # Fail fast on malformed results
+    if not args.no_validate:
+        report, parsed_results = _perform_validation(lars_path, eval_set, results_json_file, dataset=dataset)
+        if not report['valid']:
+            logging.error("Invalid results file; see errors above!")
+            sys.exit(-1)
+        logging.info("")
+
+    # Quick-look evaluation of sampled frames; estimates are not stored in the result store
+    if args.sample is not None:
+        report = _perform_sampled_evaluation(
+            lars_path,
+            eval_set,
+            results_json_file,
+            args.sample,
+            seed=args.sample_seed,
+            confidence=args.confidence,
+            dataset=dataset,
+            results=parsed_results,
+        )
+        _display_sampled_results(report)
+
+        if output_file:
+            logging.info("")
+            logging.info("Saving estimated evaluation results to %r...", output_file)
+            with open(output_file, "w") as fp:
+                json.dump(report, fp, indent=2)
+
+        logging.info("")
+        logging.info("Done!")
+        return
+
+    # Class-agnostic and per-class evaluation in a single pass; not stored in the result store
+    if args.per_class:
+        try:
+            report = _perform_class_evaluation(
+                lars_path,
+                eval_set,
+                results_json_file,
+                dataset=dataset,
+                results=parsed_results,
+            )
+        except ValueError as e:
+            logging.error("Failed to evaluate per class: %s", e)
+            sys.exit(-1)
+
+        # Display debug/extended results
+        _display_extended_results(report['f_scores'])
+        _display_class_results(report)
+
+        # Display actual (short) results
+        _display_final_results(report['f_scores'])
+
+        if output_file:
+            logging.info("")
+            logging.info("Saving evaluation results to %r...", output_file)
+            with open(output_file, "w") as fp:
+                json.dump(report, fp, indent=2)
+
+        logging.info("")
+        logging.info("Done!")
+        return
+
+    # Evaluation of a single shard; the partial result is merged with those of other shards by the merge command
+    if args.shard is not None:
+        shard_index, num_shards = args.shard
+        shard_result = _perform_shard_evaluation(
+            lars_path,
+            eval_set,
+            results_json_file,
+            shard_index,
+            num_shards,
+            shard_by=args.shard_by,
+            dataset=dataset,
+            results=parsed_results,
+        )
+
+        logging.info("")
+        logging.info("Saving partial result to %r...", output_file)
+        partial.save_partial(output_file, shard_result)
+
+        logging.info("")
+        logging.info("Done!")
+        return
+
     # Run the evaluation
-    results = _perform_full_evaluation(lars_path, eval_set, results_json_file)
+    if args.streaming:
+        results = _perform_stored_evaluation(
+            lars_path,
+            eval_set,
+            results_json_file,
+            lambda results_json_file: _perform_streaming_evaluation(
+                lars_path,
+                eval_set,
+                results_json_file,
+                progress_interval=args.progress_interval,
+                dataset=dataset,
+                results=parsed_results,
+            ),
+            use_store=not args.no_cache,
+            max_entries=args.cache_max_entries,
+        )
+    elif results_io.is_npz_results(results_json_file):
+        # Columnar results are evaluated without constructing per-detection objects (native matching, identical
+        # results to pycocotools)
+        results = _perform_stored_evaluation(
+            lars_path,
+            eval_set,
+            results_json_file,
+            lambda results_npz_file: _perform_columnar_evaluation(
+                lars_path,
+                eval_set,
+                results_npz_file,
+                dataset=dataset,
+                results=parsed_results,
+            ),
+            use_store=not args.no_cache,
+            max_entries=args.cache_max_entries,
+        )
+    else:
+        results = _perform_stored_evaluation(
+            lars_path,
+            eval_set,
+            results_json_file,
+            lambda results_json_file: _perform_full_evaluation(
+                lars_path,
+                eval_set,
+                results_json_file,
+                num_workers=args.coco_workers,
+                dataset=dataset,
+                results=parsed_results,
+            ),
+            use_store=not args.no_cache,
+            max_entries=args.cache_max_entries,
+        )
 
     # Display debug/extended results
     _display_extended_results(results)
@@ -97,6 +555,59 @@ def cmd_evaluate(args):
     logging.info("Done!")
 
 
+def cmd_validate(args):
+    """
+    Command handler: validate
+
+    Validates the detection results file against the dataset subset's annotations (without decoding any masks), and
+    prints the report to standard output. Exits with an error if the results file is invalid.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    lars_path = getattr(args, 'lars-path')
+    eval_set = getattr(args, 'eval-set')
+    results_json_file = getattr(args, 'results-json-file')
+    output_file = args.output_file
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - LaRS path: %r", lars_path)
+    logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - results JSON file: %r", results_json_file)
+    logging.info(" - max examples: %r", args.max_examples)
+    logging.info(" - output file: %r", output_file)
+    logging.info("")
+
+    report, _ = _perform_validation(lars_path, eval_set, results_json_file, max_examples=args.max_examples)
+    logging.info("")
+
+    # Display the report
+    print(f"Frames: {report['num_frames']}, detections: {report['num_detections']}")
+    print(f"Errors: {len(report['errors'])}, warnings: {len(report['warnings'])}")
+    for issue in report['errors'] + report['warnings']:
+        print(f"{issue['severity']}: {validation.format_issue(issue)}")
+
+    # Save
+    if output_file:
+        logging.info("")
+        logging.info("Saving validation report to %r...", output_file)
+        with open(output_file, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+    if not report['valid']:
+        sys.exit(-1)
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
 def cmd_prepare_submission(args):
     """
     Command handler: prepare-submission
@@ -129,6 +640,8 @@ def cmd_prepare_submission(args):
     logging.info(" - results JSON file: %r", results_json_file)
     logging.info(" - source code path: %r", source_code_path)
     logging.info(" - output file: %r", output_file)
+    logging.info(" - use result store: %r", not args.no_cache)
+    logging.info(" - pycocotools workers: %r", args.coco_workers)
     logging.info("")
 
     # Validate source code file/directory
@@ -136,37 +649,68 @@ def cmd_prepare_submission(args):
         logging.error("Invalid source code path %r: not a file or directory!", source_code_path)
         sys.exit(-1)
 
-    # Run the evaluation if annotations are present
-    annotations_path = os.path.join(lars_path,eval_set,'panoptic_annotations.json')
-    if os.path.exists(annotations_path):
-        logging.info("Performing evaluation")
-        results = _perform_full_evaluation(lars_path, eval_set, results_json_file)
+    # The evaluation and the construction of the submission archive are independent, so the archive is built in a
+    # background thread (compression and file I/O release the GIL) while the evaluation runs. The archive is written
+    # to a temporary file, which replaces the output file only if both steps succeed.
+    logging.info("Preparing submission archive %r...", output_file)
+    start_time = time.time()
+    tmp_output_file = f"{output_file}.{os.getpid()}.tmp"
+    cancel_event = threading.Event()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        archive_future = executor.submit(
+            _build_submission_archive,
+            tmp_output_file,
+            results_json_file,
+            source_code_path,
+            cancel_event,
+        )
+
+        try:
+            # Run the evaluation if annotations are present
+            if lars_file_exists(lars_path, f'{eval_set}/panoptic_annotations.json'):
+                logging.info("Performing evaluation")
+                results = _perform_stored_evaluation(
+                    lars_path,
+                    eval_set,
+                    results_json_file,
+                    lambda results_json_file: _perform_full_evaluation(
+                        lars_path,
+                        eval_set,
+                        results_json_file,
+                        num_workers=args.coco_workers,
+                    ),
+                    use_store=not args.no_cache,
+                    max_entries=args.cache_max_entries,
+                )
+            else:
+                logging.info("Dataset annotations not found")
+                results = None
+        except BaseException:
+            # Cancel the archive, and propagate the evaluation error
+            cancel_event.set()
+            concurrent.futures.wait([archive_future])
+            if os.path.exists(tmp_output_file):
+                os.remove(tmp_output_file)
+            raise
+
+        try:
+            archive_future.result()
+        except Exception as e:
+            logging.error("Failed to prepare submission archive: %s", e)
+            sys.exit(-1)
+
+    os.replace(tmp_output_file, output_file)
+    elapsed = time.time() - start_time
+    logging.info("Evaluation and submission archive complete in %.2f seconds!", elapsed)
+
+    if results is not None:
+        logging.info("")
 
         # Display debug/extended results
         _display_extended_results(results)
 
         # Display actual (short) results
         _display_final_results(results)
-    else:
-        logging.info("Dataset annotations not found")
-
-    # Prepare submission archive
-    logging.info("")
-    logging.info("Preparing submission archive %r...", output_file)
-
-    with zipfile.ZipFile(output_file, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
-        # Collect raw detection results JSON as detection_results.json
-        logging.info("Collecting raw results file %r...", results_json_file)
-        archive.write(results_json_file, "detection_results.json")
-
-        # Collect source code into source_code directory
-        logging.info("Collecting source code from %r...", source_code_path)
-        archive.writestr("source_code/", "")  # Create empty directory
-        _collect_to_archive(
-            archive,
-            source_code_path,
-            os.path.join("source_code", os.path.basename(source_code_path)),
-        )
 
     # Done
     logging.info("")
@@ -178,7 +722,8 @@ def cmd_unpack_submission(args):
     Command handler: unpack-submission
 
     Unpacks the submission archive to target location, and prints the evaluation results to standard output.
-    Can optionally perform re-evaluation of raw results using local copy of toolkit and dataset.
+    Can optionally perform re-evaluation of raw results using local copy of toolkit and dataset. With --no-extract,
+    the results are read directly from the archive, and only the source code is extracted (if requested).
 
     Parameters
     ----------
@@ -191,6 +736,8 @@ def cmd_unpack_submission(args):
     # optional arguments
     eval_set = args.eval_set
     lars_path = args.lars_path
+    no_extract = args.no_extract
+    extract_source_code = args.extract_source_code
 
     if eval_set is None:
         eval_set = 'test'
@@ -203,27 +750,80 @@ def cmd_unpack_submission(args):
     logging.info(" - target path: %r", target_path)
     logging.info(" - LaRS path: %r", lars_path)
     logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - extract archive: %r", not no_extract)
+    logging.info(" - extract source code: %r", extract_source_code or not no_extract)
+    logging.info(" - use result store: %r", not args.no_cache)
     logging.info("")
 
-    # Unpack submission
-    logging.info("Unpacking submission...")
-    os.makedirs(target_path, exist_ok=False)  # Raise exception if trying to unpack into existing directory
+    if target_path is None and (not no_extract or extract_source_code):
+        logging.error("Target path is required when extracting the archive!")
+        sys.exit(-1)
+
     with zipfile.ZipFile(submission_file, mode="r") as archive:
-        archive.extractall(target_path)
-    logging.info("")
+        # Validate archive members before touching their contents
+        try:
+            submission.check_archive_members(
+                archive,
+                max_member_size=args.max_member_size,
+                max_total_size=args.max_total_size,
+                max_compression_ratio=args.max_compression_ratio,
+            )
+            # The raw results (for re-evaluation) or the submitted evaluation results must be present
+            required_member = submission.DETECTION_RESULTS_MEMBER if lars_path else submission.EVALUATION_RESULTS_MEMBER
+            submission.open_archive_member(archive, required_member).close()
+        except ValueError as e:
+            logging.error("Invalid submission archive: %s", e)
+            sys.exit(-1)
 
-    # Local re-evaluation?
-    if lars_path:
-        results_json_file = os.path.join(target_path, "detection_results.json")
-        logging.info("Performing local re-evaluation of raw results...")
-        results = _perform_full_evaluation(lars_path, eval_set, results_json_file)
+        # Unpack submission
+        if not no_extract:
+            logging.info("Unpacking submission...")
+            os.makedirs(target_path, exist_ok=False)  # Raise exception if trying to unpack into existing directory
+            archive.extractall(target_path)
+            logging.info("")
+        elif extract_source_code:
+            logging.info("Extracting source code...")
+            os.makedirs(target_path, exist_ok=False)  # Raise exception if trying to unpack into existing directory
+            count = submission.extract_archive_members(archive, target_path, prefix=submission.SOURCE_CODE_PREFIX)
+            logging.info("Extracted %d member(s).", count)
+            logging.info("")
 
-    else:
-        evaluation_json_file = os.path.join(target_path, "evaluation_results.json")
-        logging.info("Using submitted evaluation results...")
-        with open(evaluation_json_file, 'r') as fp:
-            results = json.load(fp)
-    logging.info("")
+        # Local re-evaluation?
+        if lars_path:
+            logging.info("Performing local re-evaluation of raw results...")
+            def _evaluate(results_json_file):
+                return _perform_full_evaluation(lars_path, eval_set, results_json_file)
+
+            if no_extract:
+                with submission.open_archive_member(archive, submission.DETECTION_RESULTS_MEMBER) as fp:
+                    results = _perform_stored_evaluation(
+                        lars_path,
+                        eval_set,
+                        fp,
+                        _evaluate,
+                        use_store=not args.no_cache,
+                        max_entries=args.cache_max_entries,
+                    )
+            else:
+                results_json_file = os.path.join(target_path, submission.DETECTION_RESULTS_MEMBER)
+                results = _perform_stored_evaluation(
+                    lars_path,
+                    eval_set,
+                    results_json_file,
+                    _evaluate,
+                    use_store=not args.no_cache,
+                    max_entries=args.cache_max_entries,
+                )
+        else:
+            logging.info("Using submitted evaluation results...")
+            if no_extract:
+                with submission.open_archive_member(archive, submission.EVALUATION_RESULTS_MEMBER) as fp:
+                    results = json.load(fp)
+            else:
+                evaluation_json_file = os.path.join(target_path, submission.EVALUATION_RESULTS_MEMBER)
+                with open(evaluation_json_file, 'r') as fp:
+                    results = json.load(fp)
+        logging.info("")
 
     # Display debug/extended results
     _display_extended_results(results)
@@ -232,93 +832,845 @@ def cmd_unpack_submission(args):
     _display_final_results(results)
 
 
-def main(args=None):
+def cmd_worker(args):
     """
-    Entry-point function.
+    Command handler: worker
+
+    Watches the inbox directory for submission archives, evaluates them using a pool of worker processes that keep
+    the dataset loaded, and writes the results and logs into the outbox directory.
 
     Parameters
     ----------
-    args : iterable or None
-        List of command-line arguments without application name. If not provided, sys.argv[1:] is used.
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
     """
+    # Collect arguments
+    inbox_path = getattr(args, 'inbox-path')
+    outbox_path = getattr(args, 'outbox-path')
+    lars_path = getattr(args, 'lars-path')
+    eval_set = getattr(args, 'eval-set')
 
-    if args is None:
-        args = sys.argv[1:]
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - inbox path: %r", inbox_path)
+    logging.info(" - outbox path: %r", outbox_path)
+    logging.info(" - LaRS path: %r", lars_path)
+    logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - number of workers: %r", args.num_workers)
+    logging.info(" - timeout: %r", args.timeout)
+    logging.info(" - max retries: %r", args.max_retries)
+    logging.info(" - shared memory: %r", args.shared_memory)
+    logging.info("")
 
-    # *** Basic logging setup ***
-    logging.basicConfig(
-        level=logging.INFO,
-        format="{message}",
-        style="{",
-    )
+    if not os.path.isdir(inbox_path):
+        logging.error("Invalid inbox path %r: not a directory!", inbox_path)
+        sys.exit(-1)
 
-    # *** Command-line parser ***
-    parser = argparse.ArgumentParser(
-        prog="macvi_usv_odce_tool",
-        description="MaCVi USV Obstacle Detection Challenge Evaluation Toolkit",
-    )
-    parser.add_argument(
-        '--version',
-        action='version',
-        version='%(prog)s 1.0',
-    )
+    if args.shared_memory and sys.version_info < (3, 8):
+        logging.error("The --shared-memory option requires Python 3.8 or newer!")
+        sys.exit(-1)
 
-    # Sub-commands
-    subparsers = parser.add_subparsers(
-        title="valid commands",
-        metavar="command",
-        help="command description",
-        required=True,
+    counts = worker.run_worker(
+        inbox_path,
+        outbox_path,
+        lars_path,
+        eval_set,
+        num_workers=args.num_workers,
+        timeout=args.timeout,
+        max_retries=args.max_retries,
+        poll_interval=args.poll_interval,
+        exit_when_idle=args.exit_when_idle,
+        archive_limits={
+            'max_member_size': args.max_member_size,
+            'max_total_size': args.max_total_size,
+            'max_compression_ratio': args.max_compression_ratio,
+        },
+        shared_memory=args.shared_memory,
     )
 
-    # Command: evaluate
-    subparser = subparsers.add_parser(
-        "evaluate",
-        aliases=["e"],
-        help="Evaluate the results.",
-    )
-    subparser.set_defaults(
-        command="evaluate",
-        command_function=cmd_evaluate,
-    )
-    subparser.add_argument(
-        "lars-path",
-        type=str,
-        help="Path to the LaRS dataset, needed for ignore masks",
-    )
-    subparser.add_argument(
-        "eval-set",
-        type=str,
-        help="Subset to evaluate, either train, test or val",
-    )
-    subparser.add_argument(
-        "results-json-file",
-        type=str,
-        help="Full path to the JSON file with detection results for the corresponding LaRS subset.",
-    )    
-    subparser.add_argument(
-        "--output-file",
-        type=str,
-        metavar="FILENAME",
-        help="Store evaluation results in a JSON file in addition to displaying them in console.",
-    )
+    # Done
+    logging.info("")
+    logging.info("Processed %d submission(s), %d failed.", counts['ok'], counts['failed'])
+    logging.info("Done!")
 
-    # Command: prepare-submission
-    subparser = subparsers.add_parser(
-        "prepare-submission",
-        aliases=["s"],
-        help="Evaluate the results and prepare archive for submission.",
-    )
-    subparser.set_defaults(
-        command="prepare-submission",
-        command_function=cmd_prepare_submission,
-    )
-    subparser.add_argument(
-        "lars-path",
-        type=str,
-        help="Path to the LaRS dataset, needed for ignore masks",
-    )
-    subparser.add_argument(
+
+def cmd_diff(args):
+    """
+    Command handler: diff
+
+    Evaluates two detection results files against the same dataset subset, and reports the frames and sequences in
+    which the second results file lost true positives or gained false positives compared to the first one.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    lars_path = getattr(args, 'lars-path')
+    eval_set = getattr(args, 'eval-set')
+    results_json_file_a = getattr(args, 'results-json-file-a')
+    results_json_file_b = getattr(args, 'results-json-file-b')
+    output_file = args.output_file
+    top = args.top
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - LaRS path: %r", lars_path)
+    logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - results JSON file A: %r", results_json_file_a)
+    logging.info(" - results JSON file B: %r", results_json_file_b)
+    logging.info(" - ignore regions: %r", args.ignore_regions)
+    logging.info(" - output file: %r", output_file)
+    logging.info("")
+
+    logging.info("Loading dataset and results...")
+    dataset = LarsSubset(lars_path, eval_set)
+    results_a = results_io.load_results(results_json_file_a, dataset=dataset)
+    results_b = results_io.load_results(results_json_file_b, dataset=dataset)
+
+    logging.info("Comparing...")
+    start_time = time.time()
+    report = diff.diff_detection_results(dataset, results_a, results_b, ignore_regions=args.ignore_regions)
+    elapsed = time.time() - start_time
+    logging.info(
+        "Comparison complete in %.2f seconds (%d of %d frames with identical detections)!",
+        elapsed,
+        report['num_identical_frames'],
+        report['num_frames'],
+    )
+    logging.info("")
+
+    logging.info("Results: F_all F_small F_medium F_large")
+    logging.info("A: %.03f %.03f %.03f %.03f", *report['f_scores_a'])
+    logging.info("B: %.03f %.03f %.03f %.03f", *report['f_scores_b'])
+    logging.info("")
+
+    # Display the most regressed frames and sequences
+    print(f"Changed frames: {report['num_changed_frames']} (top {top}, ranked by regression)")
+    print("regression delta_tp delta_fp delta_fn file_name")
+    for frame in report['frames'][:top]:
+        print("{regression:10d} {delta_tp:8d} {delta_fp:8d} {delta_fn:8d} {file_name}".format(**frame))
+    print(f"Changed sequences: {len(report['sequences'])} (top {top}, ranked by regression)")
+    print("regression delta_tp delta_fp delta_fn sequence")
+    for sequence in report['sequences'][:top]:
+        print("{regression:10d} {delta_tp:8d} {delta_fp:8d} {delta_fn:8d} {sequence}".format(**sequence))
+
+    # Save
+    if output_file:
+        logging.info("")
+        logging.info("Saving comparison report to %r...", output_file)
+        with open(output_file, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
+def cmd_render(args):
+    """
+    Command handler: render
+
+    Evaluates the detection results, and renders the outcomes (true/false positives, missed and ignored annotations,
+    ignore regions) of the selected frames into the output directory.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    lars_path = getattr(args, 'lars-path')
+    eval_set = getattr(args, 'eval-set')
+    results_json_file = getattr(args, 'results-json-file')
+    output_dir = getattr(args, 'output-dir')
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - LaRS path: %r", lars_path)
+    logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - results JSON file: %r", results_json_file)
+    logging.info(" - output directory: %r", output_dir)
+    logging.info(" - worst frames: %r", args.worst)
+    logging.info(" - sequences: %r", args.sequence)
+    logging.info(" - image IDs: %r", args.image_id)
+    logging.info(" - thumbnail width: %r", args.thumbnail_width)
+    logging.info(" - number of threads: %r", args.num_threads)
+    logging.info(" - use thumbnail cache: %r", not args.no_cache)
+    logging.info(" - thumbnail cache size: %r", args.cache_max_size)
+    logging.info("")
+
+    logging.info("Loading dataset and results...")
+    dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+    results = results_io.load_results(results_json_file, dataset=dataset)
+
+    # Evaluation without ignore masks is sufficient for the selection; masks are decoded only for rendered frames
+    logging.info("Selecting frames...")
+    frame_results = list(evaluation.iter_frame_results(dataset, results))
+    indices = render.select_frames(
+        dataset,
+        frame_results,
+        worst=args.worst,
+        sequences=args.sequence,
+        image_ids=args.image_id,
+    )
+    logging.info("Selected %d of %d frames.", len(indices), len(dataset))
+
+    logging.info("Rendering...")
+    start_time = time.time()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.no_cache:
+            render_dir = tmp_dir
+        else:
+            render_dir = render.render_cache_dir(
+                utils.file_sha256(results_json_file),
+                subset_fingerprint(lars_path, eval_set),
+                thumbnail_width=args.thumbnail_width,
+            )
+        files, num_rendered = render.render_frames(
+            dataset,
+            results,
+            indices,
+            render_dir,
+            thumbnail_width=args.thumbnail_width,
+            num_threads=args.num_threads,
+        )
+        if not args.no_cache:
+            num_evicted = render.prune_render_cache(args.cache_max_size, keep=render_dir)
+            if num_evicted:
+                logging.info("Evicted thumbnails of %d results file(s) from the cache.", num_evicted)
+
+        # Copy the rendered frames, and store the index of frames (in selection order)
+        os.makedirs(output_dir, exist_ok=True)
+        frames = []
+        for index, filename in zip(indices, files):
+            shutil.copyfile(filename, os.path.join(output_dir, os.path.basename(filename)))
+            tp, fp, fn = frame_results[index].counts()
+            frames.append({
+                'image_id': dataset.image_id(index),
+                'file_name': dataset.annotations[index]['file_name'],
+                'tp': tp,
+                'fp': fp,
+                'fn': fn,
+                'rendered_file': os.path.basename(filename),
+            })
+    with open(os.path.join(output_dir, "frames.json"), "w") as fp:
+        json.dump(frames, fp, indent=2)
+
+    elapsed = time.time() - start_time
+    logging.info(
+        "Rendering complete in %.2f seconds (%d rendered, %d from cache)!",
+        elapsed,
+        num_rendered,
+        len(files) - num_rendered,
+    )
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
+def cmd_convert_results(args):
+    """
+    Command handler: convert-results
+
+    Converts the detection results file between the JSON and the NPZ format (see results_io module); the formats are
+    determined by the file extensions.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    input_file = getattr(args, 'input-file')
+    output_file = getattr(args, 'output-file')
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - input file: %r", input_file)
+    logging.info(" - output file: %r", output_file)
+    logging.info("")
+
+    if results_io.is_npz_results(input_file) == results_io.is_npz_results(output_file):
+        logging.error("Input and output files must be in different formats (JSON and NPZ)!")
+        sys.exit(-1)
+
+    logging.info("Converting...")
+    start_time = time.time()
+    try:
+        results = results_io.load_results(input_file)
+        results_io.save_results(output_file, results)
+    except ValueError as e:
+        logging.error("Failed to convert results file: %s", e)
+        sys.exit(-1)
+    elapsed = time.time() - start_time
+    logging.info(
+        "Converted %d frames with %d detections in %.2f seconds!",
+        len(results['annotations']),
+        sum(len(frame.get('detections', [])) for frame in results['annotations']),
+        elapsed,
+    )
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
+def cmd_ignore_sensitivity(args):
+    """
+    Command handler: ignore-sensitivity
+
+    Evaluates the detection results with unmatched detections in ignore regions ignored, for a list of ignore-overlap
+    thresholds, and prints the table of F-scores (alongside the official ones) to standard output.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    lars_path = getattr(args, 'lars-path')
+    eval_set = getattr(args, 'eval-set')
+    results_json_file = getattr(args, 'results-json-file')
+    output_file = args.output_file
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - LaRS path: %r", lars_path)
+    logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - results JSON file: %r", results_json_file)
+    logging.info(" - thresholds: %r", args.thresholds)
+    logging.info(" - output file: %r", output_file)
+    logging.info("")
+
+    logging.info("Loading dataset and results...")
+    dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+    results = results_io.load_results(results_json_file, dataset=dataset)
+
+    logging.info("Evaluating...")
+    start_time = time.time()
+    report = sensitivity.ignore_threshold_sensitivity(dataset, results, thresholds=args.thresholds)
+    elapsed = time.time() - start_time
+    logging.info("Evaluation of %d thresholds complete in %.2f seconds!", len(args.thresholds), elapsed)
+    logging.info("")
+
+    # Display the table; the official protocol does not ignore detections in ignore regions
+    print("threshold in_region ignored F_all F_small F_medium F_large")
+    print("{:>9s} {:>9s} {:>7s} {:.03f} {:.03f} {:.03f} {:.03f}".format("official", "-", "-", *report['official']))
+    for row in report['thresholds']:
+        print("{:9.2f} {:9d} {:7d} {:.03f} {:.03f} {:.03f} {:.03f}".format(
+            row['threshold'],
+            row['num_in_ignore_region'],
+            row['num_ignored'],
+            *row['f_scores'],
+        ))
+
+    # Save
+    if output_file:
+        logging.info("")
+        logging.info("Saving sensitivity table to %r...", output_file)
+        with open(output_file, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
+def cmd_hard_examples(args):
+    """
+    Command handler: hard-examples
+
+    Exports the ranked boxes with the selected outcomes (by default, false positives outside ignore regions and
+    missed ground-truth boxes) to a JSON or CSV file, for hard-example mining.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    lars_path = getattr(args, 'lars-path')
+    eval_set = getattr(args, 'eval-set')
+    results_json_file = getattr(args, 'results-json-file')
+    output_file = getattr(args, 'output-file')
+    top_k = args.top_k or None
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - LaRS path: %r", lars_path)
+    logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - results JSON file: %r", results_json_file)
+    logging.info(" - output file: %r", output_file)
+    logging.info(" - outcomes: %r", args.outcomes)
+    logging.info(" - rank by: %r", args.rank_by)
+    logging.info(" - top K: %r", top_k)
+    logging.info(" - include ignore regions: %r", args.include_ignore_regions)
+    logging.info("")
+
+    logging.info("Loading dataset and results...")
+    dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+    results = results_io.load_results(results_json_file, dataset=dataset)
+
+    logging.info("Mining hard examples...")
+    start_time = time.time()
+    examples = hard_examples.mine_hard_examples(
+        dataset,
+        results,
+        outcomes=args.outcomes,
+        rank_by=args.rank_by,
+        top_k=top_k,
+        include_ignore_regions=args.include_ignore_regions,
+    )
+    elapsed = time.time() - start_time
+    logging.info("Mined %d boxes in %.2f seconds!", len(examples), elapsed)
+
+    # Save
+    logging.info("")
+    logging.info("Saving hard examples to %r...", output_file)
+    hard_examples.write_hard_examples(output_file, examples, metadata={
+        'outcomes': list(args.outcomes),
+        'rank_by': args.rank_by,
+        'top_k': top_k,
+        'include_ignore_regions': args.include_ignore_regions,
+    })
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
+def cmd_merge(args):
+    """
+    Command handler: merge
+
+    Merges the partial results of shard evaluations (see evaluate --shard) into the final results, after checking
+    that they belong to the same evaluation, and that the shards are complete and do not overlap.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    partial_files = getattr(args, 'partial-files')
+    output_file = args.output_file
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - partial result files: %r", partial_files)
+    logging.info(" - output file: %r", output_file)
+    logging.info("")
+
+    logging.info("Merging...")
+    try:
+        results = partial.merge_partials([partial.load_partial(filename) for filename in partial_files])
+    except ValueError as e:
+        logging.error("Failed to merge partial results: %s", e)
+        sys.exit(-1)
+    logging.info("Merged %d partial results!", len(partial_files))
+    logging.info("")
+
+    # Display debug/extended results
+    _display_extended_results(results)
+
+    # Display actual (short) results
+    _display_final_results(results)
+
+    # Save
+    if output_file:
+        logging.info("")
+        logging.info("Saving evaluation results to %r...", output_file)
+        with open(output_file, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
+def cmd_rank(args):
+    """
+    Command handler: rank
+
+    Ranks multiple detection results files by F1 score at the challenge IoU threshold. Ties are broken by raising the
+    IoU threshold, re-evaluating only the tied results files.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        argparse Namespace structure, obtained by argparse.ArgumentParser.parse_args().
+    """
+    # Collect arguments
+    lars_path = getattr(args, 'lars-path')
+    eval_set = getattr(args, 'eval-set')
+    results_json_files = getattr(args, 'results-json-files')
+    output_file = args.output_file
+
+    # Display settings
+    logging.info("")
+    logging.info("Settings:")
+    logging.info(" - mode: %r", args.command)
+    logging.info(" - LaRS path: %r", lars_path)
+    logging.info(" - evaluation subset: %r", eval_set)
+    logging.info(" - results JSON files: %r", results_json_files)
+    logging.info(" - threshold step: %r", args.threshold_step)
+    logging.info(" - max threshold: %r", args.max_threshold)
+    logging.info(" - tie decimals: %r", args.tie_decimals)
+    logging.info(" - output file: %r", output_file)
+    logging.info("")
+
+    if len(set(results_json_files)) != len(results_json_files):
+        logging.error("Results JSON files must be unique!")
+        sys.exit(-1)
+
+    logging.info("Loading dataset...")
+    dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+
+    start_time = time.time()
+    submissions = []
+    for results_json_file in results_json_files:
+        logging.info("Preparing %r...", results_json_file)
+        results = results_io.load_results(results_json_file, dataset=dataset)
+        submissions.append((results_json_file, rank.prepare_submission(dataset, results)))
+        del results
+
+    logging.info("Ranking...")
+    thresholds = rank.tie_breaking_thresholds(step=args.threshold_step, max_threshold=args.max_threshold)
+    ranking = rank.rank_submissions(dataset, submissions, thresholds=thresholds, tie_decimals=args.tie_decimals)
+    elapsed = time.time() - start_time
+    logging.info("Ranking complete in %.2f seconds!", elapsed)
+    logging.info("")
+
+    # Display the ranking
+    print("rank     F1 tie_break name")
+    for entry in ranking:
+        tie_break = "" if entry['tie_break_threshold'] is None else f"{entry['tie_break_threshold']:.2f}"
+        print(f"{entry['rank']:4d} {100 * entry['f_score']:6.2f} {tie_break:>9s} {entry['name']}")
+
+    # Save
+    if output_file:
+        logging.info("")
+        logging.info("Saving ranking to %r...", output_file)
+        with open(output_file, "w") as fp:
+            json.dump(ranking, fp, indent=2)
+
+    # Done
+    logging.info("")
+    logging.info("Done!")
+
+
+def _add_archive_limit_arguments(subparser):
+    # Safety limits for submission archives (shared by unpack-submission and worker commands)
+    subparser.add_argument(
+        "--max-member-size",
+        type=int,
+        default=submission.DEFAULT_MAX_MEMBER_SIZE,
+        metavar="BYTES",
+        help="Maximum uncompressed size of a single archive member.",
+    )
+    subparser.add_argument(
+        "--max-total-size",
+        type=int,
+        default=submission.DEFAULT_MAX_TOTAL_SIZE,
+        metavar="BYTES",
+        help="Maximum total uncompressed size of the archive contents.",
+    )
+    subparser.add_argument(
+        "--max-compression-ratio",
+        type=float,
+        default=submission.DEFAULT_MAX_COMPRESSION_RATIO,
+        metavar="RATIO",
+        help="Maximum compression ratio of a single archive member.",
+    )
+
+
+def _sample_argument(value):
+    # Number of frames (integer), or fraction of frames (real number); see sampling.sample_size()
+    try:
+        sample = int(value)
+    except ValueError:
+        try:
+            sample = float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid sample: {value!r}") from None
+        if not 0 < sample <= 1:
+            raise argparse.ArgumentTypeError(f"sample fraction must be in (0, 1], got {value!r}")
+        return sample
+    if sample < 1:
+        raise argparse.ArgumentTypeError(f"number of sampled frames must be positive, got {value!r}")
+    return sample
+
+
+def _max_entries_argument(value):
+    # Maximum number of entries in the result store (a positive integer)
+    try:
+        max_entries = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number of entries: {value!r}") from None
+    if max_entries < 1:
+        raise argparse.ArgumentTypeError(f"number of entries must be positive, got {value!r}")
+    return max_entries
+
+
+def _shard_argument(value):
+    # Shard specification 'i/N'; see partial.parse_shard()
+    try:
+        return partial.parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _outcomes_argument(value):
+    # Comma-separated list of box outcomes; see hard_examples.OUTCOMES
+    outcomes = [outcome.strip() for outcome in value.split(',') if outcome.strip()]
+    if not outcomes or not all(outcome in hard_examples.OUTCOMES for outcome in outcomes):
+        raise argparse.ArgumentTypeError(
+            f"outcomes must be some of {', '.join(hard_examples.OUTCOMES)}, got {value!r}"
+        )
+    return outcomes
+
+
+def _thresholds_argument(value):
+    # Comma-separated list of thresholds in [0, 1]
+    try:
+        thresholds = [float(threshold) for threshold in value.split(',') if threshold.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid list of thresholds: {value!r}") from None
+    if not thresholds or not all(0 <= threshold <= 1 for threshold in thresholds):
+        raise argparse.ArgumentTypeError(f"thresholds must be in [0, 1], got {value!r}")
+    return thresholds
+
+
+def _add_result_store_arguments(subparser):
+    # Result store override (shared by commands that evaluate a single results file)
+    subparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always evaluate, instead of returning results stored from a previous evaluation of the same results "
+             "file on the same dataset subset.",
+    )
+    subparser.add_argument(
+        "--cache-max-entries",
+        type=_max_entries_argument,
+        default=result_store.DEFAULT_MAX_ENTRIES,
+        metavar="N",
+        help="Maximum number of results kept in the result store (each entry takes a few hundred bytes); the least "
+             "recently used ones are evicted beyond that.",
+    )
+
+
+def main(args=None):
+    """
+    Entry-point function.
+
+    Parameters
+    ----------
+    args : iterable or None
+        List of command-line arguments without application name. If not provided, sys.argv[1:] is used.
+    """
+
+    if args is None:
+        args = sys.argv[1:]
+
+    # *** Basic logging setup ***
+    logging.basicConfig(
+        level=logging.INFO,
+        format="{message}",
+        style="{",
+    )
+
+    # *** Command-line parser ***
+    parser = argparse.ArgumentParser(
+        prog="macvi_usv_odce_tool",
+        description="MaCVi USV Obstacle Detection Challenge Evaluation Toolkit",
+    )
+    parser.add_argument(
+        '--version',
+        action='version',
+        version=f'%(prog)s {__version__}',
+    )
+
+    # Sub-commands
+    subparsers = parser.add_subparsers(
+        title="valid commands",
+        metavar="command",
+        help="command description",
+        required=True,
+    )
+
+    # Command: evaluate
+    subparser = subparsers.add_parser(
+        "evaluate",
+        aliases=["e"],
+        help="Evaluate the results.",
+    )
+    subparser.set_defaults(
+        command="evaluate",
+        command_function=cmd_evaluate,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive), needed for ignore masks",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to evaluate, either train, test or val",
+    )
+    subparser.add_argument(
+        "results-json-file",
+        type=str,
+        help="Full path to the JSON (or NPZ) file with detection results for the corresponding LaRS subset.",
+    )    
+    subparser.add_argument(
+        "--output-file",
+        type=str,
+        metavar="FILENAME",
+        help="Store evaluation results in a JSON file in addition to displaying them in console.",
+    )
+    subparser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Evaluate frame by frame using the toolkit's native matching (results are identical to pycocotools), "
+             "with constant memory and periodic progress reports.",
+    )
+    subparser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="Interval between progress reports (with ETA and partial F-score) in streaming mode.",
+    )
+    subparser.add_argument(
+        "--sample",
+        type=_sample_argument,
+        default=None,
+        metavar="FRACTION|N",
+        help="Quick-look evaluation: evaluate only a sample of frames (a fraction in (0, 1], or a number of frames), "
+             "stratified by sequence, and report the estimated F-scores with confidence bounds.",
+    )
+    subparser.add_argument(
+        "--sample-seed",
+        type=int,
+        default=sampling.DEFAULT_SEED,
+        metavar="SEED",
+        help="Seed of the frame sampling (and of the bootstrap of confidence bounds).",
+    )
+    subparser.add_argument(
+        "--confidence",
+        type=float,
+        default=sampling.DEFAULT_CONFIDENCE,
+        metavar="LEVEL",
+        help="Confidence level of the bounds of estimated F-scores.",
+    )
+    subparser.add_argument(
+        "--per-class",
+        action="store_true",
+        help="Keep the categories of annotations and detections ('category_id', required in all detections), and "
+             "report per-class F-scores alongside the class-agnostic ones, in a single pass.",
+    )
+    subparser.add_argument(
+        "--shard",
+        type=_shard_argument,
+        default=None,
+        metavar="i/N",
+        help="Evaluate only shard i of N (0 <= i < N), and store the partial result (a small NPZ file with per-frame "
+             "counts) in the output file; combine the partial results of all shards with the merge command.",
+    )
+    subparser.add_argument(
+        "--shard-by",
+        choices=partial.SHARD_MODES,
+        default=partial.SHARD_BY_SEQUENCE,
+        help="Split the frames into shards by whole sequences, or by contiguous frame ranges.",
+    )
+    subparser.add_argument(
+        "--coco-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of processes for the per-image pycocotools evaluation (default: single process); the images are "
+             "split into shards, and the results are identical to the single-process evaluation.",
+    )
+    subparser.add_argument(
+        "--no-validate",
+        action="store_true",
+        help="Skip the validation of the results file before the evaluation.",
+    )
+    _add_result_store_arguments(subparser)
+
+    # Command: validate
+    subparser = subparsers.add_parser(
+        "validate",
+        aliases=["v"],
+        help="Validate the results file without evaluating it.",
+    )
+    subparser.set_defaults(
+        command="validate",
+        command_function=cmd_validate,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive)",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to validate against, either train, test or val",
+    )
+    subparser.add_argument(
+        "results-json-file",
+        type=str,
+        help="Full path to the JSON (or NPZ) file with detection results for the corresponding LaRS subset.",
+    )
+    subparser.add_argument(
+        "--max-examples",
+        type=int,
+        default=validation.DEFAULT_MAX_EXAMPLES,
+        metavar="N",
+        help="Maximum number of examples reported for each issue.",
+    )
+    subparser.add_argument(
+        "--output-file",
+        type=str,
+        metavar="FILENAME",
+        help="Store the validation report in a JSON file.",
+    )
+
+    # Command: prepare-submission
+    subparser = subparsers.add_parser(
+        "prepare-submission",
+        aliases=["s"],
+        help="Evaluate the results and prepare archive for submission.",
+    )
+    subparser.set_defaults(
+        command="prepare-submission",
+        command_function=cmd_prepare_submission,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive), needed for ignore masks",
+    )
+    subparser.add_argument(
         "results-json-file",
         type=str,
         help="Full path to the JSON file with detection results.",
@@ -339,6 +1691,14 @@ def main(args=None):
         type=str,
         help="Subset to evaluate, either train, test or val",
     )
+    subparser.add_argument(
+        "--coco-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of processes for the per-image pycocotools evaluation (default: single process).",
+    )
+    _add_result_store_arguments(subparser)
 
     # Command: unpack-submission
     subparser = subparsers.add_parser(
@@ -358,18 +1718,421 @@ def main(args=None):
     subparser.add_argument(
         "target-path",
         type=str,
-        help="Full path to directory into which submission archive is to be unpacked.",
+        nargs="?",
+        help="Full path to directory into which submission archive is to be unpacked. Optional with --no-extract.",
     )
     subparser.add_argument(
         "--lars-path",
         type=str,
-        help="Path to the LaRS dataset, needed for ignore masks",
+        help="Path to the LaRS dataset (directory or zip archive), needed for ignore masks",
     )
     subparser.add_argument(
         "--eval-set",
         type=str,
         help="Subset to evaluate, either train, test or val",
     )
+    subparser.add_argument(
+        "--no-extract",
+        action="store_true",
+        help="Do not unpack the archive; read the results directly from it.",
+    )
+    subparser.add_argument(
+        "--extract-source-code",
+        action="store_true",
+        help="With --no-extract, still extract the submitted source code into the target path.",
+    )
+    _add_result_store_arguments(subparser)
+    _add_archive_limit_arguments(subparser)
+
+    # Command: worker
+    subparser = subparsers.add_parser(
+        "worker",
+        aliases=["w"],
+        help="Watch a directory for submission archives and evaluate them.",
+    )
+    subparser.set_defaults(
+        command="worker",
+        command_function=cmd_worker,
+    )
+    subparser.add_argument(
+        "inbox-path",
+        type=str,
+        help="Directory to watch for submission archives (*.zip).",
+    )
+    subparser.add_argument(
+        "outbox-path",
+        type=str,
+        help="Directory into which evaluation results and logs are written.",
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive), needed for ignore masks",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to evaluate, either train, test or val",
+    )
+    subparser.add_argument(
+        "--num-workers",
+        type=int,
+        metavar="N",
+        help="Number of worker processes (default: number of CPU cores).",
+    )
+    subparser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Per-submission evaluation timeout.",
+    )
+    subparser.add_argument(
+        "--max-retries",
+        type=int,
+        default=2,
+        metavar="N",
+        help="Maximum number of retries for submissions that time out or fail due to transient errors.",
+    )
+    subparser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="Inbox polling interval.",
+    )
+    subparser.add_argument(
+        "--exit-when-idle",
+        action="store_true",
+        help="Exit once the inbox is empty and all submissions are processed.",
+    )
+    subparser.add_argument(
+        "--shared-memory",
+        action="store_true",
+        help="Load the dataset subset and decode all ignore masks once, and share them with the worker processes "
+             "via shared memory.",
+    )
+    _add_archive_limit_arguments(subparser)
+
+    # Command: diff
+    subparser = subparsers.add_parser(
+        "diff",
+        aliases=["d"],
+        help="Compare two results files frame by frame.",
+    )
+    subparser.set_defaults(
+        command="diff",
+        command_function=cmd_diff,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive), needed for ignore masks",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to evaluate, either train, test or val",
+    )
+    subparser.add_argument(
+        "results-json-file-a",
+        type=str,
+        help="Full path to the reference (e.g., previous) JSON file with detection results.",
+    )
+    subparser.add_argument(
+        "results-json-file-b",
+        type=str,
+        help="Full path to the JSON file with detection results to compare against the reference.",
+    )
+    subparser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        metavar="N",
+        help="Number of most regressed frames and sequences to display.",
+    )
+    subparser.add_argument(
+        "--ignore-regions",
+        action="store_true",
+        help="Also compare the number of detections falling into ignore regions (requires decoding ignore masks).",
+    )
+    subparser.add_argument(
+        "--output-file",
+        type=str,
+        metavar="FILENAME",
+        help="Store the full comparison report in a JSON file.",
+    )
+
+    # Command: render
+    subparser = subparsers.add_parser(
+        "render",
+        aliases=["g"],
+        help="Render the evaluation outcomes of selected frames.",
+    )
+    subparser.set_defaults(
+        command="render",
+        command_function=cmd_render,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive)",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to evaluate, either train, test or val",
+    )
+    subparser.add_argument(
+        "results-json-file",
+        type=str,
+        help="Full path to the JSON (or NPZ) file with detection results for the corresponding LaRS subset.",
+    )
+    subparser.add_argument(
+        "output-dir",
+        type=str,
+        help="Output directory for the rendered frames and their index (frames.json).",
+    )
+    subparser.add_argument(
+        "--worst",
+        type=int,
+        default=None,
+        metavar="K",
+        help="Render only the K frames with most errors (false positives plus false negatives).",
+    )
+    subparser.add_argument(
+        "--sequence",
+        type=str,
+        action="append",
+        metavar="NAME",
+        help="Render only the frames of the given sequence (can be specified multiple times).",
+    )
+    subparser.add_argument(
+        "--image-id",
+        type=int,
+        action="append",
+        metavar="ID",
+        help="Render only the frame with the given image ID (can be specified multiple times).",
+    )
+    subparser.add_argument(
+        "--thumbnail-width",
+        type=int,
+        default=render.DEFAULT_THUMBNAIL_WIDTH,
+        metavar="PIXELS",
+        help="Width of rendered thumbnails; 0 renders frames at their full size.",
+    )
+    subparser.add_argument(
+        "--num-threads",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of rendering threads; defaults to the number of CPUs.",
+    )
+    subparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always render, instead of re-using thumbnails rendered previously for the same results file.",
+    )
+    subparser.add_argument(
+        "--cache-max-size",
+        type=int,
+        default=render.DEFAULT_MAX_CACHE_SIZE,
+        metavar="BYTES",
+        help="Maximum total size of the thumbnail cache; thumbnails of the least recently rendered results files are "
+             "evicted beyond that.",
+    )
+
+    # Command: convert-results
+    subparser = subparsers.add_parser(
+        "convert-results",
+        aliases=["c"],
+        help="Convert the results file between JSON and NPZ formats.",
+    )
+    subparser.set_defaults(
+        command="convert-results",
+        command_function=cmd_convert_results,
+    )
+    subparser.add_argument(
+        "input-file",
+        type=str,
+        help="Results file to convert (.json or .npz).",
+    )
+    subparser.add_argument(
+        "output-file",
+        type=str,
+        help="Converted results file (.npz or .json).",
+    )
+
+    # Command: ignore-sensitivity
+    subparser = subparsers.add_parser(
+        "ignore-sensitivity",
+        aliases=["i"],
+        help="Evaluate the sensitivity of F-scores to the ignore-overlap threshold.",
+    )
+    subparser.set_defaults(
+        command="ignore-sensitivity",
+        command_function=cmd_ignore_sensitivity,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive), needed for ignore masks",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to evaluate, either train, test or val",
+    )
+    subparser.add_argument(
+        "results-json-file",
+        type=str,
+        help="Full path to the JSON (or NPZ) file with detection results for the corresponding LaRS subset.",
+    )
+    subparser.add_argument(
+        "--thresholds",
+        type=_thresholds_argument,
+        default=list(sensitivity.DEFAULT_THRESHOLDS),
+        metavar="T1,T2,...",
+        help="Comma-separated list of ignore-overlap thresholds.",
+    )
+    subparser.add_argument(
+        "--output-file",
+        type=str,
+        metavar="FILENAME",
+        help="Store the sensitivity table in a JSON file.",
+    )
+
+    # Command: hard-examples
+    subparser = subparsers.add_parser(
+        "hard-examples",
+        aliases=["x"],
+        help="Export the ranked boxes on which the detector fails, for hard-example mining.",
+    )
+    subparser.set_defaults(
+        command="hard-examples",
+        command_function=cmd_hard_examples,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive)",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to evaluate, either train, test or val",
+    )
+    subparser.add_argument(
+        "results-json-file",
+        type=str,
+        help="Full path to the JSON (or NPZ) file with detection results for the corresponding LaRS subset.",
+    )
+    subparser.add_argument(
+        "output-file",
+        type=str,
+        help="Output file with the exported boxes (.json or .csv).",
+    )
+    subparser.add_argument(
+        "--outcomes",
+        type=_outcomes_argument,
+        default=list(hard_examples.DEFAULT_OUTCOMES),
+        metavar="O1,O2,...",
+        help=f"Comma-separated list of outcomes of the exported boxes ({', '.join(hard_examples.OUTCOMES)}).",
+    )
+    subparser.add_argument(
+        "--rank-by",
+        choices=hard_examples.RANK_MODES,
+        default=hard_examples.RANK_BY_COUNT,
+        help="Rank frames by the number of exported boxes, or boxes by their area.",
+    )
+    subparser.add_argument(
+        "--top-k",
+        type=int,
+        default=hard_examples.DEFAULT_TOP_K,
+        metavar="K",
+        help="Export only the top K frames (or boxes, when ranking by size); 0 exports all.",
+    )
+    subparser.add_argument(
+        "--include-ignore-regions",
+        action="store_true",
+        help="Also export false positives in ignore regions (skips decoding the ignore masks).",
+    )
+
+    # Command: merge
+    subparser = subparsers.add_parser(
+        "merge",
+        aliases=["m"],
+        help="Merge the partial results of shard evaluations into the final results.",
+    )
+    subparser.set_defaults(
+        command="merge",
+        command_function=cmd_merge,
+    )
+    subparser.add_argument(
+        "partial-files",
+        type=str,
+        nargs="+",
+        help="Partial result files of all shards (see evaluate --shard).",
+    )
+    subparser.add_argument(
+        "--output-file",
+        type=str,
+        metavar="FILENAME",
+        help="Store evaluation results in a JSON file in addition to displaying them in console.",
+    )
+
+    # Command: rank
+    subparser = subparsers.add_parser(
+        "rank",
+        aliases=["r"],
+        help="Rank multiple results files, breaking ties at higher IoU thresholds.",
+    )
+    subparser.set_defaults(
+        command="rank",
+        command_function=cmd_rank,
+    )
+    subparser.add_argument(
+        "lars-path",
+        type=str,
+        help="Path to the LaRS dataset (directory or zip archive)",
+    )
+    subparser.add_argument(
+        "eval-set",
+        type=str,
+        help="Subset to evaluate, either train, test or val",
+    )
+    subparser.add_argument(
+        "results-json-files",
+        type=str,
+        nargs="+",
+        help="Full paths to the JSON files with detection results to rank.",
+    )
+    subparser.add_argument(
+        "--threshold-step",
+        type=float,
+        default=rank.DEFAULT_THRESHOLD_STEP,
+        metavar="STEP",
+        help="Increment of the IoU threshold between tie-breaking rounds.",
+    )
+    subparser.add_argument(
+        "--max-threshold",
+        type=float,
+        default=rank.DEFAULT_MAX_THRESHOLD,
+        metavar="THRESHOLD",
+        help="Highest IoU threshold used for tie-breaking; ties remaining at it are reported as such.",
+    )
+    subparser.add_argument(
+        "--tie-decimals",
+        type=int,
+        default=rank.DEFAULT_TIE_DECIMALS,
+        metavar="N",
+        help="Number of decimals to which F-scores are rounded before comparison.",
+    )
+    subparser.add_argument(
+        "--output-file",
+        type=str,
+        metavar="FILENAME",
+        help="Store the ranking in a JSON file.",
+    )
 
     # *** Parse command-line arguments ***
     args = parser.parse_args(args)
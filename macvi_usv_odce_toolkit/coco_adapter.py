@@ -0,0 +1,201 @@
+"""
+Lean adapter for pycocotools' bounding-box evaluation.
+
+The stock pycocotools workflow (COCO.loadRes(), COCOeval.summarize()) performs a fair amount of work that the toolkit
+does not need: loadRes() attaches a polygon segmentation to every detection, and summarize() formats and prints the
+text summary of all twelve statistics. The classes in this module inject the COCO-compatible structures produced by
+evaluation.convert_to_coco_structures() directly, and compute only the statistics used for the F-scores. The matching
+and accumulation are left to pycocotools, so the resulting numbers are identical.
+
+The per-image evaluation (COCOeval.evaluate()) is a pure-Python loop over images; LeanCOCOeval.evaluate() can split
+the image IDs into shards and evaluate them in a pool of processes. Each image's evaluation depends only on its own
+annotations and detections, and the shards' results are merged in the original order, so accumulate() produces the
+same statistics as after the single-process evaluation.
+"""
+import copy
+import contextlib
+import collections
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+
+import pycocotools.coco
+import pycocotools.cocoeval
+
+# Indices of COCOeval.stats entries used by the toolkit: (AP, AR) for all, small, medium, and large objects
+STATS_AREA_RANGES = ('all', 'small', 'medium', 'large')
+STATS_PRECISION_INDICES = (0, 3, 4, 5)
+STATS_RECALL_INDICES = (8, 9, 10, 11)
+
+
+class LeanCOCO(pycocotools.coco.COCO):
+    """
+    COCO helper class that is initialized from an in-memory dataset dictionary (without copying it), and loads
+    bounding-box results without copying or augmenting them with segmentations.
+
+    Parameters
+    ----------
+    dataset : dict
+        COCO-compatible dataset dictionary (e.g., from evaluation.convert_to_coco_structures()).
+    """
+    def __init__(self, dataset=None):
+        super().__init__()
+        if dataset is not None:
+            self.dataset = dataset
+            self.createIndex()
+
+    def loadRes(self, resFile):
+        """
+        Load bounding-box results from a list of COCO-compatible detection dictionaries.
+
+        Unlike the stock implementation, the detections are only assigned the fields used by the evaluation ('id',
+        'area', 'iscrowd'); the list and dictionaries are used as-is (and modified in place).
+        """
+        anns = resFile
+        assert isinstance(anns, list), 'results in not an array of objects'
+
+        image_ids = set(self.getImgIds())
+        assert all(ann['image_id'] in image_ids for ann in anns), 'Results do not correspond to current coco set'
+
+        for id, ann in enumerate(anns):
+            bb = ann['bbox']
+            ann['area'] = bb[2]*bb[3]  # Same expression as in pycocotools
+            ann['id'] = id+1
+            ann['iscrowd'] = 0
+
+        return LeanCOCO({
+            'info': self.dataset.get('info', {}),
+            'images': self.dataset['images'],
+            'categories': self.dataset['categories'],
+            'annotations': anns,
+        })
+
+    def createIndex(self):
+        # Silent version of the stock implementation (which prints progress messages)
+        anns = {}
+        imgs = {}
+        cats = {}
+        img_to_anns = collections.defaultdict(list)
+        cat_to_imgs = collections.defaultdict(list)
+
+        for ann in self.dataset.get('annotations', []):
+            img_to_anns[ann['image_id']].append(ann)
+            anns[ann['id']] = ann
+            cat_to_imgs[ann['category_id']].append(ann['image_id'])
+        for img in self.dataset.get('images', []):
+            imgs[img['id']] = img
+        for cat in self.dataset.get('categories', []):
+            cats[cat['id']] = cat
+
+        self.anns = anns
+        self.imgToAnns = img_to_anns
+        self.catToImgs = cat_to_imgs if 'categories' in self.dataset else collections.defaultdict(list)
+        self.imgs = imgs
+        self.cats = cats
+
+
+class LeanCOCOeval(pycocotools.cocoeval.COCOeval):
+    """
+    COCOeval that computes only the statistics used by the toolkit, without formatting the text summary, and
+    optionally evaluates the images in a pool of processes (see evaluate()).
+
+    After summarize(), the stats array has the same layout as in the stock implementation, but only the entries at
+    STATS_PRECISION_INDICES and STATS_RECALL_INDICES are computed; the others are NaN.
+    """
+    def evaluate(self, num_workers=None, num_shards=None):
+        """
+        Run the per-image evaluation and store its results in evalImgs.
+
+        Parameters
+        ----------
+        num_workers : int, optional
+            Number of worker processes. If not given (or at most 1), the images are evaluated in the current process
+            by the stock implementation.
+        num_shards : int, optional
+            Number of shards (contiguous ranges of sorted image IDs) to split the images into; defaults to the number
+            of workers.
+
+        Notes
+        -----
+        In the sharded mode, evalImgs, ious, and _paramsEval are identical to those of the stock implementation (and
+        so are the results of accumulate()), but the per-image ground truth and detections (_gts, _dts) are prepared
+        only in the workers. The workers are spawned rather than forked, since the calling process may be running
+        other threads (e.g., prepare-submission builds the archive concurrently), and forking a multithreaded process
+        can deadlock.
+        """
+        if not num_workers or num_workers <= 1:
+            return super().evaluate()
+
+        # Same parameter normalization as in the stock implementation
+        p = self.params
+        if p.useSegm is not None:
+            p.iouType = 'segm' if p.useSegm == 1 else 'bbox'
+        p.imgIds = list(np.unique(p.imgIds))
+        if p.useCats:
+            p.catIds = list(np.unique(p.catIds))
+        p.maxDets = sorted(p.maxDets)
+        cat_ids = p.catIds if p.useCats else [-1]
+
+        shards = [shard.tolist() for shard in np.array_split(np.array(p.imgIds), num_shards or num_workers)]
+        shards = [shard for shard in shards if shard]
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(num_workers, len(shards)) or 1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_shard_worker,
+            initargs=(self.cocoGt.dataset, self.cocoDt.dataset, p),
+        ) as executor:
+            shard_results = list(executor.map(_evaluate_shard, shards))
+
+        # The stock evalImgs are ordered by category, area range, and image; each shard's list has the same layout
+        # over its own images, so each (category, area range) block is the concatenation of the shards' blocks
+        self.evalImgs = []
+        for block in range(len(cat_ids) * len(p.areaRng)):
+            for shard, (shard_eval_imgs, _) in zip(shards, shard_results):
+                self.evalImgs.extend(shard_eval_imgs[block * len(shard):(block + 1) * len(shard)])
+        self.ious = {}
+        for _, shard_ious in shard_results:
+            self.ious.update(shard_ious)
+        self._paramsEval = copy.deepcopy(self.params)
+
+    def _summarize_entry(self, values, area_index, max_dets_index):
+        # Mean of defined values (-1 marks undefined ones), as in COCOeval.summarize()
+        s = values[..., area_index, max_dets_index]
+        s = s[s > -1]
+        return -1 if not len(s) else np.mean(s)
+
+    def summarize(self):
+        if not self.eval:
+            raise Exception('Please run accumulate() first')
+
+        p = self.params
+        max_dets_index = p.maxDets.index(p.maxDets[-1])
+
+        stats = np.full((12,), np.nan)
+        for area_name, precision_index, recall_index in zip(
+            STATS_AREA_RANGES,
+            STATS_PRECISION_INDICES,
+            STATS_RECALL_INDICES,
+        ):
+            area_index = p.areaRngLbl.index(area_name)
+            stats[precision_index] = self._summarize_entry(self.eval['precision'], area_index, max_dets_index)
+            stats[recall_index] = self._summarize_entry(self.eval['recall'], area_index, max_dets_index)
+        self.stats = stats
+
+
+# Evaluator of the shard worker process (see LeanCOCOeval.evaluate())
+_shard_evaluation = None
+
+
+def _init_shard_worker(gt_dataset, dt_dataset, params):
+    global _shard_evaluation
+    _shard_evaluation = LeanCOCOeval(LeanCOCO(gt_dataset), LeanCOCO(dt_dataset), iouType=params.iouType)
+    _shard_evaluation.params = params
+
+
+def _evaluate_shard(image_ids):
+    _shard_evaluation.params.imgIds = image_ids
+    with contextlib.redirect_stdout(None):
+        _shard_evaluation.evaluate()
+    return _shard_evaluation.evalImgs, _shard_evaluation.ious
@@ -56,6 +56,29 @@ def estimate_plane_from_imu(roll, pitch, height):
     return plane
 
 
+def danger_zone_arc(camera_fov=80):
+    """
+    Sample the directions along the danger-zone edge, within the camera's horizontal field of view.
+
+    Parameters
+    ----------
+    camera_fov : float, optional
+        Estimated camera horizontal field of view, in degrees.
+
+    Returns
+    -------
+    sin, cos : numpy.ndarray
+        Sines and cosines of the sampled angles (at 0.5 degree resolution); scaled by the danger-zone range, they give
+        the forward and lateral coordinates of the edge points.
+    """
+    num_samples = int(np.ceil(camera_fov)) * 2  # 0.5 degree resolution
+
+    r = np.linspace(90 - (camera_fov / 2), 90 + (camera_fov / 2), num_samples)
+    r = np.radians(r)
+
+    return np.sin(r), np.cos(r)
+
+
 def construct_mask_from_danger_zone(
     roll,
     pitch,
@@ -67,6 +90,7 @@ def construct_mask_from_danger_zone(
     image_height,
     camera_fov=80,
     image_margin=10,
+    arc=None,
 ):
     """"
     Construct ignore mask for danger zone, based on IMU measurements and calibrated camera.
@@ -98,6 +122,8 @@ def construct_mask_from_danger_zone(
         into the image.
     image_margin : int, optional
         Extra margin value when deciding whether projected point still falls within image boundaries or not.
+    arc : (numpy.ndarray, numpy.ndarray), optional
+        Precomputed danger-zone edge samples for the given camera_fov (see danger_zone_arc()). Computed if not given.
 
     Returns
     -------
@@ -109,13 +135,12 @@ def construct_mask_from_danger_zone(
     A, B, C, D = estimate_plane_from_imu(roll, pitch, camera_height)
 
     # Sample the points on the border of the danger zone
-    num_samples = int(np.ceil(camera_fov)) * 2  # 0.5 degree resolution
-
-    r = np.linspace(90 - (camera_fov / 2), 90 + (camera_fov / 2), num_samples)
-    r = np.radians(r)
+    if arc is None:
+        arc = danger_zone_arc(camera_fov)
+    sin_r, cos_r = arc
 
-    x = danger_zone_range * np.sin(r)
-    y = danger_zone_range * np.cos(r)
+    x = danger_zone_range * sin_r
+    y = danger_zone_range * cos_r
     z = -(A * x + B * y + D) / C
 
     points = np.transpose(np.array([-y, -z, x]))  # World C.S. to camera C.S.
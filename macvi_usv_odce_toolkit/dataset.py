@@ -1,4 +1,74 @@
+import os
+import json
+import logging
+
 import cv2
+import numpy as np
+
+from . import __version__
+from . import lars_archive
+from . import utils
+
+# Format of the cached ground-truth files; bump when the contents change
+GT_CACHE_FORMAT = 2
+
+# Environment variable that overrides the default cache directory
+CACHE_DIR_ENV_VARIABLE = "MACVI_USV_ODCE_CACHE_DIR"
+
+
+def default_cache_dir():
+    """
+    Return the directory in which the toolkit caches prepared data (e.g., ground truth of dataset subsets).
+
+    The MACVI_USV_ODCE_CACHE_DIR environment variable takes precedence over the default,
+    ~/.cache/macvi-usv-odce-toolkit.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VARIABLE)
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "macvi-usv-odce-toolkit")
+    return cache_dir
+
+
+def lars_file_exists(lars_path, relative_path):
+    """
+    Check whether the file with given path (relative to the dataset root) exists in the LaRS dataset, which can be
+    either an unpacked directory or the distribution zip archive (see lars_archive module).
+    """
+    if lars_archive.is_archive(lars_path):
+        return relative_path in lars_archive.open_archive(lars_path)
+    return os.path.isfile(f'{lars_path}/{relative_path}')
+
+
+def open_lars_file(lars_path, relative_path):
+    """
+    Open the file with given path (relative to the dataset root) from the LaRS dataset, which can be either an
+    unpacked directory or the distribution zip archive (see lars_archive module), as a binary file-like object.
+    """
+    if lars_archive.is_archive(lars_path):
+        return lars_archive.open_archive(lars_path).open(relative_path)
+    return open(f'{lars_path}/{relative_path}', 'rb')
+
+
+def read_lars_image(lars_path, relative_path, flags=cv2.IMREAD_COLOR):
+    """
+    Read and decode the image with given path (relative to the dataset root) from the LaRS dataset, which can be
+    either an unpacked directory or the distribution zip archive; images in the archive are decoded from the member's
+    bytes, without extracting them. Returns None if the image does not exist or cannot be decoded (as cv2.imread()).
+    """
+    if lars_archive.is_archive(lars_path):
+        archive = lars_archive.open_archive(lars_path)
+        if relative_path not in archive:
+            return None
+        return cv2.imdecode(np.frombuffer(archive.read(relative_path), dtype=np.uint8), flags)
+    return cv2.imread(f'{lars_path}/{relative_path}', flags)
+
+
+def subset_fingerprint(lars_path, eval_set):
+    """
+    Return the fingerprint of the specified dataset subset: the subset name and SHA-256 hash of its annotations file.
+    """
+    with open_lars_file(lars_path, f'{eval_set}/panoptic_annotations.json') as fp:
+        return f"{eval_set}:{utils.file_sha256(fp)}"
 
 
 def load_camera_calibration(filename):
@@ -34,3 +104,226 @@ def load_camera_calibration(filename):
     calibration['imageSize'] = int(node_width.real()), int(node_height.real())
 
     return calibration
+
+
+def load_ignore_mask(lars_path, eval_set, file_name):
+    """
+    Load the ignore mask for the specified LaRS frame.
+
+    The ignore mask is constructed from the panoptic mask (ignore label in the last channel) and from the semantic
+    mask (pixels labelled as 255).
+
+    Parameters
+    ----------
+    lars_path : str
+        Path to the LaRS dataset.
+    eval_set : str
+        Subset, either train, test or val.
+    file_name : str
+        File name of the frame's annotation masks (as given in the panoptic annotations).
+
+    Returns
+    -------
+    ignore_mask : numpy.ndarray
+        A 2D mask of type numpy.uint8; ignored pixels are set to 1, others to 0.
+    """
+    pan_ann = read_lars_image(lars_path, f'{eval_set}/panoptic_masks/{file_name}')[..., -1]
+    sem_ann = read_lars_image(lars_path, f'{eval_set}/semantic_masks/{file_name}')[..., 0]
+
+    ignore_mask = np.zeros_like(sem_ann, dtype=np.uint8)
+    ignore_mask[(pan_ann == 1) | (sem_ann == 255)] = 1
+
+    return ignore_mask
+
+
+class LarsSubset:
+    """
+    A loaded LaRS subset: frames (sorted by image ID), their ground truth in columnar form, and their ignore masks.
+
+    The ground truth is prepared from the subset's panoptic annotations and, unless disabled, stored in a cache file,
+    which is re-used as long as the annotations file (identified by its SHA-256 hash) and the toolkit version do not
+    change. Ignore masks are decoded on first access and, unless disabled, cached in memory. Keeping an instance around
+    allows evaluation of multiple results files without re-reading the annotations and re-decoding the masks.
+
+    Parameters
+    ----------
+    lars_path : str
+        Path to the LaRS dataset: either the unpacked dataset directory, or its zip archive.
+    eval_set : str
+        Subset to load, either train, test or val.
+    cache_masks : bool, optional
+        Keep decoded ignore masks in memory.
+    gt_cache : bool, optional
+        Load the prepared ground truth from (and store it into) the cache directory.
+    cache_dir : str, optional
+        Cache directory; defaults to default_cache_dir().
+
+    Attributes
+    ----------
+    annotations : list
+        Per-frame entries (dictionaries with 'image_id' and 'file_name'), sorted by image ID.
+    image_sizes : numpy.ndarray
+        (N x 2) array with (height, width) of each frame's image, as given in the annotations file; -1 if unknown.
+    gt_boxes, gt_areas, gt_iscrowd, gt_categories : numpy.ndarray
+        Columnar ground truth of all frames; see frame_ground_truth().
+    gt_offsets : numpy.ndarray
+        Annotations of frame i are at positions gt_offsets[i]:gt_offsets[i + 1] of the columnar arrays.
+    """
+    _GT_ARRAYS = (
+        'image_ids',
+        'file_names',
+        'image_sizes',
+        'gt_boxes',
+        'gt_areas',
+        'gt_iscrowd',
+        'gt_categories',
+        'gt_offsets',
+    )
+
+    def __init__(self, lars_path, eval_set, cache_masks=True, gt_cache=True, cache_dir=None):
+        assert eval_set in {'train', 'test', 'val'}
+
+        self.lars_path = lars_path
+        self.eval_set = eval_set
+        self.cache_masks = cache_masks
+
+        gt = None
+        if gt_cache:
+            with open_lars_file(lars_path, self._annotations_member) as fp:
+                annotations_hash = utils.file_sha256(fp)
+            cache_file = os.path.join(cache_dir or default_cache_dir(), f"gt-{eval_set}-{annotations_hash}.npz")
+            gt = self._load_gt_cache(cache_file, annotations_hash)
+
+        if gt is None:
+            with open_lars_file(lars_path, self._annotations_member) as fp:
+                dataset = json.load(fp)
+            gt = self._prepare_ground_truth(
+                sorted(dataset['annotations'], key=lambda d: d['image_id']),
+                dataset.get('images', []),
+            )
+            if gt_cache:
+                self._save_gt_cache(cache_file, annotations_hash, gt)
+
+        self.annotations = [
+            {'image_id': image_id, 'file_name': file_name}
+            for image_id, file_name in zip(gt['image_ids'].tolist(), gt['file_names'].tolist())
+        ]
+        self.image_sizes = gt['image_sizes']
+        self.gt_boxes = gt['gt_boxes']
+        self.gt_areas = gt['gt_areas']
+        self.gt_iscrowd = gt['gt_iscrowd']
+        self.gt_categories = gt['gt_categories']
+        self.gt_offsets = gt['gt_offsets']
+
+        self._ignore_masks = {}
+
+    @staticmethod
+    def _prepare_ground_truth(annotations, images):
+        # Columnar ground truth of all frames. The position of an annotation in these arrays is its global annotation
+        # ID, as assigned in evaluation.convert_to_coco_structures().
+        segments = [segment for annotation in annotations for segment in annotation.get('segments_info', [])]
+        num_segments = [len(annotation.get('segments_info', [])) for annotation in annotations]
+        image_sizes = {image['id']: (image['height'], image['width']) for image in images}
+
+        return {
+            'image_ids': np.array([annotation['image_id'] for annotation in annotations], dtype=np.int64),
+            'file_names': np.array([annotation['file_name'] for annotation in annotations], dtype=np.str_),
+            'image_sizes': np.array(
+                [image_sizes.get(annotation['image_id'], (-1, -1)) for annotation in annotations],
+                dtype=np.int64,
+            ).reshape(-1, 2),
+            'gt_boxes': np.array(
+                [[int(x) for x in segment['bbox']] for segment in segments],
+                dtype=np.float64,
+            ).reshape(-1, 4),
+            'gt_areas': np.array([segment['area'] for segment in segments], dtype=np.float64),
+            'gt_iscrowd': np.array([bool(segment['iscrowd']) for segment in segments], dtype=bool),
+            'gt_categories': np.array([segment.get('category_id', 0) for segment in segments], dtype=np.int64),
+            'gt_offsets': np.concatenate([[0], np.cumsum(num_segments)]).astype(np.int64),
+        }
+
+    @classmethod
+    def _load_gt_cache(cls, cache_file, annotations_hash):
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with np.load(cache_file, allow_pickle=False) as data:
+                header = (int(data['format']), str(data['toolkit_version']), str(data['annotations_hash']))
+                if header != (GT_CACHE_FORMAT, __version__, annotations_hash):
+                    return None
+                return {key: data[key] for key in cls._GT_ARRAYS}
+        except Exception as e:
+            logging.warning("Ignoring invalid ground-truth cache file %r: %s", cache_file, e)
+            return None
+
+    @staticmethod
+    def _save_gt_cache(cache_file, annotations_hash, gt):
+        # Write to a temporary file and rename it, so that concurrent readers never see a partial file. Failure to
+        # write the cache (e.g., read-only home directory) is not fatal.
+        tmp_file = cache_file + f".{os.getpid()}.tmp.npz"
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            np.savez(
+                tmp_file,
+                format=GT_CACHE_FORMAT,
+                toolkit_version=__version__,
+                annotations_hash=annotations_hash,
+                **gt,
+            )
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logging.warning("Failed to write ground-truth cache file %r: %s", cache_file, e)
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    @property
+    def _annotations_member(self):
+        return f'{self.eval_set}/panoptic_annotations.json'
+
+    @property
+    def annotations_file(self):
+        """Full path to the subset's panoptic annotations file (within the archive, if the dataset is zipped)."""
+        return f'{self.lars_path}/{self._annotations_member}'
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def frame_ground_truth(self, index):
+        """
+        Return the ground truth of the frame with given index: boxes, areas, crowd flags, and global annotation IDs.
+        """
+        start, end = self.gt_offsets[index], self.gt_offsets[index + 1]
+        return (
+            self.gt_boxes[start:end],
+            self.gt_areas[start:end],
+            self.gt_iscrowd[start:end],
+            np.arange(start, end, dtype=np.int64),
+        )
+
+    def image_id(self, index):
+        """
+        Return the image ID of the frame with given index.
+        """
+        return self.annotations[index]['image_id']
+
+    def ignore_mask(self, index):
+        """
+        Return the ignore mask for the frame with given index (position in annotations list).
+        """
+        ignore_mask = self._ignore_masks.get(index)
+        if ignore_mask is None:
+            ignore_mask = load_ignore_mask(self.lars_path, self.eval_set, self.annotations[index]['file_name'])
+            if self.cache_masks:
+                self._ignore_masks[index] = ignore_mask
+        return ignore_mask
+
+
+def sequence_name(file_name):
+    """
+    Return the name of the sequence to which the LaRS frame with given file name belongs.
+
+    LaRS frame names consist of sequence name and frame number, separated by an underscore
+    (e.g., yt028_01_00030.png belongs to sequence yt028_01).
+    """
+    stem = file_name.rsplit('.', 1)[0]
+    return stem.rsplit('_', 1)[0]
@@ -0,0 +1,110 @@
+import collections
+
+from .dataset import sequence_name
+from . import evaluation
+from . import matching
+
+
+def diff_detection_results(dataset, results_a, results_b, ignore_regions=False):
+    """
+    Compare two detection results on the same dataset subset, frame by frame.
+
+    Both results are evaluated against the same loaded dataset, using the frame-level evaluation (see matching module).
+    Frames in which both results contain identical detections are evaluated only once.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results_a : dict
+        Parsed reference (e.g., previous) detection results.
+    results_b : dict
+        Parsed detection results to compare against the reference.
+    ignore_regions : bool, optional
+        Also compare the number of detections in ignore regions (requires decoding the ignore masks).
+
+    Returns
+    -------
+    report : dict
+        Dictionary with F-scores of both results ('f_scores_a', 'f_scores_b'), per-frame comparison of changed frames
+        ('frames'), and per-sequence comparison ('sequences'). Frames and sequences are ranked by regression, i.e., by
+        the number of lost true positives plus the number of gained false positives (improvements have negative
+        values and come last).
+    """
+    detections_a = evaluation.pair_results_with_frames(dataset, results_a)
+    detections_b = evaluation.pair_results_with_frames(dataset, results_b)
+
+    accumulator_a = matching.FScoreAccumulator()
+    accumulator_b = matching.FScoreAccumulator()
+
+    frames = []
+    sequences = collections.OrderedDict()
+    num_identical = 0
+    for index, (frame_detections_a, frame_detections_b) in enumerate(zip(detections_a, detections_b)):
+        boxes_a = evaluation.detections_to_boxes(frame_detections_a)
+        boxes_b = evaluation.detections_to_boxes(frame_detections_b)
+
+        result_a = evaluation.evaluate_frame_detections(dataset, index, boxes_a, ignore_regions=ignore_regions)
+        if boxes_a.tobytes() == boxes_b.tobytes():
+            result_b = result_a  # Identical detections; skip re-matching
+            num_identical += 1
+        else:
+            result_b = evaluation.evaluate_frame_detections(dataset, index, boxes_b, ignore_regions=ignore_regions)
+
+        accumulator_a.add(result_a)
+        accumulator_b.add(result_b)
+
+        if result_b is result_a:
+            continue
+
+        tp_a, fp_a, fn_a = result_a.counts()
+        tp_b, fp_b, fn_b = result_b.counts()
+        file_name = dataset.annotations[index]['file_name']
+        frame = {
+            'image_id': dataset.image_id(index),
+            'file_name': file_name,
+            'sequence': sequence_name(file_name),
+            'tp_a': tp_a,
+            'fp_a': fp_a,
+            'fn_a': fn_a,
+            'tp_b': tp_b,
+            'fp_b': fp_b,
+            'fn_b': fn_b,
+            'delta_tp': tp_b - tp_a,
+            'delta_fp': fp_b - fp_a,
+            'delta_fn': fn_b - fn_a,
+            'regression': (tp_a - tp_b) + (fp_b - fp_a),
+        }
+        if ignore_regions:
+            frame['delta_in_ignore_region'] = (
+                int(result_b.det_in_ignore_region.sum()) - int(result_a.det_in_ignore_region.sum())
+            )
+        deltas = ('delta_tp', 'delta_fp', 'delta_fn', 'delta_in_ignore_region')
+        if not any(frame[key] for key in deltas if key in frame):
+            continue  # Detections changed, but outcome did not
+        frames.append(frame)
+
+        sequence = sequences.setdefault(frame['sequence'], {
+            'sequence': frame['sequence'],
+            'num_changed_frames': 0,
+            'delta_tp': 0,
+            'delta_fp': 0,
+            'delta_fn': 0,
+            'regression': 0,
+        })
+        sequence['num_changed_frames'] += 1
+        for key in ('delta_tp', 'delta_fp', 'delta_fn', 'regression'):
+            sequence[key] += frame[key]
+
+    frames.sort(key=lambda frame: frame['regression'], reverse=True)  # Stable; keeps dataset order within ties
+    sequences = sorted(sequences.values(), key=lambda sequence: sequence['regression'], reverse=True)
+
+    return {
+        'f_scores_a': [float(value) for value in accumulator_a.f_scores()],
+        'f_scores_b': [float(value) for value in accumulator_b.f_scores()],
+        'num_frames': len(dataset),
+        'num_identical_frames': num_identical,
+        'num_changed_frames': len(frames),
+        'frames': frames,
+        'sequences': sequences,
+    }
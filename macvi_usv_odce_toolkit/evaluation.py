@@ -1,20 +1,24 @@
-import os
-import json
-import tempfile
 import contextlib  # redirect_stdout
 
-import cv2
 import numpy as np
 
-import pycocotools.coco
-import pycocotools.cocoeval
-
-from .dataset import load_camera_calibration
-from .danger_zone_mask import construct_mask_from_danger_zone
-from .sea_edge_mask import construct_mask_from_sea_edge
+from .dataset import LarsSubset
+from . import coco_adapter
+from . import mask_pyramid
+from . import matching
+from . import results_io
 from . import utils
 
-def convert_to_coco_structures(lars_path, eval_set, results_json_file):
+
+def _detection_category(detection):
+    # Category of a detection, required by the class-aware evaluation
+    try:
+        return int(detection['category_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Class-aware evaluation requires an integer 'category_id' in all detections!") from None
+
+
+def convert_to_coco_structures(lars_path, eval_set, results_json_file, dataset=None, class_aware=False, results=None):
     """
     Convert the dataset annotations and detection results in COCO-compatible data structures.
 
@@ -24,8 +28,17 @@ def convert_to_coco_structures(lars_path, eval_set, results_json_file):
         Path to the LaRS dataset.
     eval_set : str
         Subset to evaluate, either train, test or val
-    results_json_file : str
-        Full path to detection results JSON file.
+    results_json_file : str or file-like
+        Full path to detection results file (JSON, or NPZ; see results_io module), or a readable file-like object
+        with JSON contents (e.g., a submission archive member).
+    dataset : LarsSubset, optional
+        Pre-loaded dataset subset (see dataset.LarsSubset). If provided, lars_path and eval_set are ignored, and
+        the subset's annotations and cached ignore masks are used.
+    class_aware : bool, optional
+        Keep the categories of annotations and detections ('category_id'), instead of assigning all of them to a
+        single obstacle category.
+    results : dict, optional
+        Pre-parsed detection results (contents of results JSON file). If provided, results_json_file is ignored.
 
     Returns
     -------
@@ -35,27 +48,16 @@ def convert_to_coco_structures(lars_path, eval_set, results_json_file):
         List containing detection results in COCO-compatible data structure.
     """
 
-    assert eval_set in {'train', 'test', 'val'}
-
-    dataset_json_filename = f'{lars_path}/{eval_set}/panoptic_annotations.json'    
-
     # Load dataset JSON file
-    with open(dataset_json_filename, 'r') as fp:
-        dataset = json.load(fp)
+    if dataset is None:
+        dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
 
     # Load results (detections) file
-    with open(results_json_file, 'r') as fp:
-        results = json.load(fp)
-
-    dataset_annotations = dataset['annotations']
-    results_annotations = results['annotations']
+    if results is None:
+        results = results_io.load_results(results_json_file, dataset=dataset)
 
-    # sort both annotation arrays by id
-    dataset_annotations = sorted(dataset_annotations, key=lambda d: d['image_id'])
-    results_annotations = sorted(results_annotations, key=lambda d: d['image_id'])
-
-    # Sanity check
-    assert len(dataset_annotations) == len(results_annotations), "Mismatch in dataset and result sequences length! Did you perhaps supply results for the wrong LaRS subset?"
+    # Pair the results with the dataset frames (sorted by id; includes sanity checks)
+    frame_detections = pair_results_with_frames(dataset, results)
 
     # Global lists of images, annoations, and detections - we are going to merge individual sequences into a single one.
     image_entries = []
@@ -65,51 +67,49 @@ def convert_to_coco_structures(lars_path, eval_set, results_json_file):
     image_id = 0
     annotation_id = 0
 
-    for data_ann, result_ann in zip(dataset_annotations, results_annotations):
-
-        assert data_ann['file_name'][:-4] == result_ann['file_name'][:-4], "Dataset and results sequence ID mismatch!"
-
-        pan_ann_fn = f'{lars_path}/{eval_set}/panoptic_masks/{data_ann["file_name"]}'
-        sem_ann_fn = f'{lars_path}/{eval_set}/semantic_masks/{data_ann["file_name"]}'
-
-        pan_ann = cv2.imread(pan_ann_fn)[...,-1]
-        sem_ann = cv2.imread(sem_ann_fn)[...,0]
+    for frame_idx, detected_obstacles in enumerate(frame_detections):
 
-        image_height, image_width = sem_ann.shape
+        ignore_mask = dataset.ignore_mask(frame_idx)
 
-        ignore_mask = np.zeros_like(sem_ann, dtype=np.uint8)
-        ignore_mask[(pan_ann==1) | (sem_ann==255)]=1        
+        image_height, image_width = ignore_mask.shape
 
-        annotated_obstacles = data_ann.get('segments_info', [])
-        detected_obstacles = result_ann.get('detections', [])
+        gt_boxes, gt_areas, gt_iscrowd, gt_ids = dataset.frame_ground_truth(frame_idx)
+        gt_categories = dataset.gt_categories[gt_ids] if class_aware else np.zeros(len(gt_ids), dtype=np.int64)
 
         # process GT
-        for annotated_obstacle in annotated_obstacles:
-            bbox = annotated_obstacle['bbox']
+        for bbox, area, iscrowd, class_id in zip(
+            gt_boxes.tolist(),
+            gt_areas.tolist(),
+            gt_iscrowd.tolist(),
+            gt_categories.tolist(),
+        ):
             bbox = [int(x) for x in bbox]
             ignore = False
 
-            class_id = 0
-
             annotation_entries.append({
                 'id': annotation_id,
                 'image_id': image_id,
                 'category_id': class_id,
                 'bbox': bbox,
-                'iscrowd': annotated_obstacle['iscrowd'],
-                'area': annotated_obstacle['area'],
+                'iscrowd': int(iscrowd),
+                'area': area,
                 'segmentation': [],
                 'ignore': int(ignore),  # bool -> int
             })
             annotation_id += 1  # Increment global annotation ID
 
-        # iterate over detections and check overlap with mask
-        for detected_obstacle in detected_obstacles:
-            bbox = detected_obstacle['bbox']
+        # check overlap of detections with mask (see mask_pyramid module)
+        detections_ignore = mask_pyramid.boxes_in_mask(
+            ignore_mask,
+            detections_to_boxes(detected_obstacles),
+            thr=matching.IGNORE_OVERLAP_THRESHOLD,
+        )
 
-            ignore = utils.bbox_in_mask(ignore_mask, bbox, thr=0.75)
+        # iterate over detections
+        for detected_obstacle, ignore in zip(detected_obstacles, detections_ignore.tolist()):
+            bbox = detected_obstacle['bbox']
 
-            class_id = 0
+            class_id = _detection_category(detected_obstacle) if class_aware else 0
 
             detection_entries.append({
                 'image_id': image_id,
@@ -123,20 +123,29 @@ def convert_to_coco_structures(lars_path, eval_set, results_json_file):
             'id': image_id,
             'width': image_width,
             'height': image_height,
-            'file_name': data_ann["file_name"],
+            'file_name': dataset.annotations[frame_idx]["file_name"],
         })
         image_id += 1  # Increment global image ID    
 
     # COCO dataset/ground truth structure
+    if class_aware:
+        category_ids = sorted(set(entry['category_id'] for entry in annotation_entries + detection_entries))
+        categories = [{
+            'id': category_id,
+            'name': f'obstacle {category_id}',
+            'supercategory': 'obstacle',
+        } for category_id in category_ids]
+    else:
+        categories = [{
+            'id': 0,
+            'name': 'obstacle',
+            'supercategory': 'obstacle',
+        }]
     coco_dataset = {
         'info': {
             'year': 2023,
         },
-        'categories': [{
-            'id': 0,
-            'name': 'obstacle',
-            'supercategory': 'obstacle',
-        }],
+        'categories': categories,
         'annotations': annotation_entries,
         'images': image_entries,
     }
@@ -146,7 +155,317 @@ def convert_to_coco_structures(lars_path, eval_set, results_json_file):
 
     return coco_dataset, coco_results
 
-def evaluate_detection_results(lars_path, eval_set, results_json_file):
+def pair_results_with_frames(dataset, results):
+    """
+    Pair the per-frame entries of detection results with the frames of the dataset.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+
+    Returns
+    -------
+    detections : list
+        List with one entry per dataset frame (in dataset order), containing the list of the frame's detections.
+    """
+    results_annotations = sorted(results['annotations'], key=lambda d: d['image_id'])
+
+    # Sanity check
+    assert len(dataset.annotations) == len(results_annotations), \
+        "Mismatch in dataset and result sequences length! Did you perhaps supply results for the wrong LaRS subset?"
+
+    detections = []
+    for data_ann, result_ann in zip(dataset.annotations, results_annotations):
+        assert data_ann['file_name'][:-4] == result_ann['file_name'][:-4], "Dataset and results sequence ID mismatch!"
+        detections.append(result_ann.get('detections', []))
+
+    return detections
+
+
+def detections_to_boxes(detections):
+    """
+    Convert the list of detections (dictionaries with 'bbox' key) into (D x 4) array of boxes.
+    """
+    return np.array([detection['bbox'] for detection in detections], dtype=np.float64).reshape(-1, 4)
+
+
+def evaluate_frame_detections(dataset, index, det_boxes, ignore_regions=True, iou_threshold=matching.IOU_THRESHOLD):
+    """
+    Evaluate the detections of the specified dataset frame using the frame-level evaluation (see matching module).
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    index : int
+        Frame index.
+    det_boxes : numpy.ndarray
+        (D x 4) array of detection boxes.
+    ignore_regions : bool, optional
+        Check detections against the frame's ignore mask (requires decoding the mask).
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    result : matching.FrameResult
+        Evaluation outcome of the frame.
+    """
+    gt_boxes, gt_areas, gt_iscrowd, gt_ids = dataset.frame_ground_truth(index)
+    return matching.evaluate_frame(
+        gt_boxes,
+        gt_areas,
+        gt_iscrowd,
+        gt_ids,
+        det_boxes,
+        ignore_mask=dataset.ignore_mask(index) if ignore_regions else None,
+        iou_threshold=iou_threshold,
+        index=index,
+        image_id=dataset.image_id(index),
+    )
+
+
+def iter_frame_results(dataset, results, ignore_regions=False, iou_threshold=matching.IOU_THRESHOLD):
+    """
+    Evaluate detection results frame by frame, yielding the outcome of each frame as soon as it is computed.
+
+    Frames are processed in dataset order, so the yielded results can be fed directly into matching.FScoreAccumulator
+    (see stream_detection_results()). Nothing is retained between frames, so the memory footprint does not grow with
+    the number of frames (provided that the dataset does not cache ignore masks).
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    ignore_regions : bool, optional
+        Check detections against the frames' ignore masks (requires decoding the masks). This does not affect the
+        outcomes or F-scores; see matching.FrameResult.det_in_ignore_region.
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Yields
+    ------
+    result : matching.FrameResult
+        Evaluation outcome of the next frame.
+    """
+    for index, detections in enumerate(pair_results_with_frames(dataset, results)):
+        det_boxes = detections_to_boxes(detections)
+        yield evaluate_frame_detections(
+            dataset,
+            index,
+            det_boxes,
+            ignore_regions=ignore_regions,
+            iou_threshold=iou_threshold,
+        )
+
+
+def stream_detection_results(dataset, results, ignore_regions=False, iou_threshold=matching.IOU_THRESHOLD):
+    """
+    Evaluate detection results frame by frame, accumulating F-scores along the way.
+
+    This is the streaming counterpart of evaluate_detection_results(): once all frames have been consumed, the
+    accumulator's F-scores are identical to those returned by the latter. The accumulator can be queried at any point
+    for partial F-scores over the frames processed so far.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    ignore_regions : bool, optional
+        See iter_frame_results().
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Yields
+    ------
+    result : matching.FrameResult
+        Evaluation outcome of the next frame.
+    accumulator : matching.FScoreAccumulator
+        Accumulator that already includes the yielded frame (the same object is yielded for all frames).
+    """
+    accumulator = matching.FScoreAccumulator()
+    frame_results = iter_frame_results(dataset, results, ignore_regions=ignore_regions, iou_threshold=iou_threshold)
+    for frame_result in frame_results:
+        accumulator.add(frame_result)
+        yield frame_result, accumulator
+
+
+def _frame_boxes(frame_detections):
+    # Convert the detections of a single frame (see pair_detections_with_frames()) into (D x 4) array of boxes
+    if isinstance(frame_detections, dict):
+        boxes = np.asarray(frame_detections['boxes'], dtype=np.float64).reshape(-1, 4)
+        scores = frame_detections.get('scores')
+        if scores is not None:
+            scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+            if len(scores) != len(boxes):
+                raise ValueError(f"Got {len(scores)} scores for {len(boxes)} boxes!")
+            boxes = boxes[np.argsort(-scores, kind='stable')]
+        return boxes
+    if isinstance(frame_detections, (list, tuple)) and frame_detections and isinstance(frame_detections[0], dict):
+        return detections_to_boxes(frame_detections)
+    return np.asarray(frame_detections, dtype=np.float64).reshape(-1, 4)
+
+
+def pair_detections_with_frames(dataset, detections):
+    """
+    Pair in-memory detections, keyed by image ID, with the frames of the dataset.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    detections : dict
+        Detections, keyed by image ID. The detections of a frame are given either as (D x 4) array-like of boxes
+        (x, y, w, h), as a list of detection dictionaries with 'bbox' key (as in results JSON file), or as a dictionary
+        with 'boxes' (D x 4) and optional 'scores' (D). Scores only determine the order of the frame's detections
+        (highest first), which is equivalent to listing them in that order in a results file; the evaluation protocol
+        itself assigns the same score to all detections. Frames without an entry have no detections.
+
+    Returns
+    -------
+    det_boxes : list
+        List with one (D x 4) array of boxes per dataset frame (in dataset order).
+    """
+    image_ids = {annotation['image_id']: index for index, annotation in enumerate(dataset.annotations)}
+    unknown = [image_id for image_id in detections if image_id not in image_ids]
+    if unknown:
+        raise ValueError(
+            f"Detections for {len(unknown)} image ID(s) not in the {dataset.eval_set!r} subset, e.g., {unknown[0]!r}!"
+        )
+
+    det_boxes = [np.zeros((0, 4))] * len(dataset.annotations)
+    for image_id, frame_detections in detections.items():
+        det_boxes[image_ids[image_id]] = _frame_boxes(frame_detections)
+    return det_boxes
+
+
+def evaluate_detections(dataset, detections, iou_threshold=matching.IOU_THRESHOLD):
+    """
+    Evaluate in-memory detections, without writing and parsing a results JSON file.
+
+    Intended for repeated evaluation within the same process (e.g., per-epoch validation during training): the
+    dataset subset is loaded once and reused, and the evaluation uses the frame-level matching (see matching module),
+    whose F-scores are identical to those of evaluate_detection_results(). No ignore masks are decoded.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    detections : dict
+        Detections, keyed by image ID; see pair_detections_with_frames().
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    f_scores : tuple
+        A four-element tuple containing F-score values: F_all, F_small, F_medium, and F_large.
+    """
+    accumulator = matching.FScoreAccumulator()
+    for index, det_boxes in enumerate(pair_detections_with_frames(dataset, detections)):
+        accumulator.add(evaluate_frame_detections(
+            dataset,
+            index,
+            det_boxes,
+            ignore_regions=False,
+            iou_threshold=iou_threshold,
+        ))
+    return accumulator.f_scores()
+
+
+def evaluate_classes(dataset, results, iou_threshold=matching.IOU_THRESHOLD):
+    """
+    Evaluate detection results class-agnostically and for each class, in a single pass over the frames.
+
+    The class-agnostic F-scores are those of the official protocol (see evaluate_detection_results()). The F-scores of
+    a class are those of pycocotools with categories kept on both sides (see convert_to_coco_structures() with
+    class_aware=True): only the class's annotations and detections are matched, and at most MAX_DETECTIONS detections
+    of the class are kept per frame. The IoU matrix of each frame is computed once, and shared by all classes.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file); all detections must have 'category_id'.
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    report : dict
+        Dictionary with class-agnostic 'f_scores' (F_all, F_small, F_medium, and F_large), and 'classes': for each
+        category ID present in annotations or detections (in ascending order), a dictionary with 'category_id',
+        'num_gt' and 'num_detections' (over all frames), and 'f_scores'.
+
+    Raises
+    ------
+    ValueError
+        If a detection has no category.
+    """
+    frames = pair_results_with_frames(dataset, results)
+    det_categories = [
+        np.array([_detection_category(detection) for detection in detections], dtype=np.int64)
+        for detections in frames
+    ]
+    category_ids = sorted(set(dataset.gt_categories.tolist()).union(*(set(c.tolist()) for c in det_categories)))
+
+    accumulator = matching.FScoreAccumulator()
+    class_accumulators = {category_id: matching.FScoreAccumulator() for category_id in category_ids}
+    class_num_gt = dict.fromkeys(category_ids, 0)
+    for index, (detections, categories) in enumerate(zip(frames, det_categories)):
+        gt_boxes, gt_areas, gt_iscrowd, gt_ids = dataset.frame_ground_truth(index)
+        gt_categories = dataset.gt_categories[gt_ids]
+        det_boxes = detections_to_boxes(detections)
+
+        # IoU of all detections (per-class truncation may keep detections beyond the first MAX_DETECTIONS)
+        ious = matching.compute_ious(det_boxes, gt_boxes, gt_iscrowd)
+        accumulator.add(matching.evaluate_frame(
+            gt_boxes,
+            gt_areas,
+            gt_iscrowd,
+            gt_ids,
+            det_boxes,
+            iou_threshold=iou_threshold,
+            ious=ious[:matching.MAX_DETECTIONS],
+        ))
+
+        for category_id in set(categories.tolist()).union(gt_categories.tolist()):
+            class_dets = np.flatnonzero(categories == category_id)
+            class_gt = np.flatnonzero(gt_categories == category_id)
+            class_num_gt[category_id] += len(class_gt)
+            class_accumulators[category_id].add(matching.evaluate_frame(
+                gt_boxes[class_gt],
+                gt_areas[class_gt],
+                gt_iscrowd[class_gt],
+                gt_ids[class_gt],
+                det_boxes[class_dets],
+                iou_threshold=iou_threshold,
+                ious=ious[np.ix_(class_dets[:matching.MAX_DETECTIONS], class_gt)],
+            ))
+
+    return {
+        'f_scores': [float(value) for value in accumulator.f_scores()],
+        'classes': [
+            {
+                'category_id': category_id,
+                'num_gt': class_num_gt[category_id],
+                'num_detections': int(class_accumulators[category_id].num_detections),
+                'f_scores': [float(value) for value in class_accumulators[category_id].f_scores()],
+            }
+            for category_id in category_ids
+        ],
+    }
+
+
+def evaluate_detection_results(lars_path, eval_set, results_json_file, dataset=None, num_workers=None, results=None):
     """
     Evaluate detection results.
 
@@ -159,8 +478,16 @@ def evaluate_detection_results(lars_path, eval_set, results_json_file):
         Path to the LaRS dataset.
     eval_set : str
         Subset to evaluate, either train, test or val
-    results_json_file : str
-        Full path to detection results JSON file.
+    results_json_file : str or file-like
+        Full path to detection results file (JSON, or NPZ; see results_io module), or a readable file-like object
+        with JSON contents (e.g., a submission archive member).
+    dataset : LarsSubset, optional
+        Pre-loaded dataset subset; see convert_to_coco_structures().
+    num_workers : int, optional
+        Number of processes for the per-image evaluation (see coco_adapter.LeanCOCOeval.evaluate()); the results do
+        not depend on it. By default, the images are evaluated in the current process.
+    results : dict, optional
+        Pre-parsed detection results; see convert_to_coco_structures().
 
     Returns
     -------
@@ -173,6 +500,8 @@ def evaluate_detection_results(lars_path, eval_set, results_json_file):
         lars_path,
         eval_set,
         results_json_file,
+        dataset=dataset,
+        results=results,
     )
 
     # handle empty json results
@@ -181,22 +510,16 @@ def evaluate_detection_results(lars_path, eval_set, results_json_file):
 
     # Capture pycocotools' output to prevent spamming stdout with its diagnostic messages
     with contextlib.redirect_stdout(None):
-        # Initialize COCO helper classes from in-memory data, to avoid having to write them to temporary files...
-        coco_dataset = pycocotools.coco.COCO()
-        # This is equivalent to passing filename to pycocotools.coco.COCO()
-        coco_dataset.dataset = dataset_dict
-        coco_dataset.createIndex()
-
-        # coco_dataset.loadRes() can be passed either filename or a list
-        print(results_list)
+        # Initialize COCO helper classes from in-memory data, without copying them (see coco_adapter module)
+        coco_dataset = coco_adapter.LeanCOCO(dataset_dict)
         coco_results = coco_dataset.loadRes(results_list)
 
         # Create evaluation...
-        coco_evaluation = pycocotools.cocoeval.COCOeval(coco_dataset, coco_results, iouType='bbox')
+        coco_evaluation = coco_adapter.LeanCOCOeval(coco_dataset, coco_results, iouType='bbox')
         coco_evaluation.params.iouThrs = np.array([0.3, 0.3])  # IoU thresholds for evaluation
 
         # ... and evaluate
-        coco_evaluation.evaluate()
+        coco_evaluation.evaluate(num_workers=num_workers)
         coco_evaluation.accumulate()
         coco_evaluation.summarize()
 
@@ -204,15 +527,9 @@ def evaluate_detection_results(lars_path, eval_set, results_json_file):
     stats[stats == -1] = 0
 
     # Compute F-scores
-    def _f_score(precision, recall):
-        if precision != 0 and recall != 0:
-            return 2 * (precision * recall) / (precision + recall)
-        else:
-            return 0
-
-    f_all = _f_score(stats[0], stats[8])
-    f_small = _f_score(stats[3], stats[9])
-    f_medium = _f_score(stats[4], stats[10])
-    f_large = _f_score(stats[5], stats[11])
+    f_all = utils.f_score(stats[0], stats[8])
+    f_small = utils.f_score(stats[3], stats[9])
+    f_medium = utils.f_score(stats[4], stats[10])
+    f_large = utils.f_score(stats[5], stats[11])
 
     return f_all, f_small, f_medium, f_large
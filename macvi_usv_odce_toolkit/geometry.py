@@ -0,0 +1,135 @@
+"""
+Registry of per-sequence camera geometry for danger-zone evaluation.
+
+Danger-zone masks (see danger_zone_mask module) require the camera calibration of the sequence for every frame. The
+registry parses each calibration file once, and caches the quantities derived from it (camera matrix, distortion
+coefficients, image size), as well as the danger-zone arc samples, which depend only on the camera's field of view.
+A single registry can be shared across frames, evaluation setups, and batch runs; cached entries are dropped only on
+explicit invalidation.
+"""
+import os
+
+import numpy as np
+
+from .dataset import load_camera_calibration
+from .danger_zone_mask import construct_mask_from_danger_zone, danger_zone_arc
+
+
+def _read_only(array):
+    array = np.array(array)
+    array.flags.writeable = False
+    return array
+
+
+class CameraGeometry:
+    """
+    Camera geometry derived from a calibration file.
+
+    Attributes
+    ----------
+    calibration_file : str
+        Absolute path to the calibration file.
+    camera_matrix : numpy.ndarray
+        Camera (intrinsics) matrix (M1), read-only.
+    dist_coeffs : numpy.ndarray
+        Distortion coefficients (D1), read-only.
+    image_size : tuple
+        Image size (width, height), in pixels.
+    """
+    __slots__ = ('calibration_file', 'camera_matrix', 'dist_coeffs', 'image_size')
+
+    def __init__(self, calibration_file, calibration):
+        self.calibration_file = calibration_file
+        self.camera_matrix = _read_only(calibration['M1'])
+        self.dist_coeffs = _read_only(calibration['D1'])
+        self.image_size = tuple(calibration['imageSize'])
+
+
+class CalibrationRegistry:
+    """
+    Cache of camera geometry, keyed by calibration file, with sequences mapped to their calibration files.
+
+    Parameters
+    ----------
+    sequence_calibrations : dict, optional
+        Initial mapping of sequence names to calibration files (see register_sequence()).
+    """
+    def __init__(self, sequence_calibrations=None):
+        self._sequences = {}
+        self._geometries = {}
+        self._arcs = {}
+        self.num_loads = 0  # Number of parsed calibration files (for diagnostics)
+
+        for sequence, calibration_file in (sequence_calibrations or {}).items():
+            self.register_sequence(sequence, calibration_file)
+
+    def register_sequence(self, sequence, calibration_file):
+        """
+        Associate the sequence with its calibration file. Sequences sharing a calibration file share its geometry.
+        """
+        self._sequences[sequence] = os.path.abspath(calibration_file)
+
+    def geometry(self, calibration_file):
+        """
+        Return the CameraGeometry for the given calibration file, parsing the file on first access.
+        """
+        calibration_file = os.path.abspath(calibration_file)
+        geometry = self._geometries.get(calibration_file)
+        if geometry is None:
+            geometry = CameraGeometry(calibration_file, load_camera_calibration(calibration_file))
+            self._geometries[calibration_file] = geometry
+            self.num_loads += 1
+        return geometry
+
+    def sequence_geometry(self, sequence):
+        """
+        Return the CameraGeometry of the registered sequence.
+        """
+        try:
+            calibration_file = self._sequences[sequence]
+        except KeyError:
+            raise KeyError(f"No calibration file registered for sequence {sequence!r}!") from None
+        return self.geometry(calibration_file)
+
+    def arc(self, camera_fov=80):
+        """
+        Return the (read-only) danger-zone arc samples for the given camera field of view; see
+        danger_zone_mask.danger_zone_arc().
+        """
+        arc = self._arcs.get(camera_fov)
+        if arc is None:
+            arc = tuple(_read_only(values) for values in danger_zone_arc(camera_fov))
+            self._arcs[camera_fov] = arc
+        return arc
+
+    def danger_zone_mask(self, sequence, roll, pitch, camera_height, danger_zone_range, camera_fov=80, **kwargs):
+        """
+        Construct the danger-zone mask for a frame of the registered sequence, using the cached geometry; see
+        danger_zone_mask.construct_mask_from_danger_zone() for the description of parameters.
+        """
+        geometry = self.sequence_geometry(sequence)
+        image_width, image_height = geometry.image_size
+        return construct_mask_from_danger_zone(
+            roll,
+            pitch,
+            camera_height,
+            danger_zone_range,
+            geometry.camera_matrix,
+            geometry.dist_coeffs,
+            image_width,
+            image_height,
+            camera_fov=camera_fov,
+            arc=self.arc(camera_fov),
+            **kwargs,
+        )
+
+    def invalidate(self, calibration_file=None):
+        """
+        Drop the cached geometry of the given calibration file (e.g., after it was modified), or of all files if
+        none is given. Sequence registrations are kept.
+        """
+        if calibration_file is None:
+            self._geometries.clear()
+        else:
+            self._geometries.pop(os.path.abspath(calibration_file), None)
+
@@ -0,0 +1,238 @@
+"""
+Hard-example mining: export of the frames and boxes on which the detector fails.
+
+The outcome of each detection and ground-truth box is taken from the frame-level evaluation (see matching module):
+detections are matched (true positives), false positives, ignored (matched to crowd annotations), or discarded (beyond
+the per-frame limit); ground-truth boxes are matched, missed (false negatives), or ignored. False positives in ignore
+regions are marked as such and, by default, are not mined. Examples are ranked either by frame (the number of selected
+boxes in the frame) or by box (its area), and only the top K are kept in a bounded heap while streaming over the
+frames, so the memory footprint does not depend on the size of the subset.
+"""
+import csv
+import json
+import heapq
+
+from .dataset import sequence_name
+from . import evaluation
+from . import matching
+
+# Box outcomes
+OUTCOME_MATCHED = 'matched'
+OUTCOME_FP = 'fp'
+OUTCOME_FN = 'fn'
+OUTCOME_IGNORED = 'ignored'
+OUTCOME_DISCARDED = 'discarded'
+OUTCOMES = (OUTCOME_MATCHED, OUTCOME_FP, OUTCOME_FN, OUTCOME_IGNORED, OUTCOME_DISCARDED)
+
+# Outcomes of detections and ground-truth boxes, by their matching.DET_* and matching.GT_* codes
+DET_OUTCOMES = {
+    matching.DET_TP: OUTCOME_MATCHED,
+    matching.DET_FP: OUTCOME_FP,
+    matching.DET_IGNORED: OUTCOME_IGNORED,
+    matching.DET_DISCARDED: OUTCOME_DISCARDED,
+}
+GT_OUTCOMES = {
+    matching.GT_MATCHED: OUTCOME_MATCHED,
+    matching.GT_MISSED: OUTCOME_FN,
+    matching.GT_IGNORED: OUTCOME_IGNORED,
+}
+
+# Ranking criteria
+RANK_BY_COUNT = 'count'
+RANK_BY_SIZE = 'size'
+RANK_MODES = (RANK_BY_COUNT, RANK_BY_SIZE)
+
+DEFAULT_OUTCOMES = (OUTCOME_FP, OUTCOME_FN)
+DEFAULT_TOP_K = 1000
+
+# Columns of the exported examples (in CSV files)
+EXAMPLE_FIELDS = (
+    'rank',
+    'image_id',
+    'file_name',
+    'sequence',
+    'box_type',
+    'box_index',
+    'outcome',
+    'in_ignore_region',
+    'x',
+    'y',
+    'width',
+    'height',
+    'area',
+)
+
+
+def frame_box_outcomes(dataset, index, gt_boxes, det_boxes, frame_result):
+    """
+    Return the per-box outcomes of the evaluated frame.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    index : int
+        Frame index.
+    gt_boxes : numpy.ndarray
+        (G x 4) array of ground-truth boxes.
+    det_boxes : numpy.ndarray
+        (D x 4) array of detection boxes.
+    frame_result : matching.FrameResult
+        Evaluation outcome of the frame.
+
+    Returns
+    -------
+    examples : list
+        One dictionary per box (detections first, then ground-truth boxes), with the EXAMPLE_FIELDS entries other
+        than 'rank'. 'in_ignore_region' is None for ground-truth boxes, and for detections if the ignore mask was not
+        checked.
+    """
+    annotation = dataset.annotations[index]
+    frame = {
+        'image_id': annotation['image_id'],
+        'file_name': annotation['file_name'],
+        'sequence': sequence_name(annotation['file_name']),
+    }
+
+    def _example(box_type, box_index, outcome, box, in_ignore_region=None):
+        x, y, width, height = (float(value) for value in box)
+        return dict(
+            frame,
+            box_type=box_type,
+            box_index=box_index,
+            outcome=outcome,
+            in_ignore_region=in_ignore_region,
+            x=x,
+            y=y,
+            width=width,
+            height=height,
+            area=width * height,
+        )
+
+    in_ignore_region = frame_result.det_in_ignore_region
+    examples = [
+        _example(
+            'detection',
+            det_index,
+            DET_OUTCOMES[status],
+            box,
+            bool(in_ignore_region[det_index]) if in_ignore_region is not None else None,
+        )
+        for det_index, (box, status) in enumerate(zip(det_boxes.tolist(), frame_result.det_status.tolist()))
+    ]
+    examples += [
+        _example('ground_truth', gt_index, GT_OUTCOMES[status], box)
+        for gt_index, (box, status) in enumerate(zip(gt_boxes.tolist(), frame_result.gt_status.tolist()))
+    ]
+    return examples
+
+
+def mine_hard_examples(
+    dataset,
+    results,
+    outcomes=DEFAULT_OUTCOMES,
+    rank_by=RANK_BY_COUNT,
+    top_k=DEFAULT_TOP_K,
+    include_ignore_regions=False,
+    iou_threshold=matching.IOU_THRESHOLD,
+):
+    """
+    Mine the boxes with the selected outcomes, and rank them.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset; should not cache ignore masks, since each mask is needed only once.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    outcomes : iterable, optional
+        Outcomes (see OUTCOMES) of the boxes to export.
+    rank_by : str, optional
+        With RANK_BY_COUNT, frames are ranked by the number of selected boxes, and all selected boxes of the top K
+        frames are exported. With RANK_BY_SIZE, the selected boxes are ranked by their area, and the top K boxes are
+        exported.
+    top_k : int, optional
+        Number of top-ranked frames or boxes to export; None exports all.
+    include_ignore_regions : bool, optional
+        Also export false positives in ignore regions. If not set, the detections are checked against the frames'
+        ignore masks (which requires decoding the masks), and false positives in ignore regions are not exported.
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    examples : list
+        Exported boxes (see frame_box_outcomes()), ordered by rank; the 'rank' entry is the rank (starting at 1) of the
+        box's frame (RANK_BY_COUNT) or of the box itself (RANK_BY_SIZE). Ties are resolved in dataset order.
+    """
+    if rank_by not in RANK_MODES:
+        raise ValueError(f"Invalid ranking criterion {rank_by!r}; expected one of {RANK_MODES}!")
+    outcomes = set(outcomes)
+    unknown = outcomes - set(OUTCOMES)
+    if unknown:
+        raise ValueError(f"Invalid outcomes {sorted(unknown)}; expected some of {OUTCOMES}!")
+    check_ignore_regions = OUTCOME_FP in outcomes and not include_ignore_regions
+
+    # Bounded min-heap of (key, tie-breaker, payload); the tie-breaker favors earlier frames and boxes
+    heap = []
+    sequence_number = 0
+
+    def _push(key, payload):
+        nonlocal sequence_number
+        item = (key, -sequence_number, payload)
+        sequence_number += 1
+        if top_k is None or len(heap) < top_k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    for index, detections in enumerate(evaluation.pair_results_with_frames(dataset, results)):
+        gt_boxes, gt_areas, gt_iscrowd, gt_ids = dataset.frame_ground_truth(index)
+        det_boxes = evaluation.detections_to_boxes(detections)
+        frame_result = matching.evaluate_frame(
+            gt_boxes,
+            gt_areas,
+            gt_iscrowd,
+            gt_ids,
+            det_boxes,
+            ignore_mask=dataset.ignore_mask(index) if check_ignore_regions and len(det_boxes) else None,
+            iou_threshold=iou_threshold,
+            index=index,
+            image_id=dataset.image_id(index),
+        )
+
+        examples = [
+            example
+            for example in frame_box_outcomes(dataset, index, gt_boxes, det_boxes, frame_result)
+            if example['outcome'] in outcomes and not (
+                check_ignore_regions and example['outcome'] == OUTCOME_FP and example['in_ignore_region']
+            )
+        ]
+        if not examples:
+            continue
+
+        if rank_by == RANK_BY_COUNT:
+            _push(len(examples), examples)
+        else:
+            for example in examples:
+                _push(example['area'], [example])
+
+    ranked = []
+    for rank, (_, _, examples) in enumerate(sorted(heap, reverse=True), 1):
+        ranked += [dict(example, rank=rank) for example in examples]
+    return ranked
+
+
+def write_hard_examples(filename, examples, metadata=None):
+    """
+    Write the exported examples (see mine_hard_examples()) to a CSV file (if the file name ends with .csv) or to a
+    JSON file (a dictionary with the given metadata and the list of 'examples').
+    """
+    if filename.lower().endswith('.csv'):
+        with open(filename, 'w', newline='') as fp:
+            writer = csv.DictWriter(fp, fieldnames=EXAMPLE_FIELDS)
+            writer.writeheader()
+            writer.writerows(examples)
+    else:
+        with open(filename, 'w') as fp:
+            json.dump(dict(metadata or {}, examples=examples), fp, indent=2)
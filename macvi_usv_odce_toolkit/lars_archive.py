@@ -0,0 +1,98 @@
+"""
+Access to the LaRS dataset directly from its distribution zip archive.
+
+The archive's central directory is parsed once per process into an index of members (relative to the dataset root,
+i.e., the directory containing the subsets), and members are read on demand; nothing is extracted to disk. Reading a
+member only seeks to its local header and reads (and, if needed, inflates) its bytes, so evaluating a subset reads only
+that subset's annotations and masks.
+"""
+import os
+import re
+import zipfile
+import threading
+
+# LaRS subset annotation files; used to locate the dataset root within the archive
+_ANNOTATIONS_MEMBER = re.compile(r'^(?P<root>(?:.*/)?)(?:train|val|test)/panoptic_annotations\.json$')
+
+# Opened archives, keyed by (process ID, path, size, modification time)
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def is_archive(lars_path):
+    """
+    Return True if the given LaRS path refers to a zip archive (rather than an unpacked dataset directory).
+    """
+    return str(lars_path).lower().endswith('.zip') and os.path.isfile(lars_path)
+
+
+class LarsArchive:
+    """
+    Index of the LaRS zip archive's members, with on-demand reading.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the zip archive.
+
+    Attributes
+    ----------
+    root : str
+        Prefix of the dataset root within the archive (empty if subsets are at the top level).
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._archive = zipfile.ZipFile(filename, 'r')
+
+        roots = set()
+        for name in self._archive.namelist():
+            match = _ANNOTATIONS_MEMBER.match(name)
+            if match:
+                roots.add(match.group('root'))
+        if len(roots) > 1:
+            raise ValueError(f"Archive {filename!r} contains multiple LaRS dataset roots: {sorted(roots)}!")
+        self.root = roots.pop() if roots else ''
+
+        self._members = {
+            info.filename[len(self.root):]: info
+            for info in self._archive.infolist()
+            if info.filename.startswith(self.root) and not info.is_dir()
+        }
+
+    def close(self):
+        self._archive.close()
+
+    def __contains__(self, relative_path):
+        return relative_path in self._members
+
+    def open(self, relative_path):
+        """
+        Open the member with given path (relative to the dataset root) as a binary file-like object.
+        """
+        try:
+            info = self._members[relative_path]
+        except KeyError:
+            raise FileNotFoundError(f"No member {relative_path!r} in LaRS archive {self.filename!r}!") from None
+        return self._archive.open(info, 'r')
+
+    def read(self, relative_path):
+        """
+        Read the contents of the member with given path (relative to the dataset root).
+        """
+        with self.open(relative_path) as fp:
+            return fp.read()
+
+
+def open_archive(filename):
+    """
+    Return the LarsArchive for the given zip file, indexing it on first access in the current process. The index is
+    rebuilt if the file is modified.
+    """
+    stat = os.stat(filename)
+    key = (os.getpid(), os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is None:
+            archive = LarsArchive(filename)
+            _archives[key] = archive
+    return archive
@@ -0,0 +1,193 @@
+"""
+Coarse-to-fine pyramid of block sums of an ignore mask, for deciding whether boxes lie in ignore regions.
+
+Deciding whether a box lies in an ignore region (utils.bbox_in_mask) requires the sum of the mask over the box, which
+costs a pass over the box's pixels; at high camera resolutions, with many (or large) detections, these passes add up.
+The pyramid stores, for a few block sizes, the summed-area tables of the mask's sums over square blocks (sampled from
+the mask's integral image, which is then discarded).
+At each level, the blocks fully inside the box give a lower bound on the box's sum, and the blocks intersecting the
+box give an upper bound; if both bounds lead to the same decision, the decision is final. Boxes far from ignore
+regions (upper bound 0) and boxes deep inside them are decided at the coarsest level; the exact full-resolution sum is
+computed only for the boxes whose bounds straddle the threshold at all levels.
+
+The decisions are identical to those of utils.bbox_in_mask(): the box is rounded and clipped in the same way, and the
+ignored fraction is computed with the same (correctly rounded, hence monotonic) division, so the bounds on the sum
+translate into bounds on the fraction.
+
+Note that the official evaluation (pycocotools) does not act on these decisions (see matching.FrameResult), so the
+pyramid speeds up the computation of the ignore flags, but does not (and cannot) change the official scores.
+"""
+import cv2
+import numpy as np
+
+from . import utils
+
+# Block sizes of the pyramid levels, from coarse to fine
+DEFAULT_BLOCK_SIZES = (64, 16, 4)
+
+# The pyramid is built only if the boxes' total (clipped) area exceeds this fraction of the mask's area; otherwise,
+# summing the mask over the boxes directly is cheaper than building the pyramid (see benchmarks/bench_mask_pyramid.py)
+PYRAMID_MIN_AREA_RATIO = 0.5
+
+
+def _integral_image(mask):
+    # Summed-area table of the mask, with a leading row and column of zeros; computed by OpenCV for 0/1 (uint8 or
+    # boolean) masks, and by NumPy otherwise
+    if mask.dtype == bool:
+        mask = mask.view(np.uint8)
+    if mask.dtype == np.uint8:
+        return cv2.integral(mask, sdepth=cv2.CV_32S)
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = mask.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+    return table
+
+
+def _round_boxes(boxes):
+    # Integer (x, y, w, h), rounded in the same way as utils.bbox_mask_overlap() (round half to even)
+    return np.round(np.asarray(boxes, dtype=np.float64).reshape(-1, 4)).astype(np.int64)
+
+
+class MaskPyramid:
+    """
+    Pyramid of block sums of a 2D mask with non-negative values (e.g., an ignore mask with 0/1 values).
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        The mask; kept by reference, for the exact sums.
+    block_sizes : iterable, optional
+        Block sizes of the pyramid levels (in pixels); the levels are visited from coarse to fine.
+
+    Attributes
+    ----------
+    num_exact_sums : int
+        Number of boxes that required the exact sum (over all calls of boxes_in_mask()).
+    """
+    def __init__(self, mask, block_sizes=DEFAULT_BLOCK_SIZES):
+        block_sizes = sorted(set(int(block_size) for block_size in block_sizes), reverse=True)
+        if not block_sizes or block_sizes[-1] < 1:
+            raise ValueError(f"Block sizes must be positive integers, got {block_sizes}!")
+
+        self.mask = mask
+        self.num_exact_sums = 0
+
+        # The summed-area table of each level (over the blocks) is sampled from the mask's summed-area table at the
+        # block corners; the last row and column of blocks may be smaller. Only the sampled tables are kept.
+        integral = _integral_image(mask)
+        height, width = mask.shape[:2]
+        self._levels = []
+        for block_size in block_sizes:
+            rows = np.append(np.arange(0, height, block_size), height)
+            cols = np.append(np.arange(0, width, block_size), width)
+            self._levels.append((block_size, integral[rows[:, None], cols].astype(np.int64)))
+
+    @staticmethod
+    def _table_sums(table, row0, col0, row1, col1):
+        # Sums over block rectangles [row0, row1) x [col0, col1); empty rectangles sum to 0
+        row1 = np.maximum(row1, row0)
+        col1 = np.maximum(col1, col0)
+        return table[row1, col1] - table[row0, col1] - table[row1, col0] + table[row0, col0]
+
+    def boxes_in_mask(self, boxes, thr=0.5):
+        """
+        Check whether the overlap of each box with the mask exceeds the threshold.
+
+        Parameters
+        ----------
+        boxes : numpy.ndarray
+            (N x 4) array of bounding box rectangles: (x, y, w, h).
+        thr : float, optional
+            Overlap threshold.
+
+        Returns
+        -------
+        numpy.ndarray
+            Boolean array of length N; identical to [utils.bbox_in_mask(mask, box, thr) for box in boxes].
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        result = np.zeros(len(boxes), dtype=bool)
+        x, y, w, h = _round_boxes(boxes).T
+
+        # Boxes with negative coordinates (which NumPy slicing wraps around) or empty boxes are left to the reference
+        # implementation
+        regular = (x >= 0) & (y >= 0) & (w > 0) & (h > 0)
+        for index in np.flatnonzero(~regular):
+            result[index] = utils.bbox_in_mask(self.mask, boxes[index], thr=thr)
+
+        height, width = self.mask.shape[:2]
+        pending = np.flatnonzero(regular)
+        x0, y0 = np.minimum(x, width), np.minimum(y, height)
+        x1, y1 = np.minimum(x + w, width), np.minimum(y + h, height)
+        area = w * h
+
+        for block_size, table in self._levels:
+            if not len(pending):
+                break
+            px0, py0, px1, py1 = x0[pending], y0[pending], x1[pending], y1[pending]
+            num_rows, num_cols = table.shape[0] - 1, table.shape[1] - 1
+
+            # Blocks fully inside the box (the last, smaller, blocks are inside if the box extends to the border)
+            lower = self._table_sums(
+                table,
+                -(-py0 // block_size),
+                -(-px0 // block_size),
+                np.where(py1 == height, num_rows, py1 // block_size),
+                np.where(px1 == width, num_cols, px1 // block_size),
+            )
+            # Blocks intersecting the box
+            upper = self._table_sums(
+                table,
+                py0 // block_size,
+                px0 // block_size,
+                -(-py1 // block_size),
+                -(-px1 // block_size),
+            )
+
+            inside = lower / area[pending] > thr
+            outside = upper / area[pending] <= thr
+            result[pending[inside]] = True
+            pending = pending[~inside & ~outside]
+
+        # Exact sums for the boxes that remain undecided
+        self.num_exact_sums += len(pending)
+        for index in pending.tolist():
+            overlap = np.sum(self.mask[y0[index]:y1[index], x0[index]:x1[index]])
+            result[index] = float(overlap / (int(w[index]) * int(h[index]))) > thr
+
+        return result
+
+
+def boxes_in_mask(mask, boxes, thr=0.5, block_sizes=DEFAULT_BLOCK_SIZES):
+    """
+    Check whether the overlap of each box with the mask exceeds the threshold; identical to
+    [utils.bbox_in_mask(mask, box, thr) for box in boxes].
+
+    The mask pyramid (see MaskPyramid) is used only if the boxes cover a large enough part of the mask (see
+    PYRAMID_MIN_AREA_RATIO); otherwise, the mask is summed over each box directly.
+
+    Parameters
+    ----------
+    mask : numpy.ndarray or MaskPyramid
+        A 2D mask with 0/1 values, or its (pre-built) pyramid.
+    boxes : numpy.ndarray
+        (N x 4) array of bounding box rectangles: (x, y, w, h).
+    thr : float, optional
+        Overlap threshold.
+    block_sizes : iterable, optional
+        Block sizes of the pyramid levels (see MaskPyramid).
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array of length N.
+    """
+    if isinstance(mask, MaskPyramid):
+        return mask.boxes_in_mask(boxes, thr=thr)
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x, y, w, h = _round_boxes(boxes).T
+    height, width = mask.shape[:2]
+    covered = (np.clip(x + w, 0, width) - np.clip(x, 0, width)) * (np.clip(y + h, 0, height) - np.clip(y, 0, height))
+    if np.sum(np.maximum(covered, 0)) <= PYRAMID_MIN_AREA_RATIO * height * width:
+        return np.array([utils.bbox_in_mask(mask, box, thr=thr) for box in boxes], dtype=bool)
+    return MaskPyramid(mask, block_sizes).boxes_in_mask(boxes, thr=thr)
@@ -0,0 +1,405 @@
+"""
+Frame-level re-implementation of the pycocotools bounding-box evaluation, as used by the toolkit.
+
+pycocotools evaluates all frames at once and only exposes the final statistics. The functions in this module perform
+the same matching (pycocotools.cocoeval.COCOeval.evaluateImg) one frame at a time, producing per-frame TP/FP/FN
+outcomes, and accumulate them into F-scores that are identical to those of evaluation.evaluate_detection_results().
+
+Since the toolkit assigns the same score to all detections, pycocotools' ranking of detections degenerates into the
+frame order (and detection order within the frame). The precision/recall curve is therefore fully determined by the
+sequence of TP/FP outcomes of non-ignored detections, which is what the per-frame results store.
+"""
+import numpy as np
+
+import pycocotools.mask
+
+from . import mask_pyramid
+from . import utils
+
+# Evaluation parameters (pycocotools defaults, with IoU threshold used by the toolkit)
+IOU_THRESHOLD = 0.3
+MAX_DETECTIONS = 100  # Maximum number of detections per frame; the rest are discarded
+IGNORE_OVERLAP_THRESHOLD = 0.75  # Detections covered by the ignore mask above this fraction are in ignore regions
+AREA_RANGES = (
+    ('all', 0, 1e5**2),
+    ('small', 0, 32**2),
+    ('medium', 32**2, 96**2),
+    ('large', 96**2, 1e5**2),
+)
+AREA_NAMES = tuple(name for name, _, _ in AREA_RANGES)
+PRUNING_MIN_PAIRS = 4096  # Use spatial candidate pruning for IoU when D x G exceeds this
+RECALL_THRESHOLDS = np.linspace(.0, 1.00, int(np.round((1.00 - .0) / .01)) + 1, endpoint=True)
+
+# Outcome codes of detections and ground-truth annotations (for the 'all' area range)
+DET_TP = 1
+DET_FP = 2
+DET_IGNORED = 3  # Matched to an ignored (crowd) annotation
+DET_DISCARDED = 4  # Beyond MAX_DETECTIONS
+GT_MATCHED = 1
+GT_MISSED = 2
+GT_IGNORED = 3
+
+
+class FrameResult:
+    """
+    Evaluation outcome of a single frame.
+
+    Attributes
+    ----------
+    index : int
+        Position of the frame in the dataset (see dataset.LarsSubset).
+    image_id : int
+        LaRS image ID of the frame.
+    num_gt : numpy.ndarray
+        Number of non-ignored ground-truth annotations, for each of the AREA_RANGES.
+    tp_flags : tuple
+        For each of the AREA_RANGES, a boolean array with one element per non-ignored detection (in evaluation order):
+        True for true positives, False for false positives.
+    num_ignored : numpy.ndarray
+        Number of ignored detections, for each of the AREA_RANGES.
+    num_detections : int
+        Total number of detections in the frame (including discarded ones).
+    det_status : numpy.ndarray
+        Outcome code (DET_*) of each detection, for the 'all' area range.
+    det_match : numpy.ndarray
+        Index of the matched ground-truth annotation (within the frame) for each detection, or -1.
+    gt_status : numpy.ndarray
+        Outcome code (GT_*) of each ground-truth annotation, for the 'all' area range.
+    det_in_ignore_region : numpy.ndarray or None
+        For each detection, whether it overlaps with the frame's ignore mask (see utils.bbox_in_mask). Informative
+        only; pycocotools (and therefore the official protocol) does not take it into account. None if the ignore
+        mask was not provided.
+    """
+    __slots__ = (
+        'index',
+        'image_id',
+        'num_gt',
+        'tp_flags',
+        'num_ignored',
+        'num_detections',
+        'det_status',
+        'det_match',
+        'gt_status',
+        'det_in_ignore_region',
+    )
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def counts(self, area_index=0):
+        """
+        Return (TP, FP, FN) counts for the specified area range (index into AREA_RANGES).
+        """
+        flags = self.tp_flags[area_index]
+        tp = int(np.count_nonzero(flags))
+        return tp, len(flags) - tp, int(self.num_gt[area_index]) - tp
+
+
+def compute_ious(det_boxes, gt_boxes, gt_iscrowd, prune=None):
+    """
+    Compute the (D x G) IoU matrix between detections and ground-truth boxes, in the same way as pycocotools.
+
+    For crowd annotations, the intersection is divided by the detection's area instead of the union. For crowded
+    frames, IoU is computed only for the pairs of boxes that overlap (see utils.compute_sparse_iou); the resulting
+    matrix is identical to the brute-force one.
+
+    Parameters
+    ----------
+    det_boxes : numpy.ndarray
+        (D x 4) array of detection boxes.
+    gt_boxes : numpy.ndarray
+        (G x 4) array of ground-truth boxes.
+    gt_iscrowd : numpy.ndarray
+        Crowd flags of ground-truth annotations.
+    prune : bool, optional
+        Use spatial candidate pruning. By default, pruning is used when D x G exceeds PRUNING_MIN_PAIRS.
+
+    Returns
+    -------
+    ious : numpy.ndarray
+        (D x G) IoU matrix.
+    """
+    num_det, num_gt = len(det_boxes), len(gt_boxes)
+    if num_det == 0 or num_gt == 0:
+        return np.zeros((num_det, num_gt))
+
+    if prune is None:
+        prune = num_det * num_gt > PRUNING_MIN_PAIRS
+
+    if not prune:
+        return pycocotools.mask.iou(
+            np.asarray(det_boxes, dtype=np.float64),
+            np.asarray(gt_boxes, dtype=np.float64),
+            [int(crowd) for crowd in gt_iscrowd],
+        )
+
+    ious = np.zeros((num_det, num_gt))
+    det_idx, gt_idx, values = utils.compute_sparse_iou(det_boxes, gt_boxes, gt_iscrowd)
+    ious[det_idx, gt_idx] = values
+    return ious
+
+
+def match_detections(ious, gt_ignore, gt_iscrowd, iou_threshold=IOU_THRESHOLD):
+    """
+    Greedily match detections to ground-truth annotations, following pycocotools.cocoeval.COCOeval.evaluateImg().
+
+    Detections are processed in order; each is matched to the available annotation with the highest IoU above the
+    threshold (with ties resolved in favour of the later annotation), preferring non-ignored annotations over ignored
+    ones. Crowd annotations can be matched multiple times.
+
+    Parameters
+    ----------
+    ious : numpy.ndarray
+        (D x G) IoU matrix.
+    gt_ignore : numpy.ndarray
+        Boolean array of length G, marking ignored annotations.
+    gt_iscrowd : numpy.ndarray
+        Boolean array of length G, marking crowd annotations.
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    det_match : numpy.ndarray
+        Index of the matched annotation for each detection, or -1.
+    """
+    num_det, num_gt = ious.shape
+    det_match = np.full(num_det, -1, dtype=np.int64)
+    if num_det == 0 or num_gt == 0:
+        return det_match
+
+    threshold = min(iou_threshold, 1 - 1e-10)
+
+    # Only the pairs above the threshold are candidates for matching; in crowded frames, these are few
+    candidate_det, candidate_gt = np.nonzero(ious >= threshold)
+    bounds = np.searchsorted(candidate_det, np.arange(num_det + 1), side='left')
+    gt_taken = np.zeros(num_gt, dtype=bool)
+
+    for det_idx in range(num_det):
+        candidates = candidate_gt[bounds[det_idx]:bounds[det_idx + 1]]
+        if not len(candidates):
+            continue
+        candidates = candidates[~gt_taken[candidates] | gt_iscrowd[candidates]]
+        if not len(candidates):
+            continue
+        # pycocotools considers non-ignored annotations first, and ignored ones only if there is no match among them
+        regular = candidates[~gt_ignore[candidates]]
+        if len(regular):
+            candidates = regular
+        values = ious[det_idx, candidates]
+        gt_idx = candidates[np.flatnonzero(values == values.max())[-1]]
+        det_match[det_idx] = gt_idx
+        gt_taken[gt_idx] = True
+
+    return det_match
+
+
+def evaluate_frame(
+    gt_boxes,
+    gt_areas,
+    gt_iscrowd,
+    gt_ids,
+    det_boxes,
+    ignore_mask=None,
+    iou_threshold=IOU_THRESHOLD,
+    index=None,
+    image_id=None,
+    ious=None,
+    ignored_regions=None,
+):
+    """
+    Evaluate the detections of a single frame.
+
+    Parameters
+    ----------
+    gt_boxes : numpy.ndarray
+        (G x 4) array of ground-truth boxes (x, y, w, h).
+    gt_areas : numpy.ndarray
+        Areas of ground-truth annotations (segmentation areas, as given in the annotations).
+    gt_iscrowd : numpy.ndarray
+        Crowd flags of ground-truth annotations.
+    gt_ids : numpy.ndarray
+        Global IDs of ground-truth annotations, as assigned by evaluation.convert_to_coco_structures(). These matter,
+        because pycocotools treats a match with annotation ID 0 as no match.
+    det_boxes : numpy.ndarray
+        (D x 4) array of detection boxes (x, y, w, h), in the order given in the results file.
+    ignore_mask : numpy.ndarray or mask_pyramid.MaskPyramid, optional
+        Frame's ignore mask (or its pyramid); if provided, FrameResult.det_in_ignore_region is computed.
+    iou_threshold : float, optional
+        IoU threshold.
+    index : int, optional
+        Frame index to store in the result.
+    image_id : int, optional
+        Image ID to store in the result.
+    ious : numpy.ndarray, optional
+        Pre-computed IoU matrix between the first MAX_DETECTIONS detections and the ground-truth boxes.
+    ignored_regions : numpy.ndarray, optional
+        Boolean flag for each detection that lies in an ignore region. Flagged detections are ignored (neither TP nor
+        FP) unless they are matched, in the same way as detections outside the area range. This is a variant of the
+        protocol (see sensitivity module); the official protocol does not ignore any detections.
+
+    Returns
+    -------
+    result : FrameResult
+        Evaluation outcome of the frame.
+    """
+    gt_boxes = np.asarray(gt_boxes, dtype=np.float64).reshape(-1, 4)
+    gt_areas = np.asarray(gt_areas, dtype=np.float64)
+    gt_iscrowd = np.asarray(gt_iscrowd, dtype=bool)
+    gt_ids = np.asarray(gt_ids, dtype=np.int64)
+    det_boxes = np.asarray(det_boxes, dtype=np.float64).reshape(-1, 4)
+
+    num_detections = len(det_boxes)
+    kept_boxes = det_boxes[:MAX_DETECTIONS]
+    det_areas = kept_boxes[:, 2] * kept_boxes[:, 3]
+
+    if ious is None:
+        ious = compute_ious(kept_boxes, gt_boxes, gt_iscrowd)
+
+    num_gt = np.zeros(len(AREA_RANGES), dtype=np.int64)
+    num_ignored = np.zeros(len(AREA_RANGES), dtype=np.int64)
+    tp_flags = []
+    for area_index, (_, area_min, area_max) in enumerate(AREA_RANGES):
+        gt_ignore = gt_iscrowd | (gt_areas < area_min) | (gt_areas > area_max)
+        det_match = match_detections(ious, gt_ignore, gt_iscrowd, iou_threshold)
+
+        matched = det_match >= 0
+        matched_gt = det_match[matched]
+
+        # pycocotools stores the matched annotation ID, and treats ID 0 as "not matched"
+        counted = matched.copy()
+        counted[matched] = gt_ids[matched_gt] != 0
+
+        det_ignore = np.zeros(len(kept_boxes), dtype=bool)
+        det_ignore[matched] = gt_ignore[matched_gt]
+        det_ignore |= ~counted & ((det_areas < area_min) | (det_areas > area_max))
+        if ignored_regions is not None:
+            det_ignore |= ~counted & ignored_regions[:len(kept_boxes)]
+
+        num_gt[area_index] = np.count_nonzero(~gt_ignore)
+        num_ignored[area_index] = np.count_nonzero(det_ignore)
+        tp_flags.append(counted[~det_ignore])
+
+        if area_index == 0:
+            det_status = np.full(num_detections, DET_DISCARDED, dtype=np.int8)
+            det_status[:len(kept_boxes)] = np.where(det_ignore, DET_IGNORED, np.where(counted, DET_TP, DET_FP))
+            full_det_match = np.full(num_detections, -1, dtype=np.int64)
+            full_det_match[:len(kept_boxes)] = det_match
+            gt_status = np.where(gt_ignore, GT_IGNORED, GT_MISSED).astype(np.int8)
+            gt_status[det_match[counted & ~det_ignore]] = GT_MATCHED
+
+    det_in_ignore_region = None
+    if ignore_mask is not None:
+        det_in_ignore_region = mask_pyramid.boxes_in_mask(ignore_mask, det_boxes, thr=IGNORE_OVERLAP_THRESHOLD)
+
+    return FrameResult(
+        index=index,
+        image_id=image_id,
+        num_gt=num_gt,
+        tp_flags=tuple(tp_flags),
+        num_ignored=num_ignored,
+        num_detections=num_detections,
+        det_status=det_status,
+        det_match=full_det_match,
+        gt_status=gt_status,
+        det_in_ignore_region=det_in_ignore_region,
+    )
+
+
+class FScoreAccumulator:
+    """
+    Accumulate per-frame results into F-scores, following pycocotools.cocoeval.COCOeval.accumulate() and summarize().
+
+    Frames must be added in the dataset order. For each area range, the accumulator keeps the running TP/FP counts and
+    the best precision observed at each TP count, which is sufficient to compute the interpolated precision at any
+    recall level. Its memory footprint is therefore bounded by the number of ground-truth annotations, regardless of
+    the number of frames and detections.
+    """
+    def __init__(self):
+        num_areas = len(AREA_RANGES)
+        self.num_frames = 0
+        self.num_detections = 0
+        self.num_gt = np.zeros(num_areas, dtype=np.int64)
+        self.tp = np.zeros(num_areas, dtype=np.int64)
+        self.fp = np.zeros(num_areas, dtype=np.int64)
+        self._best_precision = [np.zeros(0) for _ in range(num_areas)]
+
+    def add(self, frame_result):
+        """
+        Add the result of the next frame.
+        """
+        self.num_frames += 1
+        self.num_detections += frame_result.num_detections
+
+        for area_index, flags in enumerate(frame_result.tp_flags):
+            self.num_gt[area_index] += frame_result.num_gt[area_index]
+            if not len(flags):
+                continue
+
+            tp = self.tp[area_index] + np.cumsum(flags)
+            fp = self.fp[area_index] + np.cumsum(~flags)
+            self.tp[area_index] = tp[-1]
+            self.fp[area_index] = fp[-1]
+
+            tp = tp.astype(float)
+            precision = tp / (fp.astype(float) + tp + np.spacing(1))
+
+            # Best precision at each TP count
+            best = self._best_precision[area_index]
+            if len(best) <= tp[-1]:
+                best = np.concatenate([best, np.zeros(int(tp[-1]) + 1 - len(best))])
+                self._best_precision[area_index] = best
+            np.maximum.at(best, tp.astype(np.int64), precision)
+
+    def stats(self):
+        """
+        Compute average precision and recall for each of the AREA_RANGES.
+
+        Returns
+        -------
+        precision : numpy.ndarray
+            Average (interpolated) precision for each area range; -1 where it is undefined.
+        recall : numpy.ndarray
+            Recall for each area range; -1 where it is undefined.
+        """
+        num_areas = len(AREA_RANGES)
+        precision = -np.ones(num_areas)
+        recall = -np.ones(num_areas)
+        for area_index in range(num_areas):
+            npig = self.num_gt[area_index]
+            if npig == 0:
+                continue
+
+            tp = self.tp[area_index]
+            recall[area_index] = np.mean(np.array([tp / npig] * 2))  # Two (identical) IoU thresholds
+
+            # Interpolated precision: the best precision at or above each recall threshold
+            best = self._best_precision[area_index]
+            envelope = np.maximum.accumulate(best[::-1])[::-1]
+            levels = np.arange(len(best)) / npig
+            indices = np.searchsorted(levels, RECALL_THRESHOLDS, side='left')
+            q = np.zeros(len(RECALL_THRESHOLDS))
+            valid = indices < len(best)
+            q[valid] = envelope[indices[valid]]
+            precision[area_index] = np.mean(np.tile(q, 2))  # Two (identical) IoU thresholds
+
+        return precision, recall
+
+    def f_scores(self):
+        """
+        Compute the F-scores from the frames accumulated so far.
+
+        Returns
+        -------
+        f_scores : tuple
+            A four-element tuple containing F-score values: F_all, F_small, F_medium, and F_large.
+        """
+        if not self.num_detections:
+            return 0, 0, 0, 0
+
+        precision, recall = self.stats()
+        precision[precision == -1] = 0
+        recall[recall == -1] = 0
+
+        return tuple(utils.f_score(p, r) for p, r in zip(precision, recall))
@@ -0,0 +1,271 @@
+"""
+Distributed evaluation via mergeable partial results.
+
+The frames of the dataset subset are split into shards (contiguous groups of sequences, or contiguous frame ranges),
+which can be evaluated on different machines. The evaluation of a shard produces a partial result: for each of its
+frames, the number of detections, the number of non-ignored ground-truth annotations, and the TP/FP flags of the
+non-ignored detections (bit-packed), for each of the area ranges. This is all that matching.FScoreAccumulator needs,
+so merging the partial results of all shards (in dataset order) yields exactly the F-scores of the full evaluation.
+
+Partial results are stored in NPZ files with the following entries:
+
+ - 'frame_index' (F): dataset index of each frame of the shard;
+ - 'num_detections' (F): number of detections of each frame (including discarded ones);
+ - 'num_gt' (F x A): number of non-ignored ground-truth annotations of each frame, for each area range;
+ - 'num_flags' (F x A): number of non-ignored detections of each frame, for each area range;
+ - 'flags': bit-packed TP/FP flags of the non-ignored detections, ordered by frame, area range, and detection;
+ - 'metadata': JSON-encoded dictionary that identifies the evaluation (see PARTIAL_METADATA_KEYS) and the shard.
+"""
+import json
+import zipfile
+
+import numpy as np
+
+from . import __version__
+from .dataset import sequence_name
+from . import evaluation
+from . import matching
+
+# Ways of splitting the dataset frames into shards
+SHARD_BY_SEQUENCE = 'sequence'
+SHARD_BY_FRAME = 'frame'
+SHARD_MODES = (SHARD_BY_SEQUENCE, SHARD_BY_FRAME)
+
+# Metadata entries that must be the same in all merged partial results
+PARTIAL_METADATA_KEYS = (
+    'toolkit_version',
+    'dataset',
+    'results',
+    'iou_threshold',
+    'num_frames',
+    'num_shards',
+    'shard_by',
+)
+
+
+def parse_shard(value):
+    """
+    Parse the shard specification 'i/N' (shard i of N, 0 <= i < N) into a (shard_index, num_shards) tuple.
+
+    Raises
+    ------
+    ValueError
+        If the specification is malformed or out of range.
+    """
+    try:
+        shard_index, num_shards = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard specification {value!r}; expected 'i/N'!") from None
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"Invalid shard specification {value!r}; expected 0 <= i < N!")
+    return shard_index, num_shards
+
+
+def shard_frames(dataset, shard_index, num_shards, shard_by=SHARD_BY_SEQUENCE):
+    """
+    Return the (sorted) indices of the dataset frames in the given shard.
+
+    With SHARD_BY_SEQUENCE, whole sequences are assigned to shards, by the position of their first frame, so shards
+    have roughly equal numbers of frames (some shards may be empty if there are fewer sequences than shards). With
+    SHARD_BY_FRAME, the frames are split into contiguous ranges of (almost) equal lengths.
+    """
+    num_frames = len(dataset)
+    if shard_by == SHARD_BY_FRAME:
+        return np.array_split(np.arange(num_frames), num_shards)[shard_index].tolist()
+    if shard_by != SHARD_BY_SEQUENCE:
+        raise ValueError(f"Invalid shard mode {shard_by!r}; expected one of {SHARD_MODES}!")
+
+    sequence_shards = {}
+    indices = []
+    for index, annotation in enumerate(dataset.annotations):
+        sequence = sequence_name(annotation['file_name'])
+        if sequence not in sequence_shards:
+            sequence_shards[sequence] = index * num_shards // num_frames
+        if sequence_shards[sequence] == shard_index:
+            indices.append(index)
+    return indices
+
+
+def evaluate_shard(
+    dataset,
+    results,
+    shard_index,
+    num_shards,
+    shard_by=SHARD_BY_SEQUENCE,
+    metadata=None,
+    iou_threshold=matching.IOU_THRESHOLD,
+):
+    """
+    Evaluate the detection results on the frames of the given shard, and return the partial result.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    shard_index : int
+        Index of the shard.
+    num_shards : int
+        Number of shards.
+    shard_by : str, optional
+        Way of splitting the frames into shards (see shard_frames()).
+    metadata : dict, optional
+        Additional metadata of the partial result; should identify the dataset subset ('dataset', see
+        dataset.subset_fingerprint()) and the results ('results', see utils.file_sha256()), so that merge_partials()
+        can check that the partial results belong together.
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    partial : dict
+        Dictionary of NumPy arrays (see module description), and the 'metadata' dictionary.
+    """
+    indices = shard_frames(dataset, shard_index, num_shards, shard_by)
+    detections = evaluation.pair_results_with_frames(dataset, results)
+    num_areas = len(matching.AREA_RANGES)
+
+    num_detections = np.zeros(len(indices), dtype=np.int64)
+    num_gt = np.zeros((len(indices), num_areas), dtype=np.int64)
+    num_flags = np.zeros((len(indices), num_areas), dtype=np.int64)
+    flags = []
+    for position, index in enumerate(indices):
+        frame_result = evaluation.evaluate_frame_detections(
+            dataset,
+            index,
+            evaluation.detections_to_boxes(detections[index]),
+            ignore_regions=False,
+            iou_threshold=iou_threshold,
+        )
+        num_detections[position] = frame_result.num_detections
+        num_gt[position] = frame_result.num_gt
+        for area_index, area_flags in enumerate(frame_result.tp_flags):
+            num_flags[position, area_index] = len(area_flags)
+            flags.append(area_flags)
+
+    return {
+        'frame_index': np.array(indices, dtype=np.int64),
+        'num_detections': num_detections,
+        'num_gt': num_gt,
+        'num_flags': num_flags,
+        'flags': np.packbits(np.concatenate(flags).astype(bool)) if flags else np.zeros(0, dtype=np.uint8),
+        'metadata': dict(
+            metadata or {},
+            toolkit_version=__version__,
+            iou_threshold=float(iou_threshold),
+            num_frames=len(dataset),
+            shard_index=shard_index,
+            num_shards=num_shards,
+            shard_by=shard_by,
+        ),
+    }
+
+
+def save_partial(filename, partial):
+    """
+    Save the partial result (see evaluate_shard()) to the NPZ file.
+    """
+    arrays = dict(partial, metadata=np.array(json.dumps(partial['metadata'], sort_keys=True)))
+    with open(filename, 'wb') as fp:  # File object, so that NumPy does not append the extension
+        np.savez(fp, **arrays)
+
+
+def load_partial(filename):
+    """
+    Load the partial result (see evaluate_shard()) from the NPZ file.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid partial result.
+    """
+    try:
+        with np.load(filename, allow_pickle=False) as data:
+            partial = {name: data[name] for name in data.files}
+        partial['metadata'] = json.loads(str(partial['metadata']))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise ValueError(f"File {filename!r} is not a valid partial result: {e}") from None
+
+    num_frames = len(partial.get('frame_index', []))
+    for name in ('num_detections', 'num_gt', 'num_flags'):
+        if name not in partial or len(partial[name]) != num_frames:
+            raise ValueError(f"Partial result {filename!r} has missing or inconsistent {name!r}!")
+    if 'flags' not in partial or len(partial['flags']) * 8 < partial['num_flags'].sum():
+        raise ValueError(f"Partial result {filename!r} has missing or truncated 'flags'!")
+    return partial
+
+
+def merge_partials(partials):
+    """
+    Merge the partial results of all shards into the F-scores of the full evaluation.
+
+    Parameters
+    ----------
+    partials : list
+        Partial results (see evaluate_shard() and load_partial()), in any order.
+
+    Returns
+    -------
+    f_scores : tuple
+        A four-element tuple containing F-score values: F_all, F_small, F_medium, and F_large; identical to those of
+        the full evaluation.
+
+    Raises
+    ------
+    ValueError
+        If the partial results belong to different evaluations, or the shards are incomplete or overlapping.
+    """
+    if not partials:
+        raise ValueError("No partial results to merge!")
+
+    # Same evaluation
+    reference = partials[0]['metadata']
+    for partial in partials[1:]:
+        for key in PARTIAL_METADATA_KEYS:
+            if partial['metadata'].get(key) != reference.get(key):
+                raise ValueError(
+                    f"Partial results belong to different evaluations: {key!r} differs "
+                    f"({reference.get(key)!r} vs. {partial['metadata'].get(key)!r})!"
+                )
+
+    # Each shard exactly once
+    shard_indices = sorted(partial['metadata']['shard_index'] for partial in partials)
+    duplicates = sorted(set(index for index in shard_indices if shard_indices.count(index) > 1))
+    if duplicates:
+        raise ValueError(f"Overlapping partial results: shards {duplicates} are given more than once!")
+    missing = sorted(set(range(reference['num_shards'])) - set(shard_indices))
+    if missing:
+        raise ValueError(f"Incomplete partial results: shards {missing} of {reference['num_shards']} are missing!")
+
+    # Each frame exactly once
+    frame_indices = np.concatenate([partial['frame_index'] for partial in partials])
+    frame_counts = np.bincount(frame_indices, minlength=reference['num_frames'])
+    if len(frame_counts) > reference['num_frames'] or np.any(frame_counts > 1):
+        raise ValueError("Overlapping partial results: some frames are evaluated by more than one shard!")
+    if np.any(frame_counts == 0):
+        raise ValueError(f"Incomplete partial results: {np.count_nonzero(frame_counts == 0)} frames are missing!")
+
+    # Unpack the frames, and accumulate them in dataset order
+    frames = []
+    for partial in partials:
+        num_flags = partial['num_flags']
+        flags = np.unpackbits(partial['flags'], count=int(num_flags.sum())).astype(bool)
+        offsets = np.concatenate([[0], np.cumsum(num_flags.ravel())]).astype(np.int64)
+        for position, index in enumerate(partial['frame_index'].tolist()):
+            start = position * num_flags.shape[1]
+            frames.append((index, matching.FrameResult(
+                index=index,
+                num_gt=partial['num_gt'][position],
+                num_detections=int(partial['num_detections'][position]),
+                tp_flags=tuple(
+                    flags[offsets[start + area_index]:offsets[start + area_index + 1]]
+                    for area_index in range(num_flags.shape[1])
+                ),
+            )))
+    frames.sort(key=lambda frame: frame[0])
+
+    accumulator = matching.FScoreAccumulator()
+    for _, frame_result in frames:
+        accumulator.add(frame_result)
+    return accumulator.f_scores()
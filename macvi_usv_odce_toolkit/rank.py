@@ -0,0 +1,160 @@
+import itertools
+
+import numpy as np
+
+from . import evaluation
+from . import matching
+
+# Default tie-breaking schedule: the IoU threshold is raised in steps until the tie is broken
+DEFAULT_THRESHOLD_STEP = 0.05
+DEFAULT_MAX_THRESHOLD = 0.95
+
+# F-scores are compared after rounding to this many decimals (i.e., F1 in percent, with two decimals)
+DEFAULT_TIE_DECIMALS = 4
+
+
+def prepare_submission(dataset, results):
+    """
+    Pair the detection results with the dataset frames, and pre-compute the per-frame IoU matrices.
+
+    The IoU matrices do not depend on the IoU threshold, so a prepared submission can be evaluated at any number of
+    thresholds (see evaluate_submission()) without repeating the I/O or the overlap computation.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+
+    Returns
+    -------
+    prepared : dict
+        Dictionary with per-frame detection boxes ('det_boxes'), IoU matrices ('ious'), and the cache of F-scores
+        computed so far ('f_scores', indexed by IoU threshold).
+    """
+    det_boxes = []
+    ious = []
+    for index, detections in enumerate(evaluation.pair_results_with_frames(dataset, results)):
+        boxes = evaluation.detections_to_boxes(detections)
+        gt_boxes, _, gt_iscrowd, _ = dataset.frame_ground_truth(index)
+        det_boxes.append(boxes)
+        ious.append(matching.compute_ious(boxes[:matching.MAX_DETECTIONS], gt_boxes, gt_iscrowd))
+
+    return {
+        'det_boxes': det_boxes,
+        'ious': ious,
+        'f_scores': {},
+    }
+
+
+def evaluate_submission(dataset, prepared, iou_threshold=matching.IOU_THRESHOLD):
+    """
+    Evaluate a prepared submission (see prepare_submission()) at the given IoU threshold.
+
+    Results are cached in the prepared submission, so repeated calls with the same threshold are free.
+
+    Returns
+    -------
+    f_scores : tuple
+        A four-element tuple containing F-score values: F_all, F_small, F_medium, and F_large.
+    """
+    key = round(float(iou_threshold), 6)
+    if key not in prepared['f_scores']:
+        accumulator = matching.FScoreAccumulator()
+        for index, (boxes, ious) in enumerate(zip(prepared['det_boxes'], prepared['ious'])):
+            gt_boxes, gt_areas, gt_iscrowd, gt_ids = dataset.frame_ground_truth(index)
+            accumulator.add(matching.evaluate_frame(
+                gt_boxes,
+                gt_areas,
+                gt_iscrowd,
+                gt_ids,
+                boxes,
+                iou_threshold=iou_threshold,
+                ious=ious,
+            ))
+        prepared['f_scores'][key] = tuple(float(value) for value in accumulator.f_scores())
+
+    return prepared['f_scores'][key]
+
+
+def tie_breaking_thresholds(
+    iou_threshold=matching.IOU_THRESHOLD,
+    step=DEFAULT_THRESHOLD_STEP,
+    max_threshold=DEFAULT_MAX_THRESHOLD,
+):
+    """
+    Return the sequence of IoU thresholds used for ranking: the base threshold, followed by the increasingly
+    stricter thresholds used for tie-breaking.
+    """
+    count = int(np.floor((max_threshold - iou_threshold) / step + 1e-9))
+    return [round(iou_threshold + i * step, 6) for i in range(count + 1)]
+
+
+def rank_submissions(
+    dataset,
+    submissions,
+    thresholds=None,
+    tie_decimals=DEFAULT_TIE_DECIMALS,
+):
+    """
+    Rank submissions by F_all score, breaking ties by re-evaluating the tied submissions at stricter IoU thresholds.
+
+    All submissions are evaluated at the first threshold. Higher thresholds are evaluated lazily, only for the
+    submissions that are still tied, reusing their pre-computed IoU matrices (see prepare_submission()).
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    submissions : list
+        List of (name, prepared) tuples, where prepared is the output of prepare_submission().
+    thresholds : list, optional
+        IoU thresholds; the first is the ranking threshold, and the rest are used in order for tie-breaking. Defaults
+        to tie_breaking_thresholds().
+    tie_decimals : int, optional
+        Number of decimals to which F-scores are rounded before comparison.
+
+    Returns
+    -------
+    ranking : list
+        List of dictionaries (one per submission, best first) with 'rank' (tied submissions share the rank), 'name',
+        'f_score' (F_all at the first threshold), 'tie_break_threshold' (threshold at which the submission was
+        separated from those it was tied with; None if it was not tied, or if the tie could not be broken), and
+        'f_scores' (F_all at each evaluated threshold).
+    """
+    if thresholds is None:
+        thresholds = tie_breaking_thresholds()
+
+    ranking = []
+
+    def _rank_group(group, level):
+        threshold = thresholds[level]
+        scores = {
+            name: round(evaluate_submission(dataset, prepared, threshold)[0], tie_decimals)
+            for name, prepared in group
+        }
+        ordered = sorted(group, key=lambda submission: scores[submission[0]], reverse=True)  # Stable for ties
+        for _, subgroup in itertools.groupby(ordered, key=lambda submission: scores[submission[0]]):
+            subgroup = list(subgroup)
+            if len(subgroup) > 1 and level + 1 < len(thresholds):
+                _rank_group(subgroup, level + 1)
+                continue
+
+            tie_break_threshold = threshold if len(subgroup) == 1 and level > 0 else None
+            rank = len(ranking) + 1
+            for name, prepared in subgroup:
+                ranking.append({
+                    'rank': rank,
+                    'name': name,
+                    'f_score': evaluate_submission(dataset, prepared, thresholds[0])[0],
+                    'tie_break_threshold': tie_break_threshold,
+                    'f_scores': {
+                        str(key): value[0] for key, value in sorted(prepared['f_scores'].items())
+                    },
+                })
+
+    if submissions:
+        _rank_group(list(submissions), 0)
+
+    return ranking
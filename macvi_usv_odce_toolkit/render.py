@@ -0,0 +1,311 @@
+"""
+Rendering of evaluation outcomes over LaRS frames, for triage of false positives and false negatives.
+
+The frame-level evaluation (see matching module) decides the outcome of each detection and ground-truth annotation;
+the renderer draws them, together with the frame's ignore regions, over the frame's image. Only selected frames are
+rendered (e.g., the frames with most errors, or the frames of given sequences), in a pool of threads (OpenCV releases
+the GIL while decoding, drawing, and encoding images). Rendered thumbnails are cached in the toolkit's cache directory,
+keyed by the results file hash, the dataset subset, and the rendering parameters, so browsing the same results again
+does not repeat any work. The least recently used thumbnail directories are evicted when the cache grows beyond its
+maximum size (see prune_render_cache()).
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+import concurrent.futures
+
+import cv2
+import numpy as np
+
+from . import __version__
+from .dataset import default_cache_dir, read_lars_image, sequence_name
+from . import evaluation
+from . import matching
+
+# Name of the thumbnail cache sub-directory within the cache directory
+RENDER_CACHE_DIR_NAME = "renders"
+
+# Maximum total size (in bytes) of the thumbnail cache; the least recently used thumbnail directories are evicted beyond
+# that
+DEFAULT_MAX_CACHE_SIZE = 1024 * 1024 * 1024
+
+# Default width of rendered thumbnails; 0 renders frames at their full size
+DEFAULT_THUMBNAIL_WIDTH = 640
+
+# Colors (BGR) of the detections and ground-truth annotations, by their outcome (see matching module)
+DET_COLORS = {
+    matching.DET_TP: (0, 200, 0),
+    matching.DET_FP: (0, 0, 255),
+    matching.DET_IGNORED: (160, 160, 160),
+    matching.DET_DISCARDED: (128, 0, 128),
+}
+DET_LABELS = {
+    matching.DET_TP: "TP",
+    matching.DET_FP: "FP",
+    matching.DET_IGNORED: "IG",
+    matching.DET_DISCARDED: "DX",
+}
+GT_COLORS = {
+    matching.GT_MATCHED: (255, 200, 0),
+    matching.GT_MISSED: (0, 165, 255),
+    matching.GT_IGNORED: (160, 160, 160),
+}
+IGNORE_REGION_COLOR = (255, 0, 255)
+IGNORE_REGION_ALPHA = 0.35
+
+
+def load_frame_image(dataset, index):
+    """
+    Load the image of the frame with given index; returns None if it is not available.
+    """
+    stem = dataset.annotations[index]['file_name'].rsplit('.', 1)[0]
+    return read_lars_image(dataset.lars_path, f'{dataset.eval_set}/images/{stem}.jpg')
+
+
+def render_cache_dir(results_hash, dataset_fingerprint, thumbnail_width=DEFAULT_THUMBNAIL_WIDTH, cache_dir=None):
+    """
+    Return the thumbnail cache directory for the given results file (SHA-256 hash, see utils.file_sha256()), dataset
+    subset (see dataset.subset_fingerprint()), and thumbnail width.
+    """
+    key = hashlib.sha256(json.dumps({
+        'results': results_hash,
+        'dataset': dataset_fingerprint,
+        'thumbnail_width': thumbnail_width,
+        'toolkit_version': __version__,
+    }, sort_keys=True).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir or default_cache_dir(), RENDER_CACHE_DIR_NAME, key[:32])
+
+
+def prune_render_cache(max_size=DEFAULT_MAX_CACHE_SIZE, cache_dir=None, keep=None):
+    """
+    Evict the least recently used thumbnail directories (see render_cache_dir()) until the total size of the thumbnail
+    cache is at most max_size bytes.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Maximum total size of the thumbnail cache, in bytes.
+    cache_dir : str, optional
+        Cache directory; defaults to the toolkit's cache directory (see dataset.default_cache_dir()).
+    keep : str, optional
+        Thumbnail directory that is never evicted (e.g., the one in use).
+
+    Returns
+    -------
+    num_evicted : int
+        Number of evicted thumbnail directories.
+    """
+    root = os.path.join(cache_dir or default_cache_dir(), RENDER_CACHE_DIR_NAME)
+    if not os.path.isdir(root):
+        return 0
+
+    entries = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            entries.append((os.path.getmtime(path), size, path))
+        except OSError:
+            continue  # Not a directory, or removed concurrently
+
+    total_size = sum(size for _, size, _ in entries)
+    keep = os.path.abspath(keep) if keep is not None else None
+    num_evicted = 0
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        if os.path.abspath(path) == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+        num_evicted += 1
+
+    return num_evicted
+
+
+def select_frames(dataset, frame_results, worst=None, sequences=None, image_ids=None):
+    """
+    Select the frames to render.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    frame_results : list
+        Evaluation outcome (matching.FrameResult) of each dataset frame, in dataset order.
+    worst : int, optional
+        Keep only this many frames with the most errors (false positives plus false negatives).
+    sequences : iterable, optional
+        Keep only the frames of these sequences.
+    image_ids : iterable, optional
+        Keep only the frames with these image IDs.
+
+    Returns
+    -------
+    indices : list
+        Indices of the selected frames; ordered by the number of errors (descending) if worst is given, in dataset
+        order otherwise.
+    """
+    sequences = set(sequences) if sequences else None
+    image_ids = set(image_ids) if image_ids else None
+
+    indices = []
+    for index, annotation in enumerate(dataset.annotations):
+        if sequences is not None and sequence_name(annotation['file_name']) not in sequences:
+            continue
+        if image_ids is not None and annotation['image_id'] not in image_ids:
+            continue
+        indices.append(index)
+
+    if worst is not None:
+        def _num_errors(index):
+            _, fp, fn = frame_results[index].counts()
+            return fp + fn
+        indices.sort(key=_num_errors, reverse=True)  # Stable; keeps dataset order within ties
+        indices = [index for index in indices[:worst] if _num_errors(index) > 0]
+
+    return indices
+
+
+def draw_frame(image, ignore_mask, gt_boxes, det_boxes, frame_result):
+    """
+    Draw the frame's ignore regions, ground-truth annotations, and detections (colored by their outcome) over the
+    frame's image, in place.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Frame's (BGR) image.
+    ignore_mask : numpy.ndarray or None
+        Frame's ignore mask.
+    gt_boxes : numpy.ndarray
+        (G x 4) array of ground-truth boxes.
+    det_boxes : numpy.ndarray
+        (D x 4) array of detection boxes.
+    frame_result : matching.FrameResult
+        Evaluation outcome of the frame. Detections in ignore regions (if computed) are marked with an asterisk.
+
+    Returns
+    -------
+    image : numpy.ndarray
+        The input image.
+    """
+    if ignore_mask is not None:
+        ignored = ignore_mask.astype(bool)
+        blended = (1 - IGNORE_REGION_ALPHA) * image[ignored] + IGNORE_REGION_ALPHA * np.array(IGNORE_REGION_COLOR)
+        image[ignored] = np.round(blended).astype(np.uint8)
+
+    def _corners(box):
+        x, y, w, h = (int(round(value)) for value in box)
+        return (x, y), (x + w, y + h)
+
+    for box, status in zip(gt_boxes, frame_result.gt_status):
+        top_left, bottom_right = _corners(box)
+        cv2.rectangle(image, top_left, bottom_right, GT_COLORS[status], 1, lineType=cv2.LINE_AA)
+
+    in_ignore_region = frame_result.det_in_ignore_region
+    for det_index, (box, status) in enumerate(zip(det_boxes, frame_result.det_status)):
+        top_left, bottom_right = _corners(box)
+        color = DET_COLORS[status]
+        label = DET_LABELS[status] + ("*" if in_ignore_region is not None and in_ignore_region[det_index] else "")
+        cv2.rectangle(image, top_left, bottom_right, color, 2, lineType=cv2.LINE_AA)
+        cv2.putText(
+            image,
+            label,
+            (top_left[0] + 2, max(top_left[1] - 4, 10)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.4,
+            color,
+            1,
+            lineType=cv2.LINE_AA,
+        )
+
+    return image
+
+
+def render_frame(dataset, index, det_boxes, thumbnail_width=DEFAULT_THUMBNAIL_WIDTH):
+    """
+    Evaluate the detections of the frame with given index (including the ignore-region check), and render the outcome.
+
+    If the frame's image is not available, the outcome is drawn over a black canvas of the frame's size.
+
+    Returns
+    -------
+    image : numpy.ndarray
+        Rendered (BGR) image, downscaled to thumbnail width (unless it is 0).
+    """
+    ignore_mask = dataset.ignore_mask(index)
+    gt_boxes, gt_areas, gt_iscrowd, gt_ids = dataset.frame_ground_truth(index)
+    frame_result = matching.evaluate_frame(gt_boxes, gt_areas, gt_iscrowd, gt_ids, det_boxes, ignore_mask=ignore_mask)
+
+    image = load_frame_image(dataset, index)
+    if image is None:
+        image = np.zeros(ignore_mask.shape + (3,), dtype=np.uint8)
+    draw_frame(image, ignore_mask, gt_boxes, det_boxes, frame_result)
+
+    height, width = image.shape[:2]
+    if thumbnail_width and width > thumbnail_width:
+        image = cv2.resize(
+            image,
+            (thumbnail_width, int(round(height * thumbnail_width / width))),
+            interpolation=cv2.INTER_AREA,
+        )
+    return image
+
+
+def render_frames(dataset, results, indices, output_dir, thumbnail_width=DEFAULT_THUMBNAIL_WIDTH, num_threads=None):
+    """
+    Render the outcomes of the selected frames into the output (cache) directory, using a pool of threads.
+
+    Frames whose thumbnail already exists in the output directory are not rendered again.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset; should not cache ignore masks, since only the rendered frames' masks are decoded.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    indices : list
+        Indices of frames to render (see select_frames()).
+    output_dir : str
+        Output directory (see render_cache_dir()).
+    thumbnail_width : int, optional
+        Width of rendered thumbnails; 0 renders frames at their full size.
+    num_threads : int, optional
+        Number of rendering threads; defaults to the number of CPUs.
+
+    Returns
+    -------
+    files : list
+        Rendered file of each selected frame.
+    num_rendered : int
+        Number of frames that were rendered (i.e., not found in the output directory).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    os.utime(output_dir)  # Mark as recently used (see prune_render_cache())
+    detections = evaluation.pair_results_with_frames(dataset, results)
+
+    def _render(index, filename):
+        image = render_frame(dataset, index, evaluation.detections_to_boxes(detections[index]), thumbnail_width)
+        # Write atomically, so that concurrent or interrupted runs never leave partial thumbnails behind
+        tmp_filename = f"{filename}.{os.getpid()}-{threading.get_ident()}.tmp.jpg"
+        if not cv2.imwrite(tmp_filename, image):
+            raise OSError(f"Failed to write rendered frame {tmp_filename!r}!")
+        os.replace(tmp_filename, filename)
+
+    files = []
+    pending = []
+    for index in indices:
+        stem = dataset.annotations[index]['file_name'].rsplit('.', 1)[0]
+        filename = os.path.join(output_dir, stem + ".jpg")
+        files.append(filename)
+        if not os.path.isfile(filename):
+            pending.append((index, filename))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for future in [executor.submit(_render, index, filename) for index, filename in pending]:
+            future.result()  # Propagate errors
+
+    return files, len(pending)
@@ -0,0 +1,131 @@
+"""
+Content-addressed store of evaluation results.
+
+Evaluation results are stored in an SQLite database in the toolkit's cache directory, keyed by the hash of the results
+file, the fingerprint of the dataset subset, the evaluation parameters, and the toolkit version. Re-evaluating the same
+results file on the same subset can therefore return the stored metrics without repeating the evaluation.
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+
+from . import __version__
+from .dataset import default_cache_dir
+
+# Name of the store database file within the cache directory
+STORE_FILE_NAME = "evaluation-results.sqlite"
+
+# Maximum number of stored results; the least recently used ones are evicted beyond that
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def make_key(results_hash, dataset_fingerprint, parameters=None):
+    """
+    Construct the store key for evaluation of the given results file on the given dataset subset.
+
+    Parameters
+    ----------
+    results_hash : str
+        SHA-256 hash of the results file (see utils.file_sha256()).
+    dataset_fingerprint : str
+        Fingerprint of the dataset subset (see dataset.subset_fingerprint()).
+    parameters : dict, optional
+        JSON-serializable evaluation parameters that affect the results.
+
+    Returns
+    -------
+    key : str
+        Store key (hexadecimal SHA-256 digest).
+    """
+    payload = json.dumps({
+        'results': results_hash,
+        'dataset': dataset_fingerprint,
+        'parameters': parameters or {},
+        'toolkit_version': __version__,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultStore:
+    """
+    SQLite-backed store of evaluation results, with least-recently-used eviction.
+
+    Parameters
+    ----------
+    filename : str, optional
+        Database file; defaults to STORE_FILE_NAME in the toolkit's cache directory (see dataset.default_cache_dir()).
+    max_entries : int, optional
+        Maximum number of stored results.
+    """
+    def __init__(self, filename=None, max_entries=DEFAULT_MAX_ENTRIES):
+        if filename is None:
+            filename = os.path.join(default_cache_dir(), STORE_FILE_NAME)
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+
+        self.filename = filename
+        self.max_entries = max_entries
+
+        self._connection = sqlite3.connect(filename, timeout=30)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, "
+                "metrics TEXT NOT NULL, "
+                "created REAL NOT NULL, "
+                "accessed REAL NOT NULL)"
+            )
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key):
+        """
+        Return the stored metrics for the given key, or None if there are none.
+        """
+        row = self._connection.execute("SELECT metrics FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self._connection:
+            self._connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, metrics):
+        """
+        Store the metrics (a JSON-serializable object) under the given key, evicting the least recently used entries
+        if the store exceeds its maximum size.
+        """
+        now = time.time()
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, metrics, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(metrics), now, now),
+            )
+            self._connection.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+def open_store(filename=None, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Open the result store, returning None (with a warning) if it cannot be opened; e.g., due to a read-only cache
+    directory. The store is an optimization, so callers should carry on without it.
+    """
+    try:
+        return ResultStore(filename, max_entries=max_entries)
+    except (OSError, sqlite3.Error) as e:
+        logging.warning("Failed to open evaluation result store: %s", e)
+        return None
@@ -0,0 +1,283 @@
+"""
+Reading and writing of detection results files: the JSON format (see README) and its columnar NPZ counterpart.
+
+The NPZ format stores all detections in flat arrays, which are loaded without per-detection parsing:
+
+ - 'image_id' (N): image ID of each detection;
+ - 'bbox' (N x 4): detection boxes (x, y, w, h);
+ - 'score' (N), 'id' (N), 'category_id' (N): optional per-detection scores, IDs, and categories.
+
+Detections of the same frame must be stored consecutively, in the frame's detection order. As with the JSON format,
+the detections are evaluated in this order; scores are stored, but do not affect the evaluation.
+
+Optionally, the file also contains the table of frames, which allows lossless conversion to and from the JSON format
+(see convert-results command); for files without it (minimal files), the table is completed from the frames of the
+evaluated dataset subset (see complete_frame_table()):
+
+ - 'frame_image_id' (F), 'frame_file_name' (F): image ID and file name of each frame (including frames without
+   detections), in the order of the JSON file;
+ - 'frame_offsets' (F + 1): detections of frame i are at positions frame_offsets[i]:frame_offsets[i + 1];
+ - 'metadata': JSON-encoded top-level entries of the JSON file other than 'annotations' (e.g., 'images').
+"""
+import json
+
+import numpy as np
+
+# Extension of results files in the NPZ format
+NPZ_EXTENSION = '.npz'
+
+# Optional per-detection columns, and the corresponding keys of JSON detection entries
+_OPTIONAL_COLUMNS = ('score', 'id', 'category_id')
+
+
+def is_npz_results(results_file):
+    """
+    Return True if the given results file name refers to the NPZ format (by its extension).
+    """
+    return isinstance(results_file, str) and results_file.lower().endswith(NPZ_EXTENSION)
+
+
+def _column(values, name):
+    column = np.array(values)
+    if column.dtype.kind not in 'iuf':
+        raise ValueError(f"Detection values of {name!r} must be numbers!")
+    return column
+
+
+def results_to_columns(results):
+    """
+    Convert parsed JSON results into the columns of the NPZ format.
+
+    Parameters
+    ----------
+    results : dict
+        Parsed detection results (contents of results JSON file).
+
+    Returns
+    -------
+    columns : dict
+        Dictionary of NumPy arrays (see module description). Integer-valued columns keep integer types, so the
+        conversion back to JSON is lossless.
+
+    Raises
+    ------
+    ValueError
+        If the results contain entries that the NPZ format cannot represent (e.g., detections with additional keys,
+        or optional keys present in some detections only).
+    """
+    frames = results['annotations']
+    detections = [detection for frame in frames for detection in frame.get('detections', [])]
+
+    for frame in frames:
+        unsupported = set(frame) - {'image_id', 'file_name', 'detections'}
+        if unsupported:
+            raise ValueError(f"Frame entry keys {sorted(unsupported)} cannot be stored in the NPZ format!")
+    keys = set(key for detection in detections for key in detection)
+    unsupported = keys - {'bbox'} - set(_OPTIONAL_COLUMNS)
+    if unsupported:
+        raise ValueError(f"Detection keys {sorted(unsupported)} cannot be stored in the NPZ format!")
+
+    num_detections = np.array([len(frame.get('detections', [])) for frame in frames], dtype=np.int64)
+    frame_image_id = np.array([frame['image_id'] for frame in frames], dtype=np.int64)
+    columns = {
+        'image_id': np.repeat(frame_image_id, num_detections),
+        'bbox': _column([detection['bbox'] for detection in detections], 'bbox').reshape(-1, 4),
+        'frame_image_id': frame_image_id,
+        'frame_file_name': np.array([frame['file_name'] for frame in frames], dtype=np.str_),
+        'frame_offsets': np.concatenate([[0], np.cumsum(num_detections)]).astype(np.int64),
+        'metadata': np.array(json.dumps({key: value for key, value in results.items() if key != 'annotations'})),
+    }
+    for name in _OPTIONAL_COLUMNS:
+        if name not in keys:
+            continue
+        if not all(name in detection for detection in detections):
+            raise ValueError(f"Detection key {name!r} must be present in all detections or in none!")
+        columns[name] = _column([detection[name] for detection in detections], name)
+
+    return columns
+
+
+def columns_to_results(columns):
+    """
+    Convert the columns of the NPZ format into JSON results structure (inverse of results_to_columns()).
+
+    Raises
+    ------
+    ValueError
+        If the columns do not contain the table of frames.
+    """
+    if 'frame_offsets' not in columns:
+        raise ValueError("Results without the table of frames cannot be converted to the JSON format!")
+
+    bboxes = columns['bbox'].tolist()
+    optional = [(name, columns[name].tolist()) for name in _OPTIONAL_COLUMNS if name in columns]
+    detections = []
+    for index, bbox in enumerate(bboxes):
+        detection = {'bbox': bbox}
+        for name, values in optional:
+            detection[name] = values[index]
+        detections.append(detection)
+
+    offsets = columns['frame_offsets'].tolist()
+    annotations = [
+        {
+            'image_id': image_id,
+            'file_name': file_name,
+            'detections': detections[start:end],
+        }
+        for image_id, file_name, start, end in zip(
+            columns['frame_image_id'].tolist(),
+            columns['frame_file_name'].tolist(),
+            offsets[:-1],
+            offsets[1:],
+        )
+    ]
+
+    results = json.loads(str(columns['metadata'])) if 'metadata' in columns else {}
+    results['annotations'] = annotations
+    return results
+
+
+def complete_frame_table(columns, frames):
+    """
+    Add the table of frames to minimal columns (without one), taking the frames from the given list (e.g., the
+    annotations of the evaluated dataset subset). Frames without detections get an empty detection list; detections
+    of image IDs not in the list are put in additional frames (with empty file names), so that they are reported by
+    validation.
+
+    Parameters
+    ----------
+    columns : dict
+        Columns of the NPZ format (see load_columns()).
+    frames : list
+        Frame dictionaries with 'image_id' and 'file_name' (e.g., LarsSubset.annotations).
+
+    Returns
+    -------
+    columns : dict
+        The columns, with detections grouped by frame (in the frames' order; detections of each frame keep their
+        order), and the table of frames. Columns that already have the table of frames are returned unchanged.
+    """
+    if 'frame_offsets' in columns:
+        return columns
+
+    frame_image_id = [frame['image_id'] for frame in frames]
+    frame_file_name = [frame['file_name'] for frame in frames]
+    positions = {image_id: position for position, image_id in enumerate(frame_image_id)}
+    for image_id in dict.fromkeys(columns['image_id'].tolist()):
+        if image_id not in positions:
+            positions[image_id] = len(frame_image_id)
+            frame_image_id.append(image_id)
+            frame_file_name.append('')
+
+    detection_positions = np.array([positions[image_id] for image_id in columns['image_id'].tolist()], dtype=np.int64)
+    order = np.argsort(detection_positions, kind='stable')
+    num_detections = np.bincount(detection_positions, minlength=len(frame_image_id))
+
+    completed = {name: columns[name][order] for name in ('image_id', 'bbox') + _OPTIONAL_COLUMNS if name in columns}
+    completed['frame_image_id'] = np.array(frame_image_id, dtype=np.int64)
+    completed['frame_file_name'] = np.array(frame_file_name, dtype=np.str_)
+    completed['frame_offsets'] = np.concatenate([[0], np.cumsum(num_detections)]).astype(np.int64)
+    if 'metadata' in columns:
+        completed['metadata'] = columns['metadata']
+    return completed
+
+
+def load_columns(results_file):
+    """
+    Load the columns of the NPZ results file, checking their consistency.
+
+    Raises
+    ------
+    ValueError
+        If the file is missing required columns, or its columns are inconsistent.
+    """
+    with np.load(results_file, allow_pickle=False) as data:
+        columns = {name: data[name] for name in data.files}
+
+    for name in ('image_id', 'bbox'):
+        if name not in columns:
+            raise ValueError(f"Results file {results_file!r} has no {name!r} column!")
+    num_detections = len(columns['image_id'])
+    columns['bbox'] = columns['bbox'].reshape(-1, 4)
+    for name in ('bbox',) + _OPTIONAL_COLUMNS:
+        if name in columns and len(columns[name]) != num_detections:
+            raise ValueError(f"Column {name!r} of results file {results_file!r} has wrong length!")
+    if 'frame_offsets' in columns:
+        offsets = columns['frame_offsets']
+        if (len(offsets) != len(columns['frame_image_id']) + 1 or offsets[0] != 0 or offsets[-1] != num_detections
+                or np.any(np.diff(offsets) < 0)):
+            raise ValueError(f"Table of frames of results file {results_file!r} is inconsistent!")
+
+    return columns
+
+
+def columns_to_detections(columns):
+    """
+    Group the detections of the NPZ columns by image ID, as accepted by evaluation.evaluate_detections(), without
+    constructing per-detection objects.
+
+    The detections keep their order in the file; the 'score' column is not passed on, since the evaluation of a
+    results file must not depend on its format (the JSON format assigns the same score to all detections).
+
+    Returns
+    -------
+    detections : dict
+        Dictionary with {'boxes': (D x 4) array} for each image ID.
+    """
+    image_ids = columns['image_id']
+    if not len(image_ids):
+        frame_ids = columns.get('frame_image_id', np.zeros(0, dtype=np.int64)).tolist()
+        return {image_id: {'boxes': np.zeros((0, 4))} for image_id in frame_ids}
+    boundaries = np.flatnonzero(np.diff(image_ids)) + 1
+    starts = np.concatenate([[0], boundaries]).astype(np.int64)
+    ends = np.concatenate([boundaries, [len(image_ids)]]).astype(np.int64)
+
+    frame_ids = image_ids[starts].tolist()
+    if len(set(frame_ids)) != len(frame_ids):
+        raise ValueError("Detections of the same frame must be stored consecutively!")
+
+    boxes = columns['bbox'].astype(np.float64, copy=False)
+    detections = {}
+    for image_id, start, end in zip(frame_ids, starts.tolist(), ends.tolist()):
+        detections[image_id] = {'boxes': boxes[start:end]}
+
+    # Frames without detections (if the table of frames is available)
+    for image_id in columns.get('frame_image_id', np.zeros(0, dtype=np.int64)).tolist():
+        detections.setdefault(image_id, {'boxes': np.zeros((0, 4))})
+
+    return detections
+
+
+def load_results(results_file, dataset=None):
+    """
+    Load the results file, in either JSON or NPZ format (by extension), as JSON results structure.
+
+    Parameters
+    ----------
+    results_file : str or file-like
+        Results file name, or a readable file-like object with JSON contents.
+    dataset : LarsSubset, optional
+        Evaluated dataset subset; required for minimal NPZ files (without the table of frames), whose table of frames
+        is completed from the subset's frames (see complete_frame_table()).
+    """
+    if is_npz_results(results_file):
+        columns = load_columns(results_file)
+        if dataset is not None:
+            columns = complete_frame_table(columns, dataset.annotations)
+        return columns_to_results(columns)
+    if hasattr(results_file, 'read'):
+        return json.load(results_file)
+    with open(results_file, 'r') as fp:
+        return json.load(fp)
+
+
+def save_results(results_file, results):
+    """
+    Save JSON results structure to the results file, in either JSON or NPZ format (by extension).
+    """
+    if is_npz_results(results_file):
+        np.savez(results_file, **results_to_columns(results))
+    else:
+        with open(results_file, 'w') as fp:
+            json.dump(results, fp)
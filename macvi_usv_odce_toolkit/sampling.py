@@ -0,0 +1,215 @@
+"""
+Quick-look evaluation on a stratified sample of frames.
+
+A sample of frames is drawn from each sequence in proportion to its length (with a fixed seed, so the same frames are
+drawn every time), and only the sampled frames are evaluated, using the frame-level evaluation of the matching module.
+The F-scores of the sample estimate those of the whole subset; their confidence bounds are obtained by a stratified
+bootstrap over the sampled frames' outcomes.
+"""
+import collections
+
+import numpy as np
+
+from . import evaluation
+from . import matching
+from .dataset import sequence_name
+
+# Default seed of the frame sampling and of the bootstrap
+DEFAULT_SEED = 0
+
+# Default number of bootstrap replicates, and the confidence level of the bounds
+DEFAULT_NUM_BOOTSTRAP = 1000
+DEFAULT_CONFIDENCE = 0.95
+
+
+def sample_size(num_frames, sample):
+    """
+    Return the number of frames to sample from the given number of frames.
+
+    Parameters
+    ----------
+    num_frames : int
+        Total number of frames.
+    sample : int or float
+        Number of frames (int), or fraction of frames in (0, 1] (float).
+
+    Returns
+    -------
+    size : int
+        Number of frames to sample; at least one (unless there are no frames), and at most num_frames.
+    """
+    if isinstance(sample, float):
+        if not 0 < sample <= 1:
+            raise ValueError(f"Sample fraction must be in (0, 1], got {sample}!")
+        size = int(round(sample * num_frames))
+    else:
+        if sample < 1:
+            raise ValueError(f"Number of sampled frames must be positive, got {sample}!")
+        size = int(sample)
+    return min(max(size, 1), num_frames)
+
+
+def sample_frames(dataset, sample, seed=DEFAULT_SEED):
+    """
+    Draw a sample of frames, stratified by sequence.
+
+    Each sequence contributes in proportion to its number of frames (largest-remainder rounding), and frames are drawn
+    without replacement within the sequence.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    sample : int or float
+        Number of frames (int), or fraction of frames (float); see sample_size().
+    seed : int, optional
+        Seed of the random generator.
+
+    Returns
+    -------
+    indices : numpy.ndarray
+        Sorted indices of the sampled frames.
+    strata : numpy.ndarray
+        Stratum (sequence) number of each sampled frame.
+    """
+    sequences = collections.OrderedDict()
+    for index, annotation in enumerate(dataset.annotations):
+        sequences.setdefault(sequence_name(annotation['file_name']), []).append(index)
+
+    num_frames = len(dataset.annotations)
+    size = sample_size(num_frames, sample)
+
+    # Proportional allocation, with remaining frames assigned to the sequences with the largest remainders
+    quotas = np.array([len(indices) * size / num_frames for indices in sequences.values()])
+    allocation = np.floor(quotas).astype(np.int64)
+    remainder_order = np.argsort(-(quotas - allocation), kind='stable')
+    allocation[remainder_order[:size - allocation.sum()]] += 1
+
+    rng = np.random.RandomState(seed)
+    indices = []
+    strata = []
+    for stratum, (sequence_indices, count) in enumerate(zip(sequences.values(), allocation)):
+        indices += rng.choice(sequence_indices, size=count, replace=False).tolist()
+        strata += [stratum] * count
+
+    order = np.argsort(indices, kind='stable')
+    return np.array(indices, dtype=np.int64)[order], np.array(strata, dtype=np.int64)[order]
+
+
+class _FrameOutcomes:
+    # Outcomes of the sampled frames in columnar form, from which the F-scores of any multiset of the frames (added in
+    # dataset order) can be computed with a single FScoreAccumulator.add() call.
+
+    def __init__(self, frame_results):
+        self.num_gt = np.array([result.num_gt for result in frame_results], dtype=np.int64)
+        self.num_detections = np.array([result.num_detections for result in frame_results], dtype=np.int64)
+        self.flags = []
+        self.lengths = []
+        self.offsets = []
+        for area_index in range(len(matching.AREA_RANGES)):
+            flags = [result.tp_flags[area_index] for result in frame_results]
+            lengths = np.array([len(frame_flags) for frame_flags in flags], dtype=np.int64)
+            self.flags.append(np.concatenate(flags) if flags else np.zeros(0, dtype=bool))
+            self.lengths.append(lengths)
+            self.offsets.append(np.cumsum(lengths) - lengths)
+
+    def f_scores(self, positions):
+        # F-scores of the frames at the given (sorted) positions; repeated positions count repeatedly
+        tp_flags = []
+        for flags, lengths, offsets in zip(self.flags, self.lengths, self.offsets):
+            lengths = lengths[positions]
+            starts = offsets[positions] - (np.cumsum(lengths) - lengths)
+            tp_flags.append(flags[np.arange(lengths.sum()) + np.repeat(starts, lengths)])
+
+        accumulator = matching.FScoreAccumulator()
+        accumulator.add(matching.FrameResult(
+            num_gt=self.num_gt[positions].sum(axis=0),
+            tp_flags=tuple(tp_flags),
+            num_detections=int(self.num_detections[positions].sum()),
+        ))
+        return accumulator.f_scores()
+
+
+def evaluate_sampled_frames(
+    dataset,
+    results,
+    sample,
+    seed=DEFAULT_SEED,
+    num_bootstrap=DEFAULT_NUM_BOOTSTRAP,
+    confidence=DEFAULT_CONFIDENCE,
+    iou_threshold=matching.IOU_THRESHOLD,
+):
+    """
+    Estimate the F-scores of detection results from a stratified sample of frames (see sample_frames()).
+
+    Only the sampled frames are evaluated. The F-scores do not depend on the ignore masks (see
+    matching.FrameResult.det_in_ignore_region), so no masks are decoded. The bounds are percentile intervals of the
+    stratified bootstrap (frames are resampled with replacement within each sequence); they reflect the sampling
+    variability only, and the interval's width shrinks with the sample size.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    sample : int or float
+        Number of frames (int), or fraction of frames (float); see sample_size().
+    seed : int, optional
+        Seed of the frame sampling and of the bootstrap.
+    num_bootstrap : int, optional
+        Number of bootstrap replicates; zero disables the computation of bounds.
+    confidence : float, optional
+        Confidence level of the bounds.
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    report : dict
+        Dictionary with 'num_frames' (in the subset), 'num_sampled_frames', 'seed', 'confidence', 'f_scores'
+        (estimated F_all, F_small, F_medium, and F_large), and 'lower' and 'upper' bounds of the F-scores (None if
+        bootstrap is disabled).
+    """
+    indices, strata = sample_frames(dataset, sample, seed=seed)
+
+    detections = evaluation.pair_results_with_frames(dataset, results)
+    frame_results = [
+        evaluation.evaluate_frame_detections(
+            dataset,
+            index,
+            evaluation.detections_to_boxes(detections[index]),
+            ignore_regions=False,
+            iou_threshold=iou_threshold,
+        )
+        for index in indices.tolist()
+    ]
+    outcomes = _FrameOutcomes(frame_results)
+
+    positions = np.arange(len(indices))
+    f_scores = outcomes.f_scores(positions)
+
+    lower = upper = None
+    if num_bootstrap > 0:
+        rng = np.random.RandomState(seed)
+        stratum_positions = [positions[strata == stratum] for stratum in np.unique(strata)]
+        replicates = np.empty((num_bootstrap, len(f_scores)))
+        for replicate in range(num_bootstrap):
+            resampled = np.sort(np.concatenate([
+                rng.choice(stratum, size=len(stratum), replace=True) for stratum in stratum_positions
+            ]))
+            replicates[replicate] = outcomes.f_scores(resampled)
+
+        alpha = (1 - confidence) / 2
+        lower = tuple(float(value) for value in np.quantile(replicates, alpha, axis=0))
+        upper = tuple(float(value) for value in np.quantile(replicates, 1 - alpha, axis=0))
+
+    return {
+        'num_frames': len(dataset),
+        'num_sampled_frames': len(indices),
+        'seed': seed,
+        'confidence': confidence,
+        'f_scores': tuple(float(value) for value in f_scores),
+        'lower': lower,
+        'upper': upper,
+    }
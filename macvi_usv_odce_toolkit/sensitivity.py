@@ -0,0 +1,110 @@
+"""
+Sensitivity of the F-scores to the ignore-overlap threshold.
+
+A detection lies in an ignore region if the fraction of its box covered by the frame's ignore mask exceeds the
+threshold (matching.IGNORE_OVERLAP_THRESHOLD). The official protocol (pycocotools) flags such detections, but does not
+act on the flag, so the official F-scores do not depend on the threshold. This module evaluates the variant of the
+protocol in which unmatched detections in ignore regions are ignored instead of counted as false positives, for a list
+of thresholds, in a single pass over the frames: each frame's ignore mask is decoded once, the ignored-area fraction of
+each detection and the IoU matrix are computed once, and only the matching is repeated for each threshold.
+"""
+import numpy as np
+
+from . import evaluation
+from . import matching
+from . import utils
+
+# Default list of thresholds
+DEFAULT_THRESHOLDS = (0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+
+
+def ignored_area_fractions(ignore_mask, det_boxes):
+    """
+    Compute the fraction of each detection box covered by the ignore mask (see utils.bbox_mask_overlap()).
+    """
+    return np.array([utils.bbox_mask_overlap(ignore_mask, bbox) for bbox in det_boxes], dtype=np.float64)
+
+
+def ignore_threshold_sensitivity(
+    dataset,
+    results,
+    thresholds=DEFAULT_THRESHOLDS,
+    iou_threshold=matching.IOU_THRESHOLD,
+):
+    """
+    Evaluate the detection results with unmatched detections in ignore regions ignored, for each of the given
+    ignore-overlap thresholds, alongside the official evaluation.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset; should not cache ignore masks, since each mask is needed only once.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    thresholds : iterable, optional
+        Ignore-overlap thresholds; a detection lies in an ignore region if its ignored-area fraction exceeds the
+        threshold.
+    iou_threshold : float, optional
+        IoU threshold.
+
+    Returns
+    -------
+    report : dict
+        Dictionary with 'num_detections', the 'official' F-scores (F_all, F_small, F_medium, and F_large), and
+        'thresholds': for each threshold, a dictionary with 'threshold', 'num_in_ignore_region' (detections in ignore
+        regions), 'num_ignored' (of those, detections that were not matched and were therefore ignored), and
+        'f_scores'.
+    """
+    thresholds = [float(threshold) for threshold in thresholds]
+
+    official = matching.FScoreAccumulator()
+    accumulators = [matching.FScoreAccumulator() for _ in thresholds]
+    num_in_ignore_region = np.zeros(len(thresholds), dtype=np.int64)
+    num_ignored = np.zeros(len(thresholds), dtype=np.int64)
+
+    for index, detections in enumerate(evaluation.pair_results_with_frames(dataset, results)):
+        det_boxes = evaluation.detections_to_boxes(detections)
+        gt_boxes, gt_areas, gt_iscrowd, gt_ids = dataset.frame_ground_truth(index)
+        ious = matching.compute_ious(det_boxes[:matching.MAX_DETECTIONS], gt_boxes, gt_iscrowd)
+        fractions = ignored_area_fractions(dataset.ignore_mask(index), det_boxes) if len(det_boxes) else np.zeros(0)
+
+        def _evaluate(ignored_regions=None):
+            return matching.evaluate_frame(
+                gt_boxes,
+                gt_areas,
+                gt_iscrowd,
+                gt_ids,
+                det_boxes,
+                iou_threshold=iou_threshold,
+                ious=ious,
+                ignored_regions=ignored_regions,
+            )
+
+        frame_result = _evaluate()
+        official.add(frame_result)
+        for threshold_index, threshold in enumerate(thresholds):
+            in_ignore_region = fractions > threshold
+            if in_ignore_region.any():
+                threshold_result = _evaluate(in_ignore_region)
+                num_in_ignore_region[threshold_index] += np.count_nonzero(in_ignore_region)
+                num_ignored[threshold_index] += (
+                    np.count_nonzero(threshold_result.det_status == matching.DET_IGNORED) -
+                    np.count_nonzero(frame_result.det_status == matching.DET_IGNORED)
+                )
+            else:
+                threshold_result = frame_result  # Identical outcome
+            accumulators[threshold_index].add(threshold_result)
+
+    return {
+        'num_detections': int(official.num_detections),
+        'official': [float(value) for value in official.f_scores()],
+        'thresholds': [
+            {
+                'threshold': threshold,
+                'num_in_ignore_region': int(num_in_ignore_region[threshold_index]),
+                'num_ignored': int(num_ignored[threshold_index]),
+                'f_scores': [float(value) for value in accumulators[threshold_index].f_scores()],
+            }
+            for threshold_index, threshold in enumerate(thresholds)
+        ],
+    }
@@ -0,0 +1,231 @@
+"""
+Dataset subset shared between processes via shared memory.
+
+The owner process loads a LaRS subset, decodes all its ignore masks, and publishes them together with the columnar
+ground truth and frame metadata into a single shared-memory segment. Other processes on the same host attach to the
+segment using a small (JSON-serializable) manifest, and obtain a dataset whose arrays are read-only, zero-copy views
+into the shared memory. The memory footprint of the subset is therefore independent of the number of processes.
+
+The segment is removed when the owner closes the dataset or exits (including abnormal exit, in which case the
+multiprocessing resource tracker removes it). Attached processes never remove the segment.
+
+Requires Python 3.8 or newer (multiprocessing.shared_memory).
+"""
+import sys
+import weakref
+import threading
+
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .dataset import LarsSubset
+
+# Alignment of arrays within the shared-memory segment
+_ALIGNMENT = 64
+
+# Serializes the (temporary) suppression of resource tracker registration in _attach_segment()
+_attach_lock = threading.Lock()
+
+
+def _attach_segment(name):
+    # Attach to an existing segment without registering it with the resource tracker. Processes forked or spawned by
+    # the owner share its resource tracker, so a registration by the attaching process (or its later unregistration)
+    # would clobber the owner's one, and the segment would not be removed if the owner were killed. Before Python 3.13,
+    # attaching always registers the segment, so the registration is suppressed for the duration of the call.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _release_segment(segment, unlink):
+    try:
+        segment.close()
+    except BufferError:
+        pass  # Views into the segment are still alive; the mapping is released when the process exits
+    if unlink:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedLarsSubset(LarsSubset):
+    """
+    LaRS subset whose ground truth, frame metadata, and decoded ignore masks reside in shared memory.
+
+    Use create() in the owner process, and attach() (with the owner's manifest) in other processes; the constructor is
+    not meant to be called directly. Instances can be used wherever a LarsSubset is expected.
+
+    Attributes
+    ----------
+    manifest : dict
+        JSON-serializable description of the shared-memory segment, to be passed to attach().
+    owner : bool
+        Whether this instance owns (and removes on close) the shared-memory segment.
+    """
+    _SHARED_ARRAYS = (
+        'image_ids',
+        'file_names',
+        'image_sizes',
+        'gt_boxes',
+        'gt_areas',
+        'gt_iscrowd',
+        'gt_categories',
+        'gt_offsets',
+        'mask_offsets',
+        'mask_shapes',
+        'masks',
+    )
+
+    def __init__(self, manifest, segment, owner):
+        self.lars_path = manifest['lars_path']
+        self.eval_set = manifest['eval_set']
+        self.cache_masks = True
+        self.manifest = manifest
+        self.owner = owner
+
+        self._segment = segment
+        self._finalizer = weakref.finalize(self, _release_segment, segment, owner)
+
+        arrays = {}
+        for name, (offset, dtype, shape) in manifest['arrays'].items():
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf, offset=offset)
+            array.flags.writeable = False
+            arrays[name] = array
+
+        self.annotations = [
+            {'image_id': image_id, 'file_name': file_name}
+            for image_id, file_name in zip(arrays['image_ids'].tolist(), arrays['file_names'].tolist())
+        ]
+        self.image_sizes = arrays['image_sizes']
+        self.gt_boxes = arrays['gt_boxes']
+        self.gt_areas = arrays['gt_areas']
+        self.gt_iscrowd = arrays['gt_iscrowd']
+        self.gt_categories = arrays['gt_categories']
+        self.gt_offsets = arrays['gt_offsets']
+        self._mask_offsets = arrays['mask_offsets']
+        self._mask_shapes = arrays['mask_shapes']
+        self._masks = arrays['masks']
+
+        self._ignore_masks = {}
+
+    @classmethod
+    def create(cls, lars_path, eval_set, **kwargs):
+        """
+        Load the subset, decode all of its ignore masks, and publish them into a new shared-memory segment.
+
+        Parameters
+        ----------
+        lars_path : str
+            Path to the LaRS dataset.
+        eval_set : str
+            Subset to load, either train, test or val.
+        kwargs
+            Additional keyword arguments for LarsSubset (e.g., gt_cache).
+
+        Returns
+        -------
+        dataset : SharedLarsSubset
+            Owning instance of the shared subset.
+        """
+        dataset = LarsSubset(lars_path, eval_set, cache_masks=False, **kwargs)
+
+        masks = [dataset.ignore_mask(index) for index in range(len(dataset))]
+        mask_sizes = [mask.size for mask in masks]
+
+        arrays = {
+            'image_ids': np.array([annotation['image_id'] for annotation in dataset.annotations], dtype=np.int64),
+            'file_names': np.array([annotation['file_name'] for annotation in dataset.annotations], dtype=np.str_),
+            'image_sizes': dataset.image_sizes,
+            'gt_boxes': dataset.gt_boxes,
+            'gt_areas': dataset.gt_areas,
+            'gt_iscrowd': dataset.gt_iscrowd,
+            'gt_categories': dataset.gt_categories,
+            'gt_offsets': dataset.gt_offsets,
+            'mask_offsets': np.concatenate([[0], np.cumsum(mask_sizes)]).astype(np.int64),
+            'mask_shapes': np.array([mask.shape for mask in masks], dtype=np.int64).reshape(-1, 2),
+            'masks': None,  # Copied mask by mask below
+        }
+        total_mask_size = int(arrays['mask_offsets'][-1])
+
+        # Layout of the segment
+        layout = {}
+        size = 0
+        for name in cls._SHARED_ARRAYS:
+            if name == 'masks':
+                dtype, shape = np.dtype(np.uint8), (total_mask_size,)
+            else:
+                dtype, shape = arrays[name].dtype, arrays[name].shape
+            size = -(-size // _ALIGNMENT) * _ALIGNMENT
+            layout[name] = (size, dtype.str, shape)
+            size += dtype.itemsize * int(np.prod(shape))
+
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            for name, (offset, dtype, shape) in layout.items():
+                target = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf, offset=offset)
+                if name == 'masks':
+                    for mask, start, end in zip(masks, arrays['mask_offsets'][:-1], arrays['mask_offsets'][1:]):
+                        target[start:end] = mask.ravel()
+                else:
+                    target[...] = arrays[name]
+                del target  # Release the buffer export
+        except BaseException:
+            _release_segment(segment, unlink=True)
+            raise
+
+        manifest = {
+            'name': segment.name,
+            'lars_path': lars_path,
+            'eval_set': eval_set,
+            'arrays': {name: [offset, dtype, list(shape)] for name, (offset, dtype, shape) in layout.items()},
+        }
+        return cls(manifest, segment, owner=True)
+
+    @classmethod
+    def attach(cls, manifest):
+        """
+        Attach to the shared subset published by another process.
+
+        Parameters
+        ----------
+        manifest : dict
+            Manifest of the owning instance (see SharedLarsSubset.manifest).
+
+        Returns
+        -------
+        dataset : SharedLarsSubset
+            Non-owning instance of the shared subset.
+        """
+        return cls(manifest, _attach_segment(manifest['name']), owner=False)
+
+    def close(self):
+        """
+        Detach from the shared-memory segment; the owner also removes the segment. The instance (and any arrays
+        obtained from it) must not be used afterwards.
+        """
+        self.image_sizes = self.gt_boxes = self.gt_areas = self.gt_iscrowd = self.gt_categories = None
+        self.gt_offsets = None
+        self._mask_offsets = self._mask_shapes = self._masks = None
+        self._ignore_masks = {}
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def ignore_mask(self, index):
+        """
+        Return the ignore mask for the frame with given index, as a read-only view into the shared memory.
+        """
+        start, end = self._mask_offsets[index], self._mask_offsets[index + 1]
+        return self._masks[start:end].reshape(self._mask_shapes[index])
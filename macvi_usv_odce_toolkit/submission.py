@@ -0,0 +1,110 @@
+# Layout of the submission archive, as produced by the prepare-submission command
+DETECTION_RESULTS_MEMBER = "detection_results.json"
+EVALUATION_RESULTS_MEMBER = "evaluation_results.json"
+SOURCE_CODE_PREFIX = "source_code/"
+
+# Default safety limits for submission archives. These are generous enough for any legitimate submission (results
+# files with millions of detections, sizeable source trees), but reject archives crafted to exhaust disk or memory.
+DEFAULT_MAX_MEMBER_SIZE = 2 * 1024**3  # 2 GiB uncompressed per member
+DEFAULT_MAX_TOTAL_SIZE = 8 * 1024**3  # 8 GiB uncompressed in total
+DEFAULT_MAX_COMPRESSION_RATIO = 200  # uncompressed size / compressed size, per member
+
+
+def check_archive_members(
+    archive,
+    max_member_size=DEFAULT_MAX_MEMBER_SIZE,
+    max_total_size=DEFAULT_MAX_TOTAL_SIZE,
+    max_compression_ratio=DEFAULT_MAX_COMPRESSION_RATIO,
+):
+    """
+    Validate the members of the submission archive against size and compression-ratio limits.
+
+    The check uses only the sizes recorded in the archive's central directory, so no data is decompressed. Declared
+    sizes cannot be used to smuggle in more data, because zipfile stops reading a member after its declared
+    uncompressed size (and fails the CRC check if the data does not match).
+
+    Parameters
+    ----------
+    archive : zipfile.ZipFile
+        Opened submission archive.
+    max_member_size : int, optional
+        Maximum uncompressed size of a single member, in bytes. None disables the check.
+    max_total_size : int, optional
+        Maximum total uncompressed size of all members, in bytes. None disables the check.
+    max_compression_ratio : float, optional
+        Maximum ratio between uncompressed and compressed size of a single member. None disables the check.
+
+    Raises
+    ------
+    ValueError
+        If any of the limits is exceeded, or if a member has an unsafe (absolute or parent-relative) path.
+    """
+    total_size = 0
+    for info in archive.infolist():
+        name = info.filename
+        if name.startswith(("/", "\\")) or ".." in name.replace("\\", "/").split("/"):
+            raise ValueError(f"Archive member {name!r} has unsafe path!")
+
+        if max_member_size is not None and info.file_size > max_member_size:
+            raise ValueError(
+                f"Archive member {name!r} is too large: {info.file_size} bytes (limit: {max_member_size} bytes)!"
+            )
+
+        if max_compression_ratio is not None and info.file_size > 0:
+            ratio = info.file_size / max(info.compress_size, 1)
+            if ratio > max_compression_ratio:
+                raise ValueError(
+                    f"Archive member {name!r} has suspicious compression ratio: {ratio:.1f} "
+                    f"(limit: {max_compression_ratio})!"
+                )
+
+        total_size += info.file_size
+        if max_total_size is not None and total_size > max_total_size:
+            raise ValueError(f"Archive contents are too large: more than {max_total_size} bytes uncompressed!")
+
+
+def open_archive_member(archive, name):
+    """
+    Open the specified member of the submission archive for streamed reading.
+
+    Parameters
+    ----------
+    archive : zipfile.ZipFile
+        Opened submission archive.
+    name : str
+        Name of the member (e.g., DETECTION_RESULTS_MEMBER).
+
+    Returns
+    -------
+    fp : file-like
+        Binary file-like object; can be passed directly to JSON-consuming functions.
+    """
+    try:
+        return archive.open(name, "r")
+    except KeyError:
+        raise ValueError(f"Submission archive does not contain {name!r}!") from None
+
+
+def extract_archive_members(archive, target_path, prefix=None):
+    """
+    Extract the members of the submission archive into target directory.
+
+    Parameters
+    ----------
+    archive : zipfile.ZipFile
+        Opened submission archive.
+    target_path : str
+        Target directory.
+    prefix : str, optional
+        If specified, only members whose names start with the prefix (e.g., SOURCE_CODE_PREFIX) are extracted.
+
+    Returns
+    -------
+    count : int
+        Number of extracted members.
+    """
+    members = [info for info in archive.infolist() if prefix is None or info.filename.startswith(prefix)]
+    for info in members:
+        archive.extract(info, target_path)
+    return len(members)
+
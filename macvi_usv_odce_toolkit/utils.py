@@ -1,6 +1,56 @@
+import hashlib
+
 import numpy as np
 
 
+def file_sha256(file, chunk_size=1024 * 1024):
+    """
+    Compute SHA-256 hash of the file's contents.
+
+    Parameters
+    ----------
+    file : str or file-like
+        Path to the file, or a readable binary file-like object (read until the end).
+    chunk_size : int, optional
+        Size of chunks in which the file is read.
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal digest.
+    """
+    if not hasattr(file, 'read'):
+        with open(file, 'rb') as fp:
+            return file_sha256(fp, chunk_size)
+
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bbox_mask_overlap(mask, rect):
+    """
+    Compute the fraction of the bounding box rectangle (rounded to integer pixels) covered by the mask.
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        A 2D mask with 0/1 values.
+    rect : iterable
+        An iterable containing bounding box rectangle: (x, y, w, h)
+
+    Returns
+    -------
+    float
+        Number of mask pixels within the rectangle, divided by the rectangle's area.
+    """
+    x, y, w, h = (int(round(x)) for x in rect)
+    roi = mask[y:(y + h), x:(x + w)]
+    overlap = np.sum(roi)
+    return float(overlap / (w * h))
+
+
 def bbox_in_mask(mask, rect, thr=0.5):
     """
     Check whether the overlap of the given bounding box rectangle with the mask exceeds the specified threshold.
@@ -19,10 +69,216 @@ def bbox_in_mask(mask, rect, thr=0.5):
     bool
         A boolean indicating that overlap exceeds the specified threshold.
     """
-    x, y, w, h = (int(round(x)) for x in rect)
-    roi = mask[y:(y + h), x:(x + w)]
-    overlap = np.sum(roi)
-    return bool((overlap / (w * h)) > thr)  # np.bool -> bool
+    return bbox_mask_overlap(mask, rect) > thr
+
+
+def f_score(precision, recall):
+    """
+    Compute F-score (harmonic mean of precision and recall).
+
+    Parameters
+    ----------
+    precision : float
+        Precision value.
+    recall : float
+        Recall value.
+
+    Returns
+    -------
+    f : float
+        F-score; 0 if either precision or recall is 0.
+    """
+    if precision != 0 and recall != 0:
+        return 2 * (precision * recall) / (precision + recall)
+    else:
+        return 0
+
+
+# Default maximum number of elements of an IoU (sub)matrix computed in one go; bounds the size of temporary arrays
+DEFAULT_IOU_CHUNK_SIZE = 2**22
+
+
+def _as_boxes(boxes, dtype=np.float64):
+    return np.asarray(boxes, dtype=dtype).reshape(-1, 4)
+
+
+def _iou_block(boxes1, boxes2, iscrowd, out):
+    # IoU between (n x 4) and (m x 4) boxes, written into (n x m) out; same arithmetic as pycocotools.mask.iou()
+    x1, y1, w1, h1 = (boxes1[:, i, None] for i in range(4))
+    x2, y2, w2, h2 = (boxes2[None, :, i] for i in range(4))
+
+    w = np.minimum(x1 + w1, x2 + w2) - np.maximum(x1, x2)
+    h = np.minimum(y1 + h1, y2 + h2) - np.maximum(y1, y2)
+    valid = (w > 0) & (h > 0)
+
+    intersection = w * h
+    area1 = w1 * h1
+    union = area1 + (w2 * h2) - intersection
+    if iscrowd is not None:
+        union = np.where(iscrowd[None, :], area1, union)
+
+    out[...] = 0
+    np.divide(intersection, union, out=out, where=valid)
+    return out
+
+
+def compute_iou_matrix(boxes1, boxes2, iscrowd=None, dtype=np.float64, chunk_size=DEFAULT_IOU_CHUNK_SIZE, out=None):
+    """
+    Compute the matrix of intersection-over-union overlaps between two sets of bounding boxes.
+
+    The computation is vectorized with broadcasting. To bound the memory used by temporary arrays, the matrix is
+    computed in chunks of rows, each containing at most chunk_size elements. With float64 dtype, the values are
+    identical to those of pycocotools.mask.iou().
+
+    Parameters
+    ----------
+    boxes1 : array_like
+        (N x 4) array of bounding boxes (x, y, w, h); e.g., detections.
+    boxes2 : array_like
+        (M x 4) array of bounding boxes (x, y, w, h); e.g., ground-truth annotations.
+    iscrowd : array_like, optional
+        Boolean array of length M. For crowd boxes, the intersection is divided by the area of the box from boxes1
+        instead of the union (as in pycocotools).
+    dtype : numpy.dtype, optional
+        Data type used for computation and of the resulting matrix (e.g., numpy.float32 to halve the memory).
+    chunk_size : int, optional
+        Maximum number of matrix elements computed at once. None disables chunking.
+    out : numpy.ndarray, optional
+        Pre-allocated (N x M) output array of given dtype.
+
+    Returns
+    -------
+    iou : numpy.ndarray
+        (N x M) IoU matrix.
+    """
+    boxes1 = _as_boxes(boxes1, dtype)
+    boxes2 = _as_boxes(boxes2, dtype)
+    if iscrowd is not None:
+        iscrowd = np.asarray(iscrowd, dtype=bool)
+
+    if out is None:
+        out = np.empty((len(boxes1), len(boxes2)), dtype=dtype)
+    if not out.size:
+        return out
+
+    rows = len(boxes1) if chunk_size is None else max(1, chunk_size // len(boxes2))
+    for start in range(0, len(boxes1), rows):
+        _iou_block(boxes1[start:start + rows], boxes2, iscrowd, out[start:start + rows])
+
+    return out
+
+
+def compute_thresholded_iou_matrix(boxes1, boxes2, thr, iscrowd=None, dtype=np.float64):
+    """
+    Compute the IoU matrix between two sets of bounding boxes, with values equal to or below the threshold reset to 0.
+
+    Only the pairs of boxes that overlap are evaluated (see compute_sparse_iou), so the cost is proportional to the
+    number of overlapping pairs rather than N x M.
+
+    Parameters
+    ----------
+    boxes1 : array_like
+        (N x 4) array of bounding boxes (x, y, w, h).
+    boxes2 : array_like
+        (M x 4) array of bounding boxes (x, y, w, h).
+    thr : float
+        IoU threshold.
+    iscrowd : array_like, optional
+        Boolean array of length M; see compute_iou_matrix().
+    dtype : numpy.dtype, optional
+        Data type of the resulting matrix.
+
+    Returns
+    -------
+    iou : numpy.ndarray
+        (N x M) IoU matrix, with values not exceeding the threshold set to 0.
+    """
+    boxes1 = _as_boxes(boxes1)
+    boxes2 = _as_boxes(boxes2)
+    idx1, idx2, values = compute_sparse_iou(boxes1, boxes2, iscrowd)
+
+    keep = values > thr
+    out = np.zeros((len(boxes1), len(boxes2)), dtype=dtype)
+    out[idx1[keep], idx2[keep]] = values[keep]
+    return out
+
+
+def compute_iou_matrices(boxes1, boxes2, iscrowd=None, dtype=np.float64, chunk_size=DEFAULT_IOU_CHUNK_SIZE):
+    """
+    Compute IoU matrices for a batch of frames.
+
+    Frames are zero-padded to the largest number of boxes in the batch and processed together with broadcasting, in
+    chunks of frames that contain at most chunk_size (padded) elements.
+
+    Parameters
+    ----------
+    boxes1 : list
+        List of (N_i x 4) box arrays, one per frame.
+    boxes2 : list
+        List of (M_i x 4) box arrays, one per frame.
+    iscrowd : list, optional
+        List of boolean arrays of length M_i, one per frame; see compute_iou_matrix().
+    dtype : numpy.dtype, optional
+        Data type used for computation and of the resulting matrices.
+    chunk_size : int, optional
+        Maximum number of (padded) matrix elements computed at once. None disables chunking.
+
+    Returns
+    -------
+    ious : list
+        List of (N_i x M_i) IoU matrices.
+    """
+    assert len(boxes1) == len(boxes2), "Number of frames in both sets of boxes must match!"
+    boxes1 = [_as_boxes(boxes, dtype) for boxes in boxes1]
+    boxes2 = [_as_boxes(boxes, dtype) for boxes in boxes2]
+    if iscrowd is None:
+        iscrowd = [None] * len(boxes2)
+
+    ious = [None] * len(boxes1)
+    num_frames = len(boxes1)
+    start = 0
+    while start < num_frames:
+        # Grow the chunk of frames while the padded size fits within the limit
+        end = start + 1
+        max_n, max_m = len(boxes1[start]), len(boxes2[start])
+        while end < num_frames:
+            n = max(max_n, len(boxes1[end]))
+            m = max(max_m, len(boxes2[end]))
+            if chunk_size is not None and (end + 1 - start) * n * m > chunk_size:
+                break
+            max_n, max_m = n, m
+            end += 1
+
+        if end - start == 1 or not max_n or not max_m:
+            for i in range(start, end):
+                ious[i] = compute_iou_matrix(boxes1[i], boxes2[i], iscrowd[i], dtype=dtype, chunk_size=chunk_size)
+        else:
+            # Padding boxes have zero size, and therefore zero IoU with everything
+            padded1 = np.zeros((end - start, max_n, 4), dtype=dtype)
+            padded2 = np.zeros((end - start, max_m, 4), dtype=dtype)
+            padded_crowd = np.zeros((end - start, max_m), dtype=bool)
+            for i in range(start, end):
+                padded1[i - start, :len(boxes1[i])] = boxes1[i]
+                padded2[i - start, :len(boxes2[i])] = boxes2[i]
+                if iscrowd[i] is not None:
+                    padded_crowd[i - start, :len(boxes2[i])] = iscrowd[i]
+
+            x1, y1, w1, h1 = (padded1[:, :, i, None] for i in range(4))
+            x2, y2, w2, h2 = (padded2[:, None, :, i] for i in range(4))
+            w = np.minimum(x1 + w1, x2 + w2) - np.maximum(x1, x2)
+            h = np.minimum(y1 + h1, y2 + h2) - np.maximum(y1, y2)
+            intersection = w * h
+            area1 = w1 * h1
+            union = np.where(padded_crowd[:, None, :], area1, area1 + (w2 * h2) - intersection)
+            batch = np.zeros(intersection.shape, dtype=dtype)
+            np.divide(intersection, union, out=batch, where=(w > 0) & (h > 0))
+
+            for i in range(start, end):
+                ious[i] = batch[i - start, :len(boxes1[i]), :len(boxes2[i])].copy()
+
+        start = end
+
+    return ious
 
 
 def compute_iou_overlaps(rect, annotations, thr=0.3):
@@ -30,6 +286,8 @@ def compute_iou_overlaps(rect, annotations, thr=0.3):
     Compute intersection-over-union overlaps between the given bounding-box rectangle and all annotated bounding-box
     rectangles.
 
+    This is a convenience wrapper around compute_iou_matrix().
+
     Parameters
     ----------
     rect : iterable
@@ -44,14 +302,16 @@ def compute_iou_overlaps(rect, annotations, thr=0.3):
         An iterable containing the overlap value for each annotation. If overlap value is equal or less than
         the specified threshold, it is reset to 0.
     """
-    overlaps = [compute_iou(rect, annotation['bbox']) for annotation in annotations]
-    return [x if x > thr else 0 for x in overlaps]
+    overlaps = compute_iou_matrix([rect], [annotation['bbox'] for annotation in annotations])[0]
+    return [x if x > thr else 0 for x in overlaps.tolist()]
 
 
 def compute_iou(bbox1, bbox2):
     """
     Compute intersection-over-union overlap between two bounding boxes.
 
+    This is a convenience wrapper around compute_iou_matrix().
+
     Parameters
     ----------
     bbox1 : iterable
@@ -64,30 +324,118 @@ def compute_iou(bbox1, bbox2):
     iou : float
         IoU overlap between the two bounding boxes.
     """
-    bbox1_x1, bbox1_y1, bbox1_w, bbox1_h = bbox1
-    bbox2_x1, bbox2_y1, bbox2_w, bbox2_h = bbox2
-
-    # Determine the coordinates of the intersection rectangle
-    x_left = max(bbox1_x1, bbox2_x1)
-    y_top = max(bbox1_y1, bbox2_y1)
-    x_right = min(bbox1_x1 + bbox1_w, bbox2_x1 + bbox2_w)
-    y_bottom = min(bbox1_y1 + bbox1_h, bbox2_y1 + bbox2_h)
-
-    if x_right < x_left or y_bottom < y_top:
-        return 0.0
-
-    # The intersection of two axis-aligned bounding boxes is always an
-    # axis-aligned bounding box
-    intersection_area = (x_right - x_left) * (y_bottom - y_top)
-
-    # Compute the area of both bounding boxes
-    bbox1_area = bbox1_w * bbox1_h
-    bbox2_area = bbox2_w * bbox2_h
-
-    # Compute the intersection over union by taking the intersection
-    # area and dividing it by the sum of prediction + ground-truth
-    # areas - the interesection area
-    iou = intersection_area / float(bbox1_area + bbox2_area - intersection_area)
-    assert iou >= 0.0
-    assert iou <= 1.0
-    return float(iou)
+    return float(compute_iou_matrix([bbox1], [bbox2])[0, 0])
+
+
+def _interval_ranges(sorted_values, lo_values, hi_values, lo_side):
+    # For each query i, the range of positions in sorted_values that fall between lo_values[i] and hi_values[i]
+    lo = np.searchsorted(sorted_values, lo_values, side=lo_side)
+    hi = np.searchsorted(sorted_values, hi_values, side='left')
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    queries = np.repeat(np.arange(len(lo_values), dtype=np.int64), counts)
+    positions = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    return queries, positions
+
+
+def _overlapping_box_pairs(boxes1, boxes2):
+    # Sort-and-sweep along x. Two boxes overlap along x if and only if either the left edge of the second box lies
+    # within [left1, right1), or the left edge of the first box lies within (left2, right2). For each box, the boxes
+    # satisfying either condition form a contiguous range in the other set sorted by left edge, so only the pairs
+    # that overlap along x are generated. These are then filtered on exact overlap along both axes.
+    # Returns index pairs (sorted by first, then second index) and widths/heights of their intersections.
+    if len(boxes1) == 0 or len(boxes2) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+
+    left1, right1 = boxes1[:, 0], boxes1[:, 0] + boxes1[:, 2]
+    left2, right2 = boxes2[:, 0], boxes2[:, 0] + boxes2[:, 2]
+    order1 = np.argsort(left1, kind='stable')
+    order2 = np.argsort(left2, kind='stable')
+
+    # left1 <= left2 < right1
+    queries, positions = _interval_ranges(left2[order2], left1, right1, 'left')
+    idx1_a, idx2_a = queries, order2[positions]
+    # left2 < left1 < right2
+    queries, positions = _interval_ranges(left1[order1], left2, right2, 'right')
+    idx1_b, idx2_b = order1[positions], queries
+
+    idx1 = np.concatenate([idx1_a, idx1_b])
+    idx2 = np.concatenate([idx2_a, idx2_b])
+
+    # Intersection, computed in the same way as in pycocotools
+    b1 = boxes1[idx1]
+    b2 = boxes2[idx2]
+    w = np.minimum(b1[:, 0] + b1[:, 2], b2[:, 0] + b2[:, 2]) - np.maximum(b1[:, 0], b2[:, 0])
+    h = np.minimum(b1[:, 1] + b1[:, 3], b2[:, 1] + b2[:, 3]) - np.maximum(b1[:, 1], b2[:, 1])
+    valid = (w > 0) & (h > 0)
+    idx1, idx2, w, h = idx1[valid], idx2[valid], w[valid], h[valid]
+
+    order = np.lexsort((idx2, idx1))
+    return idx1[order], idx2[order], w[order], h[order]
+
+
+def find_overlapping_pairs(boxes1, boxes2):
+    """
+    Find all pairs of boxes from the two sets whose intersection has a positive area.
+
+    Instead of testing all N x M pairs, a sort-and-sweep along the x axis is used to generate only the pairs whose x
+    extents overlap; these candidates are then checked for overlap along the y axis.
+
+    Parameters
+    ----------
+    boxes1 : numpy.ndarray
+        (N x 4) array of boxes (x, y, w, h).
+    boxes2 : numpy.ndarray
+        (M x 4) array of boxes (x, y, w, h).
+
+    Returns
+    -------
+    idx1 : numpy.ndarray
+        Indices into boxes1, sorted.
+    idx2 : numpy.ndarray
+        Corresponding indices into boxes2 (sorted within the same idx1).
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    idx1, idx2, _, _ = _overlapping_box_pairs(boxes1, boxes2)
+    return idx1, idx2
+
+
+def compute_sparse_iou(boxes1, boxes2, iscrowd=None):
+    """
+    Compute intersection-over-union overlaps only for the pairs of boxes that overlap (see find_overlapping_pairs).
+
+    The IoU values are computed with the same arithmetic as pycocotools.mask.iou(), so they are identical to the
+    corresponding elements of the full IoU matrix; all other pairs have zero IoU.
+
+    Parameters
+    ----------
+    boxes1 : numpy.ndarray
+        (N x 4) array of boxes (x, y, w, h); e.g., detections.
+    boxes2 : numpy.ndarray
+        (M x 4) array of boxes (x, y, w, h); e.g., ground-truth annotations.
+    iscrowd : numpy.ndarray, optional
+        Boolean array of length M. For crowd boxes, the intersection is divided by the area of the box from boxes1
+        instead of the union (as in pycocotools).
+
+    Returns
+    -------
+    idx1 : numpy.ndarray
+        Indices into boxes1.
+    idx2 : numpy.ndarray
+        Corresponding indices into boxes2.
+    iou : numpy.ndarray
+        IoU values of the pairs.
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    idx1, idx2, w, h = _overlapping_box_pairs(boxes1, boxes2)
+
+    intersection = w * h
+    area1 = boxes1[idx1, 2] * boxes1[idx1, 3]
+    area2 = boxes2[idx2, 2] * boxes2[idx2, 3]
+    union = area1 + area2 - intersection
+    if iscrowd is not None:
+        union = np.where(np.asarray(iscrowd, dtype=bool)[idx2], area1, union)
+
+    return idx1, idx2, intersection / union
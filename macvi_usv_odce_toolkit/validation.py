@@ -0,0 +1,332 @@
+"""
+Validation of detection results files.
+
+The checks use only the dataset's annotations (see dataset.LarsSubset) and never decode the masks, so they take a
+fraction of the time of the evaluation. Problems are reported as issues, grouped by their code:
+
+ - errors: problems that make the evaluation fail or meaningless (malformed structure, missing or unknown frames,
+   invalid boxes);
+ - warnings: suspicious content that the evaluation processes nevertheless (boxes extending outside the image,
+   detections beyond the per-frame limit, duplicated detection IDs).
+"""
+import collections
+import numbers
+
+import numpy as np
+
+from . import matching
+
+# Default number of examples recorded for each issue
+DEFAULT_MAX_EXAMPLES = 5
+
+
+class _IssueCollector:
+    # Collects issues grouped by code: the number of occurrences, and the first few examples
+
+    def __init__(self, max_examples):
+        self.max_examples = max_examples
+        self.issues = collections.OrderedDict()
+
+    def add(self, severity, code, message, examples=(), count=1):
+        issue = self.issues.setdefault(code, {
+            'severity': severity,
+            'code': code,
+            'message': message,
+            'count': 0,
+            'examples': [],
+        })
+        issue['count'] += count
+        for example in examples:
+            if len(issue['examples']) >= self.max_examples:
+                break
+            issue['examples'].append(example)
+
+    def report(self):
+        return (
+            [issue for issue in self.issues.values() if issue['severity'] == 'error'],
+            [issue for issue in self.issues.values() if issue['severity'] == 'warning'],
+        )
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _check_structure(results, collector):
+    # Top-level and per-frame structure; returns the list of well-formed frame entries
+    if not isinstance(results, dict) or not isinstance(results.get('annotations'), list):
+        collector.add('error', 'invalid-structure', "Results must be an object with an 'annotations' list.")
+        return []
+
+    frames = []
+    for position, entry in enumerate(results['annotations']):
+        example = {'position': position}
+        if not isinstance(entry, dict):
+            collector.add('error', 'invalid-frame-entry', "Frame entry must be an object.", examples=[example])
+            continue
+        if not isinstance(entry.get('image_id'), int) or isinstance(entry.get('image_id'), bool):
+            collector.add('error', 'invalid-image-id', "Frame entry must have an integer 'image_id'.", [example])
+            continue
+        example['image_id'] = entry['image_id']
+        if not isinstance(entry.get('file_name'), str):
+            collector.add('error', 'invalid-file-name', "Frame entry must have a string 'file_name'.", [example])
+            continue
+        if not isinstance(entry.get('detections', []), list):
+            # Still counts towards frame coverage
+            collector.add('error', 'invalid-detections', "Frame's 'detections' must be a list.", [example])
+        frames.append(entry)
+
+    return frames
+
+
+def _check_coverage(dataset, frames, collector):
+    # Frame coverage against the dataset; returns {image_id: frame index} for frames that can be evaluated
+    dataset_ids = {annotation['image_id']: index for index, annotation in enumerate(dataset.annotations)}
+    counts = collections.Counter(entry['image_id'] for entry in frames)
+
+    duplicated = sorted(image_id for image_id, count in counts.items() if count > 1)
+    if duplicated:
+        collector.add(
+            'error',
+            'duplicate-frame',
+            "Multiple entries for the same frame.",
+            count=len(duplicated),
+            examples=[{'image_id': image_id} for image_id in duplicated],
+        )
+
+    unknown = sorted(image_id for image_id in counts if image_id not in dataset_ids)
+    missing = sorted(image_id for image_id in dataset_ids if image_id not in counts)
+    if unknown and len(unknown) == len(counts):
+        collector.add(
+            'error',
+            'wrong-subset',
+            f"None of the frames belong to the {dataset.eval_set!r} subset; are these results for another subset?",
+            count=len(unknown),
+            examples=[{'image_id': image_id} for image_id in unknown],
+        )
+        return {}
+    if unknown:
+        collector.add(
+            'error',
+            'unknown-frame',
+            f"Frame does not belong to the {dataset.eval_set!r} subset.",
+            count=len(unknown),
+            examples=[{'image_id': image_id} for image_id in unknown],
+        )
+    if missing:
+        collector.add(
+            'error',
+            'missing-frame',
+            "Frame of the subset has no entry in the results.",
+            count=len(missing),
+            examples=[
+                {'image_id': image_id, 'file_name': dataset.annotations[dataset_ids[image_id]]['file_name']}
+                for image_id in missing
+            ],
+        )
+
+    # The evaluation pairs the frames by image ID, and checks that their file names (without extension) agree
+    frame_indices = {}
+    for entry in frames:
+        index = dataset_ids.get(entry['image_id'])
+        if index is None:
+            continue
+        expected_file_name = dataset.annotations[index]['file_name']
+        if entry['file_name'][:-4] != expected_file_name[:-4]:
+            collector.add('error', 'file-name-mismatch', "Frame's file name does not match the dataset.", examples=[{
+                'image_id': entry['image_id'],
+                'file_name': entry['file_name'],
+                'expected_file_name': expected_file_name,
+            }])
+            continue
+        frame_indices[entry['image_id']] = index
+
+    return frame_indices
+
+
+def _bbox_array(bboxes):
+    # Fast path: convert the list of bboxes at once; returns None if any of them is not a list of four numbers
+    try:
+        boxes = np.array(bboxes)
+    except ValueError:
+        return None
+    if boxes.dtype.kind not in 'iuf' or boxes.shape != (len(bboxes), 4):
+        return None
+    return boxes.astype(np.float64, copy=False)
+
+
+def _check_detections(dataset, frames, frame_indices, collector):
+    # Detection structure and geometry, with vectorized checks over all detections; returns number of detections
+    bboxes = []
+    frame_positions = []
+    detection_indices = []
+    num_detections = 0
+    for position, entry in enumerate(frames):
+        detections = entry.get('detections', [])
+        if not isinstance(detections, list):
+            continue  # Already reported
+        num_detections += len(detections)
+
+        if len(detections) > matching.MAX_DETECTIONS:
+            collector.add(
+                'warning',
+                'too-many-detections',
+                f"Frame has more than {matching.MAX_DETECTIONS} detections; the rest are discarded by the evaluation.",
+                examples=[{'image_id': entry['image_id'], 'num_detections': len(detections)}],
+            )
+
+        ids = [detection.get('id') for detection in detections if isinstance(detection, dict)]
+        ids = [repr(value) for value in ids if value is not None]
+        if len(ids) != len(set(ids)):
+            collector.add(
+                'warning',
+                'duplicate-detection-id',
+                "Frame has multiple detections with the same ID.",
+                examples=[{'image_id': entry['image_id']}],
+            )
+
+        bboxes += [detection.get('bbox') if isinstance(detection, dict) else None for detection in detections]
+        frame_positions.append(np.full(len(detections), position, dtype=np.int64))
+        detection_indices.append(np.arange(len(detections), dtype=np.int64))
+
+    if not bboxes:
+        return num_detections
+
+    frame_positions = np.concatenate(frame_positions)
+    detection_indices = np.concatenate(detection_indices)
+
+    boxes = _bbox_array(bboxes)
+    if boxes is None:
+        # Slow path: find the malformed bboxes, and check the rest
+        valid = np.array([
+            isinstance(bbox, (list, tuple)) and len(bbox) == 4 and all(_is_number(x) for x in bbox)
+            for bbox in bboxes
+        ], dtype=bool)
+        invalid_indices = np.flatnonzero(~valid)
+        collector.add(
+            'error',
+            'invalid-bbox',
+            "Detection must have a 'bbox' with four numbers (x, y, w, h).",
+            examples=[
+                {'image_id': frames[frame_positions[i]]['image_id'], 'detection_index': int(detection_indices[i])}
+                for i in invalid_indices[:collector.max_examples]
+            ],
+            count=len(invalid_indices),
+        )
+        if valid.any():
+            boxes = np.array([bbox for bbox, is_valid in zip(bboxes, valid) if is_valid], dtype=np.float64)
+        else:
+            boxes = np.zeros((0, 4))
+        frame_positions = frame_positions[valid]
+        detection_indices = detection_indices[valid]
+
+    def _examples(selection):
+        return [
+            {
+                'image_id': frames[position]['image_id'],
+                'detection_index': int(detection_index),
+                'bbox': frames[position]['detections'][detection_index]['bbox'],
+            }
+            for position, detection_index in zip(
+                frame_positions[selection][:collector.max_examples].tolist(),
+                detection_indices[selection][:collector.max_examples].tolist(),
+            )
+        ]
+
+    finite = np.isfinite(boxes).all(axis=1)
+    if not finite.all():
+        selection = ~finite
+        collector.add(
+            'error',
+            'non-finite-bbox',
+            "Detection's bbox contains non-finite values.",
+            count=int(selection.sum()),
+            examples=_examples(selection),
+        )
+
+    # The overlap with the ignore mask is computed on the box rounded to integer pixels, and divides by its area
+    rounded_size = np.round(np.where(finite[:, None], boxes[:, 2:], 0))
+    empty = finite & ((rounded_size <= 0).any(axis=1))
+    if empty.any():
+        collector.add(
+            'error',
+            'empty-bbox',
+            "Detection's bbox has zero or negative width or height (after rounding to pixels).",
+            count=int(empty.sum()),
+            examples=_examples(empty),
+        )
+
+    # Boxes extending outside the image, for frames with known image size
+    image_sizes = np.full((len(frames), 2), -1, dtype=np.int64)
+    for position, entry in enumerate(frames):
+        index = frame_indices.get(entry['image_id'])
+        if index is not None:
+            image_sizes[position] = dataset.image_sizes[index]
+    heights, widths = image_sizes[frame_positions, 0], image_sizes[frame_positions, 1]
+    known = finite & ~empty & (heights >= 0)
+    outside = known & (
+        (boxes[:, 0] < 0) | (boxes[:, 1] < 0) |
+        (boxes[:, 0] + boxes[:, 2] > widths) | (boxes[:, 1] + boxes[:, 3] > heights)
+    )
+    if outside.any():
+        collector.add(
+            'warning',
+            'bbox-outside-image',
+            "Detection's bbox extends outside the image.",
+            count=int(outside.sum()),
+            examples=_examples(outside),
+        )
+
+    return num_detections
+
+
+def validate_detection_results(dataset, results, max_examples=DEFAULT_MAX_EXAMPLES):
+    """
+    Validate detection results against the dataset subset, without decoding any masks.
+
+    Parameters
+    ----------
+    dataset : LarsSubset
+        Loaded dataset subset.
+    results : dict
+        Parsed detection results (contents of results JSON file).
+    max_examples : int, optional
+        Maximum number of examples recorded for each issue.
+
+    Returns
+    -------
+    report : dict
+        Dictionary with 'valid' (True if there are no errors), 'num_frames' and 'num_detections' (in the results),
+        'errors' and 'warnings'. Each issue is a dictionary with 'severity', 'code', 'message', 'count' (number of
+        occurrences), and 'examples' (list of dictionaries identifying the offending frames and/or detections).
+    """
+    collector = _IssueCollector(max_examples)
+
+    frames = _check_structure(results, collector)
+    if frames or not collector.issues:  # Coverage is meaningless if no frame entry is well-formed
+        frame_indices = _check_coverage(dataset, frames, collector)
+    else:
+        frame_indices = {}
+    num_detections = _check_detections(dataset, frames, frame_indices, collector)
+
+    errors, warnings = collector.report()
+    return {
+        'valid': not errors,
+        'num_frames': len(frames),
+        'num_detections': num_detections,
+        'errors': errors,
+        'warnings': warnings,
+    }
+
+
+def format_issue(issue):
+    """
+    Format the issue (see validate_detection_results()) as a single line of text.
+    """
+    examples = "; ".join(
+        ", ".join(f"{key}={value!r}" for key, value in example.items()) for example in issue['examples']
+    )
+    text = f"[{issue['code']}] {issue['message']} ({issue['count']} occurrence(s))"
+    if examples:
+        text += f" E.g.: {examples}"
+    return text
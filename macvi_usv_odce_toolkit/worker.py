@@ -0,0 +1,362 @@
+import os
+import io
+import json
+import time
+import socket
+import sys
+import logging
+import zipfile
+import collections
+import multiprocessing
+
+from .dataset import LarsSubset
+from . import evaluation
+from . import submission
+
+# Name of the inbox sub-directory into which the archives are moved when they are claimed
+CLAIMED_DIR_NAME = ".claimed"
+
+# Failures caused by the submission itself; retrying these is pointless.
+_PERMANENT_ERRORS = (ValueError, AssertionError, KeyError, TypeError, zipfile.BadZipFile)
+
+
+# Per-process state of the pool workers: the dataset is loaded once per process, and kept warm across jobs. Ignore
+# masks are not cached (each job decodes the masks it needs), so the memory footprint does not grow with the number
+# of processes; with shared memory, the decoded masks are shared by all processes instead.
+_worker_dataset = None
+
+
+def _initialize_pool_worker(lars_path, eval_set, shared_manifest=None):
+    global _worker_dataset
+    logging.getLogger().setLevel(logging.INFO)  # Capture job logs even if the process was spawned
+    if shared_manifest is not None:
+        from .shared_dataset import SharedLarsSubset  # Requires Python 3.8 or newer
+        _worker_dataset = SharedLarsSubset.attach(shared_manifest)
+    else:
+        _worker_dataset = LarsSubset(lars_path, eval_set, cache_masks=False)
+
+
+def _process_submission(archive_file, archive_limits):
+    """
+    Evaluate a single submission archive in a pool worker process, using the process' pre-loaded dataset.
+
+    Returns a dictionary with the outcome; the log messages emitted during processing are captured and returned as
+    well, so that the main process can store them next to the results.
+    """
+    log_stream = io.StringIO()
+    log_handler = logging.StreamHandler(log_stream)
+    log_handler.setFormatter(logging.Formatter("{asctime} {levelname}: {message}", style="{"))
+    root_logger = logging.getLogger()
+    root_logger.addHandler(log_handler)
+
+    start_time = time.time()
+    outcome = {'pid': os.getpid()}
+    try:
+        logging.info("Processing submission %r...", os.path.basename(archive_file))
+        with zipfile.ZipFile(archive_file, mode="r") as archive:
+            submission.check_archive_members(archive, **archive_limits)
+            with submission.open_archive_member(archive, submission.DETECTION_RESULTS_MEMBER) as fp:
+                results = evaluation.evaluate_detection_results(None, None, fp, dataset=_worker_dataset)
+        logging.info("Results: F_all F_small F_medium F_large")
+        logging.info("Setup_2: %.03f %.03f %.03f %.03f", *results)
+        outcome['status'] = 'ok'
+        outcome['results'] = [float(value) for value in results]
+    except Exception as e:
+        logging.exception("Failed to process submission!")
+        outcome['status'] = 'error'
+        outcome['error'] = f"{type(e).__name__}: {e}"
+        outcome['retryable'] = not isinstance(e, _PERMANENT_ERRORS)
+    finally:
+        root_logger.removeHandler(log_handler)
+
+    outcome['elapsed'] = time.time() - start_time
+    outcome['log'] = log_stream.getvalue()
+    return outcome
+
+
+def _claim_next_archive(inbox_path, claimed_path):
+    """
+    Claim the next (oldest) submission archive from the inbox by atomically moving it into the claimed directory.
+
+    The rename either succeeds for exactly one of the competing workers, or fails because another worker got there
+    first, in which case the next candidate is tried. Files whose names start with a dot are skipped, so uploaders
+    can write to a temporary dot-file and rename it once complete.
+    """
+    candidates = []
+    for entry in os.scandir(inbox_path):
+        if entry.name.startswith(".") or not entry.name.endswith(".zip") or not entry.is_file():
+            continue
+        try:
+            candidates.append((entry.stat().st_mtime, entry.name))
+        except FileNotFoundError:
+            continue  # Claimed by someone else in the meantime
+
+    for _, name in sorted(candidates):
+        claimed_file = os.path.join(claimed_path, name)
+        try:
+            os.rename(os.path.join(inbox_path, name), claimed_file)
+        except FileNotFoundError:
+            continue  # Claimed by someone else in the meantime
+        return claimed_file
+
+    return None
+
+
+def _process_is_running(pid):
+    # Whether the local process with given PID is (possibly) running; without a reliable check (on non-POSIX
+    # systems, where os.kill() would terminate the process), the process is assumed to be running
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, but belongs to another user
+    return True
+
+
+def requeue_stale_claims(inbox_path):
+    """
+    Move the archives claimed by crashed (no longer running) workers on this host back into the inbox.
+
+    Claim directories are named <host>-<pid>; a directory is stale if it belongs to this host and its process is no
+    longer running, or if it has the PID of the calling process (a previous worker that had the same PID, e.g., in a
+    container). Claims of workers on other hosts cannot be checked, and are left alone; run a worker on that host (or
+    move the archives back into the inbox manually) to recover them.
+
+    Parameters
+    ----------
+    inbox_path : str
+        Inbox directory.
+
+    Returns
+    -------
+    requeued : list
+        Names of the archives that were moved back into the inbox.
+    """
+    claimed_root = os.path.join(inbox_path, CLAIMED_DIR_NAME)
+    if not os.path.isdir(claimed_root):
+        return []
+
+    prefix = socket.gethostname() + "-"
+    requeued = []
+    for entry in os.scandir(claimed_root):
+        if not entry.is_dir() or not entry.name.startswith(prefix):
+            continue
+        try:
+            pid = int(entry.name[len(prefix):])
+        except ValueError:
+            continue
+        if pid != os.getpid() and _process_is_running(pid):
+            continue
+
+        for name in os.listdir(entry.path):
+            target_file = os.path.join(inbox_path, name)
+            if os.path.exists(target_file):
+                logging.warning("Cannot requeue stale claim %r: %r already exists!", name, target_file)
+                continue
+            os.rename(os.path.join(entry.path, name), target_file)
+            requeued.append(name)
+        try:
+            os.rmdir(entry.path)
+        except OSError:
+            pass  # Not empty (see warnings above)
+
+    return requeued
+
+
+def _write_file_atomically(filename, contents):
+    tmp_filename = os.path.join(os.path.dirname(filename), "." + os.path.basename(filename) + ".tmp")
+    with open(tmp_filename, "w") as fp:
+        fp.write(contents)
+    os.replace(tmp_filename, filename)
+
+
+def _finalize_job(outbox_path, archive_file, outcome, attempts, errors):
+    """
+    Write the result JSON and the log of the finished (or finally failed) job into the outbox, and move the archive
+    into the outbox's processed/failed directory.
+    """
+    name = os.path.basename(archive_file)
+    stem = os.path.splitext(name)[0]
+
+    result = {
+        'submission': name,
+        'status': outcome['status'],
+        'attempts': attempts,
+        'elapsed': outcome.get('elapsed'),
+    }
+    if outcome['status'] == 'ok':
+        result['results'] = outcome['results']
+    else:
+        result['errors'] = errors
+
+    _write_file_atomically(os.path.join(outbox_path, stem + ".log"), outcome.get('log', ''))
+    _write_file_atomically(os.path.join(outbox_path, stem + ".json"), json.dumps(result, indent=2))
+
+    archive_dir = os.path.join(outbox_path, "processed" if outcome['status'] == 'ok' else "failed")
+    os.makedirs(archive_dir, exist_ok=True)
+    os.replace(archive_file, os.path.join(archive_dir, name))
+
+
+def run_worker(
+    inbox_path,
+    outbox_path,
+    lars_path,
+    eval_set,
+    num_workers=None,
+    timeout=None,
+    max_retries=2,
+    poll_interval=1.0,
+    exit_when_idle=False,
+    archive_limits=None,
+    shared_memory=False,
+):
+    """
+    Watch the inbox directory for submission archives, and evaluate them using a pool of worker processes.
+
+    Each pool process loads the dataset subset once (or attaches to the shared one) and keeps it across jobs; ignore
+    masks are decoded per job, unless they are shared. For each submission, <name>.json (with evaluation results or
+    errors) and <name>.log are written into the outbox, and the archive is moved into outbox's processed or failed
+    sub-directory.
+
+    Archives are claimed by moving them into a per-worker sub-directory of inbox's .claimed directory, so multiple
+    workers (on one or more hosts sharing the inbox) never process the same archive. At startup, archives claimed by
+    crashed workers on this host are moved back into the inbox (see requeue_stale_claims()).
+
+    Parameters
+    ----------
+    inbox_path : str
+        Directory to watch for submission archives (*.zip).
+    outbox_path : str
+        Directory into which results and logs are written.
+    lars_path : str
+        Path to the LaRS dataset.
+    eval_set : str
+        Subset to evaluate, either train, test or val.
+    num_workers : int, optional
+        Number of worker processes. Defaults to the number of CPU cores.
+    timeout : float, optional
+        Per-job timeout, in seconds. Jobs exceeding it are aborted (by restarting the pool) and retried.
+    max_retries : int, optional
+        Maximum number of retries for jobs that time out or fail due to a transient error.
+    poll_interval : float, optional
+        Inbox polling interval, in seconds.
+    exit_when_idle : bool, optional
+        Return once the inbox is empty and all jobs have finished, instead of watching indefinitely.
+    archive_limits : dict, optional
+        Keyword arguments for submission.check_archive_members().
+    shared_memory : bool, optional
+        Load the dataset subset (including all decoded ignore masks) once in the calling process, and share it with
+        the worker processes via shared memory (see shared_dataset module), instead of loading it in each of them.
+        Requires Python 3.8 or newer.
+
+    Returns
+    -------
+    counts : dict
+        Number of processed ('ok') and failed ('failed') submissions.
+    """
+    if shared_memory and sys.version_info < (3, 8):
+        raise RuntimeError("Sharing the dataset subset via shared memory requires Python 3.8 or newer!")
+
+    num_workers = num_workers or os.cpu_count() or 1
+    archive_limits = archive_limits or {}
+
+    claimed_path = os.path.join(inbox_path, CLAIMED_DIR_NAME, f"{socket.gethostname()}-{os.getpid()}")
+    os.makedirs(outbox_path, exist_ok=True)
+
+    # Recover the submissions of crashed workers, before claiming new ones
+    for name in requeue_stale_claims(inbox_path):
+        logging.warning("Requeued submission %r claimed by a crashed worker.", name)
+    os.makedirs(claimed_path, exist_ok=True)
+
+    shared_dataset = None
+    if shared_memory:
+        from .shared_dataset import SharedLarsSubset  # Requires Python 3.8 or newer
+        logging.info("Publishing dataset subset into shared memory...")
+        shared_dataset = SharedLarsSubset.create(lars_path, eval_set)
+
+    def _create_pool():
+        return multiprocessing.Pool(
+            processes=num_workers,
+            initializer=_initialize_pool_worker,
+            initargs=(lars_path, eval_set, shared_dataset.manifest if shared_dataset is not None else None),
+        )
+
+    pool = _create_pool()
+    pending = collections.deque()  # (archive_file, attempt) for jobs awaiting (re)submission
+    running = {}  # archive_file -> (async_result, start_time, attempt)
+    errors = collections.defaultdict(list)  # archive_file -> list of error messages from failed attempts
+    counts = {'ok': 0, 'failed': 0}
+
+    def _handle_failure(archive_file, outcome, attempt):
+        errors[archive_file].append(outcome['error'])
+        if outcome.get('retryable', True) and attempt <= max_retries:
+            logging.warning("Submission %r failed (%s); retrying...", archive_file, outcome['error'])
+            pending.append((archive_file, attempt + 1))
+        else:
+            logging.error("Submission %r failed (%s)!", archive_file, outcome['error'])
+            _finalize_job(outbox_path, archive_file, outcome, attempt, errors.pop(archive_file))
+            counts['failed'] += 1
+
+    logging.info("Watching inbox %r with %d worker process(es)...", inbox_path, num_workers)
+    try:
+        while True:
+            # Collect finished jobs, and check for those that exceeded the timeout
+            timed_out = []
+            for archive_file, (async_result, start_time, attempt) in list(running.items()):
+                if async_result.ready():
+                    del running[archive_file]
+                    try:
+                        outcome = async_result.get()
+                    except Exception as e:
+                        outcome = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+                    if outcome['status'] == 'ok':
+                        logging.info("Submission %r evaluated in %.2f seconds.", archive_file, outcome['elapsed'])
+                        _finalize_job(outbox_path, archive_file, outcome, attempt, errors.pop(archive_file, []))
+                        counts['ok'] += 1
+                    else:
+                        _handle_failure(archive_file, outcome, attempt)
+                elif timeout is not None and time.time() - start_time > timeout:
+                    timed_out.append(archive_file)
+
+            # A running job cannot be cancelled individually, so restart the whole pool. Other jobs that were
+            # running at the time are re-submitted without counting it as an attempt.
+            if timed_out:
+                pool.terminate()
+                pool.join()
+                pool = _create_pool()
+                for archive_file, (_, _, attempt) in running.items():
+                    if archive_file in timed_out:
+                        outcome = {'status': 'error', 'error': f"Timeout after {timeout} seconds", 'retryable': True}
+                        _handle_failure(archive_file, outcome, attempt)
+                    else:
+                        pending.appendleft((archive_file, attempt))
+                running.clear()
+
+            # Fill the free slots
+            while len(running) < num_workers:
+                if pending:
+                    archive_file, attempt = pending.popleft()
+                else:
+                    archive_file = _claim_next_archive(inbox_path, claimed_path)
+                    attempt = 1
+                    if archive_file is None:
+                        break
+                    logging.info("Claimed submission %r.", archive_file)
+                async_result = pool.apply_async(_process_submission, (archive_file, archive_limits))
+                running[archive_file] = (async_result, time.time(), attempt)
+
+            if exit_when_idle and not running and not pending:
+                break
+
+            time.sleep(poll_interval)
+    finally:
+        pool.terminate()
+        pool.join()
+        if shared_dataset is not None:
+            shared_dataset.close()
+
+    return counts
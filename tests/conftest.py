@@ -5,6 +5,14 @@ import zipfile
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmpdir, monkeypatch):
+    # Keep the toolkit's caches (e.g., prepared ground truth) out of the user's cache directory
+    cache_dir = str(tmpdir / "cache")
+    monkeypatch.setenv("MACVI_USV_ODCE_CACHE_DIR", cache_dir)
+    return cache_dir
+
+
 @pytest.fixture
 def dataset_json_file():
     variable_name = "MACVI_USV_ODCE_TEST_DATASET_JSON"
@@ -90,3 +98,134 @@ def sample_code_dir(tmpdir):
     with zipfile.ZipFile(archive_file, "r") as archive:
         archive.extractall(unpacked_code_dir)
     return str(unpacked_code_dir)
+
+
+# Synthetic LaRS-like subset, used by tests that do not require the real dataset
+SYNTHETIC_IMAGE_WIDTH = 320
+SYNTHETIC_IMAGE_HEIGHT = 240
+
+
+def _random_bbox(rng, width, height):
+    w = int(rng.randint(4, 200))
+    h = int(rng.randint(4, 160))
+    x = int(rng.randint(0, width - w))
+    y = int(rng.randint(0, height - h))
+    return [x, y, w, h]
+
+
+def _write_synthetic_lars_subset(lars_path, eval_set, num_sequences=2, frames_per_sequence=4, seed=0):
+    import cv2
+    import numpy as np
+
+    rng = np.random.RandomState(seed)
+
+    subset_path = os.path.join(lars_path, eval_set)
+    os.makedirs(os.path.join(subset_path, "panoptic_masks"))
+    os.makedirs(os.path.join(subset_path, "semantic_masks"))
+
+    images = []
+    annotations = []
+    image_id = 100
+    segment_id = 1
+    for sequence in range(num_sequences):
+        for frame in range(frames_per_sequence):
+            basename = f"seq{sequence:03d}_{frame * 10:05d}"
+
+            # Ignore regions: a horizontal band in the panoptic mask (R channel == 1) and a block in semantic mask
+            panoptic_mask = np.zeros((SYNTHETIC_IMAGE_HEIGHT, SYNTHETIC_IMAGE_WIDTH, 3), dtype=np.uint8)
+            band_top = int(rng.randint(0, SYNTHETIC_IMAGE_HEIGHT // 2))
+            panoptic_mask[band_top:band_top + 30, :, 2] = 1
+            semantic_mask = np.zeros((SYNTHETIC_IMAGE_HEIGHT, SYNTHETIC_IMAGE_WIDTH), dtype=np.uint8)
+            semantic_mask[:40, :80] = 255
+            cv2.imwrite(os.path.join(subset_path, "panoptic_masks", basename + ".png"), panoptic_mask)
+            cv2.imwrite(os.path.join(subset_path, "semantic_masks", basename + ".png"), semantic_mask)
+
+            segments_info = []
+            for _ in range(rng.randint(0, 6)):
+                bbox = _random_bbox(rng, SYNTHETIC_IMAGE_WIDTH, SYNTHETIC_IMAGE_HEIGHT)
+                segments_info.append({
+                    "id": segment_id,
+                    "category_id": int(rng.randint(1, 4)),
+                    "iscrowd": int(rng.rand() < 0.1),
+                    "bbox": bbox,
+                    "area": int(bbox[2] * bbox[3] * rng.uniform(0.5, 1.0)),
+                })
+                segment_id += 1
+
+            images.append({
+                "id": image_id,
+                "width": SYNTHETIC_IMAGE_WIDTH,
+                "height": SYNTHETIC_IMAGE_HEIGHT,
+                "file_name": basename + ".jpg",
+            })
+            annotations.append({
+                "image_id": image_id,
+                "file_name": basename + ".png",
+                "segments_info": segments_info,
+            })
+            image_id += 1
+
+    dataset = {
+        "images": images,
+        "annotations": annotations,
+        "categories": [{"id": category_id, "name": f"class{category_id}"} for category_id in (1, 2, 3)],
+    }
+    with open(os.path.join(subset_path, "panoptic_annotations.json"), "w") as fp:
+        json.dump(dataset, fp)
+
+    return dataset
+
+
+def _synthetic_detection_results(dataset, seed=1):
+    import numpy as np
+
+    rng = np.random.RandomState(seed)
+
+    annotations = []
+    for annotation in dataset["annotations"]:
+        detections = []
+        # Jittered ground-truth boxes (some of them missed)...
+        for segment in annotation["segments_info"]:
+            if rng.rand() < 0.2:
+                continue
+            x, y, w, h = segment["bbox"]
+            detections.append([
+                max(0, x + int(rng.randint(-4, 5))),
+                max(0, y + int(rng.randint(-4, 5))),
+                max(1, w + int(rng.randint(-6, 7))),
+                max(1, h + int(rng.randint(-6, 7))),
+            ])
+        # ... and a few false positives
+        for _ in range(rng.randint(0, 4)):
+            detections.append(_random_bbox(rng, SYNTHETIC_IMAGE_WIDTH, SYNTHETIC_IMAGE_HEIGHT))
+
+        annotations.append({
+            "image_id": annotation["image_id"],
+            "file_name": annotation["file_name"],
+            "detections": [
+                {"id": index + 1, "bbox": bbox, "category_id": int(rng.randint(1, 4))}
+                for index, bbox in enumerate(detections)
+            ],
+        })
+
+    return {
+        "images": dataset["images"],
+        "annotations": annotations,
+    }
+
+
+@pytest.fixture()
+def synthetic_lars_path(tmpdir):
+    lars_path = str(tmpdir / "lars")
+    _write_synthetic_lars_subset(lars_path, "val")
+    return lars_path
+
+
+@pytest.fixture()
+def synthetic_results_file(synthetic_lars_path, tmpdir):
+    with open(os.path.join(synthetic_lars_path, "val", "panoptic_annotations.json"), "r") as fp:
+        dataset = json.load(fp)
+    results_file = str(tmpdir / "results.json")
+    with open(results_file, "w") as fp:
+        json.dump(_synthetic_detection_results(dataset), fp)
+    return results_file
@@ -0,0 +1,103 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from macvi_usv_odce_toolkit import evaluation
+from macvi_usv_odce_toolkit import results_io
+from macvi_usv_odce_toolkit.dataset import LarsSubset
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def test_cmd_convert_results(synthetic_lars_path, synthetic_results_file, tmpdir):
+    npz_file = str(tmpdir / "results.npz")
+    json_file = str(tmpdir / "results-converted.json")
+    toolkit_main(["convert-results", synthetic_results_file, npz_file])
+    toolkit_main(["convert-results", npz_file, json_file])
+
+    # Lossless round trip
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+    with open(json_file, "r") as fp:
+        assert json.load(fp) == results
+
+    # Evaluation of both formats gives identical results
+    output_files = {}
+    for name, results_file in (("json", synthetic_results_file), ("npz", npz_file)):
+        output_files[name] = os.path.join(tmpdir, f"evaluation-results-{name}.json")
+        toolkit_main([
+            "evaluate",
+            synthetic_lars_path,
+            "val",
+            results_file,
+            "--output-file",
+            output_files[name],
+            "--no-cache",
+        ])
+    with open(output_files["json"], "r") as fp:
+        expected_results = json.load(fp)
+    with open(output_files["npz"], "r") as fp:
+        assert json.load(fp) == expected_results
+
+    # Minimal NPZ file (detection columns only, frames without detections omitted) via the Python API
+    columns = results_io.load_columns(npz_file)
+    minimal_file = str(tmpdir / "results-minimal.npz")
+    np.savez(minimal_file, image_id=columns["image_id"], bbox=columns["bbox"].astype(np.float32))
+    detections = results_io.columns_to_detections(results_io.load_columns(minimal_file))
+    dataset = LarsSubset(synthetic_lars_path, "val")
+    assert evaluation.evaluate_detections(dataset, detections) == pytest.approx(expected_results, abs=1e-12)
+
+    # Minimal NPZ file via the CLI: validation and evaluation complete the table of frames from the dataset
+    toolkit_main(["validate", synthetic_lars_path, "val", minimal_file])
+    for extra_args in ([], ["--streaming"]):
+        output_file = str(tmpdir / "evaluation-results-minimal.json")
+        toolkit_main([
+            "evaluate",
+            synthetic_lars_path,
+            "val",
+            minimal_file,
+            "--output-file",
+            output_file,
+            "--no-cache",
+        ] + extra_args)
+        with open(output_file, "r") as fp:
+            assert json.load(fp) == pytest.approx(expected_results, abs=1e-12)
+
+    # Detections of unknown frames are reported by validation
+    unknown_file = str(tmpdir / "results-minimal-unknown.npz")
+    np.savez(
+        unknown_file,
+        image_id=np.append(columns["image_id"], 999999),
+        bbox=np.append(columns["bbox"], [[1, 2, 3, 4]], axis=0),
+    )
+    with pytest.raises(SystemExit):
+        toolkit_main(["validate", synthetic_lars_path, "val", unknown_file])
+
+    # Same format on both sides is an error
+    with pytest.raises(SystemExit):
+        toolkit_main(["convert-results", npz_file, str(tmpdir / "other.npz")])
+
+
+def test_cmd_convert_results_scores_do_not_affect_evaluation(synthetic_lars_path, synthetic_results_file, tmpdir):
+    # Scores that reverse (or shuffle) the file order of each frame's detections
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+    rng = np.random.RandomState(0)
+    for frame in results["annotations"]:
+        for index, detection in enumerate(frame["detections"]):
+            detection["score"] = float(index + rng.uniform(0, 2))
+    json_file = str(tmpdir / "results-scores.json")
+    with open(json_file, "w") as fp:
+        json.dump(results, fp)
+
+    npz_file = str(tmpdir / "results-scores.npz")
+    toolkit_main(["convert-results", json_file, npz_file])
+
+    evaluation_results = []
+    for results_file in (json_file, npz_file):
+        output_file = results_file + ".evaluation.json"
+        toolkit_main(["evaluate", synthetic_lars_path, "val", results_file, "--output-file", output_file, "--no-cache"])
+        with open(output_file, "r") as fp:
+            evaluation_results.append(json.load(fp))
+    assert evaluation_results[0] == evaluation_results[1]
@@ -0,0 +1,38 @@
+import json
+
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def test_cmd_diff(synthetic_lars_path, synthetic_results_file, tmpdir, capsys):
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+
+    # Remove all detections from the first frame that has any
+    modified_frame = next(annotation for annotation in results["annotations"] if annotation["detections"])
+    modified_frame["detections"] = []
+    modified_results_file = str(tmpdir / "modified-results.json")
+    with open(modified_results_file, "w") as fp:
+        json.dump(results, fp)
+
+    output_file = str(tmpdir / "diff.json")
+    toolkit_main([
+        "diff",
+        synthetic_lars_path,
+        "val",
+        synthetic_results_file,
+        modified_results_file,
+        "--output-file",
+        output_file,
+    ])
+    capsys.readouterr()
+
+    with open(output_file, "r") as fp:
+        report = json.load(fp)
+
+    assert report["num_identical_frames"] == report["num_frames"] - 1
+    assert [frame["image_id"] for frame in report["frames"]] == [modified_frame["image_id"]]
+
+    frame = report["frames"][0]
+    assert frame["tp_b"] == 0 and frame["fp_b"] == 0
+    assert frame["delta_tp"] == -frame["tp_a"]
+    assert frame["regression"] == frame["tp_a"] - frame["fp_a"]
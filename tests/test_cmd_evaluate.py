@@ -1,8 +1,12 @@
 import os
 import json
+import sqlite3
 
 import pytest
 
+import macvi_usv_odce_toolkit.evaluation
+import macvi_usv_odce_toolkit.result_store
+import macvi_usv_odce_toolkit.results_io
 from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
 
 
@@ -57,3 +61,153 @@ def test_cmd_evaluate_with_file(
     assert results["setup1"] == pytest.approx(reference_evaluation_results[0], rel=REL_TOLERANCE)
     assert results["setup2"] == pytest.approx(reference_evaluation_results[1], rel=REL_TOLERANCE)
     assert results["setup3"] == pytest.approx(reference_evaluation_results[2], rel=REL_TOLERANCE)
+
+
+def test_cmd_evaluate_streaming(synthetic_lars_path, synthetic_results_file, tmpdir):
+    # Reference (pycocotools), streaming, and sharded evaluation must produce identical results
+    output_files = {}
+    for mode, extra_args in (
+        ("full", []),
+        ("streaming", ["--streaming", "--progress-interval", "0", "--no-cache"]),
+        ("sharded", ["--coco-workers", "2", "--no-cache"]),
+    ):
+        output_files[mode] = os.path.join(tmpdir, f"evaluation-results-{mode}.json")
+        toolkit_main([
+            "evaluate",
+            synthetic_lars_path,
+            "val",
+            synthetic_results_file,
+            "--output-file",
+            output_files[mode],
+        ] + extra_args)
+
+    with open(output_files["full"], "r") as fp:
+        expected_results = json.load(fp)
+    for mode in ("streaming", "sharded"):
+        with open(output_files[mode], "r") as fp:
+            results = json.load(fp)
+        assert results == expected_results
+
+
+def test_cmd_evaluate_result_store(synthetic_lars_path, synthetic_results_file, monkeypatch, capsys):
+    args = ["evaluate", synthetic_lars_path, "val", synthetic_results_file]
+
+    toolkit_main(args)
+    expected_lines = capsys.readouterr()[0].splitlines()
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("Results should have been taken from the store!")
+
+    # Repeated evaluation returns the stored results...
+    with monkeypatch.context() as patch:
+        patch.setattr(macvi_usv_odce_toolkit.evaluation, "evaluate_detection_results", _fail)
+        toolkit_main(args)
+        assert capsys.readouterr()[0].splitlines() == expected_lines
+
+        # ... unless disabled
+        with pytest.raises(AssertionError, match="should have been taken from the store"):
+            toolkit_main(args + ["--no-cache"])
+
+
+def test_cmd_evaluate_result_store_errors(synthetic_lars_path, synthetic_results_file, monkeypatch, capsys, caplog):
+    args = ["evaluate", synthetic_lars_path, "val", synthetic_results_file]
+
+    toolkit_main(args + ["--no-cache"])
+    expected_lines = capsys.readouterr()[0].splitlines()
+
+    def _fail(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    # Store errors fall back to the evaluation
+    monkeypatch.setattr(macvi_usv_odce_toolkit.result_store.ResultStore, "get", _fail)
+    monkeypatch.setattr(macvi_usv_odce_toolkit.result_store.ResultStore, "put", _fail)
+    toolkit_main(args)
+    assert capsys.readouterr()[0].splitlines() == expected_lines
+    assert "Failed to look up stored evaluation results: database is locked" in caplog.text
+    assert "Failed to store evaluation results: database is locked" in caplog.text
+
+
+def test_cmd_evaluate_result_store_max_entries(synthetic_lars_path, synthetic_results_file, tmpdir):
+    # A copy with different contents (formatting) has a different hash, and thus a separate store entry
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+    other_results_file = str(tmpdir / "other-results.json")
+    with open(other_results_file, "w") as fp:
+        json.dump(results, fp, indent=2)
+
+    for results_file in (synthetic_results_file, other_results_file):
+        toolkit_main(["evaluate", synthetic_lars_path, "val", results_file, "--cache-max-entries", "1"])
+
+    with macvi_usv_odce_toolkit.result_store.ResultStore() as store:
+        assert len(store) == 1
+
+    with pytest.raises(SystemExit):
+        toolkit_main(["evaluate", synthetic_lars_path, "val", synthetic_results_file, "--cache-max-entries", "0"])
+
+
+def test_cmd_evaluate_sample(synthetic_lars_path, synthetic_results_file, tmpdir):
+    # Sampling all frames reproduces the full evaluation
+    output_files = {}
+    for mode, extra_args in (("full", []), ("all", ["--sample", "1.0"]), ("half", ["--sample", "4"])):
+        output_files[mode] = os.path.join(tmpdir, f"evaluation-results-{mode}.json")
+        toolkit_main([
+            "evaluate",
+            synthetic_lars_path,
+            "val",
+            synthetic_results_file,
+            "--output-file",
+            output_files[mode],
+        ] + extra_args)
+
+    results = {}
+    for mode, output_file in output_files.items():
+        with open(output_file, "r") as fp:
+            results[mode] = json.load(fp)
+
+    assert results["all"]["num_sampled_frames"] == results["all"]["num_frames"] == 8
+    assert results["all"]["f_scores"] == pytest.approx(results["full"], abs=1e-12)
+
+    report = results["half"]
+    assert report["num_sampled_frames"] == 4
+    for f, lower, upper in zip(report["f_scores"], report["lower"], report["upper"]):
+        assert 0 <= lower <= upper <= 1
+
+
+def test_cmd_evaluate_per_class(synthetic_lars_path, synthetic_results_file, tmpdir):
+    output_files = {}
+    for mode, extra_args in (("full", []), ("per-class", ["--per-class"])):
+        output_files[mode] = os.path.join(tmpdir, f"evaluation-results-{mode}.json")
+        toolkit_main([
+            "evaluate",
+            synthetic_lars_path,
+            "val",
+            synthetic_results_file,
+            "--output-file",
+            output_files[mode],
+        ] + extra_args)
+
+    with open(output_files["full"], "r") as fp:
+        expected_results = json.load(fp)
+    with open(output_files["per-class"], "r") as fp:
+        report = json.load(fp)
+
+    # Class-agnostic results are the official ones
+    assert report["f_scores"] == expected_results
+    assert [entry["category_id"] for entry in report["classes"]] == [1, 2, 3]
+    assert sum(entry["num_detections"] for entry in report["classes"]) > 0
+
+
+@pytest.mark.parametrize("extra_args", ([], ["--streaming"], ["--per-class"], ["--sample", "4"]))
+def test_cmd_evaluate_loads_results_once(synthetic_lars_path, synthetic_results_file, extra_args, monkeypatch):
+    # The results parsed by the validation are reused by the evaluation
+    load_results = macvi_usv_odce_toolkit.results_io.load_results
+    calls = []
+
+    def _load_results(*args, **kwargs):
+        calls.append(args)
+        return load_results(*args, **kwargs)
+
+    monkeypatch.setattr(macvi_usv_odce_toolkit.results_io, "load_results", _load_results)
+    toolkit_main(["evaluate", synthetic_lars_path, "val", synthetic_results_file, "--no-cache"] + extra_args)
+
+    assert len(calls) == 1
@@ -0,0 +1,81 @@
+import os
+import csv
+import json
+
+import numpy as np
+
+from macvi_usv_odce_toolkit import evaluation
+from macvi_usv_odce_toolkit import hard_examples
+from macvi_usv_odce_toolkit import matching
+from macvi_usv_odce_toolkit.dataset import LarsSubset
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def test_hard_examples_match_evaluation(synthetic_lars_path, synthetic_results_file):
+    dataset = LarsSubset(synthetic_lars_path, "val", cache_masks=False)
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+
+    frame_results = list(evaluation.iter_frame_results(dataset, results, ignore_regions=True))
+    num_fp = sum(result.counts()[1] for result in frame_results)
+    num_fn = sum(result.counts()[2] for result in frame_results)
+    num_fp_in_ignore_region = sum(
+        np.count_nonzero(result.det_in_ignore_region[result.det_status == matching.DET_FP])
+        for result in frame_results
+    )
+
+    # All FPs and FNs, ranked by frame
+    examples = hard_examples.mine_hard_examples(dataset, results, top_k=None, include_ignore_regions=True)
+    outcomes = [example['outcome'] for example in examples]
+    assert outcomes.count(hard_examples.OUTCOME_FP) == num_fp
+    assert outcomes.count(hard_examples.OUTCOME_FN) == num_fn
+    ranks = [example['rank'] for example in examples]
+    assert ranks == sorted(ranks)
+    counts = [ranks.count(rank) for rank in sorted(set(ranks))]
+    assert counts == sorted(counts, reverse=True)
+
+    # FPs in ignore regions are excluded by default
+    examples = hard_examples.mine_hard_examples(dataset, results, outcomes=("fp",), top_k=None)
+    assert len(examples) == num_fp - num_fp_in_ignore_region
+    assert not any(example['in_ignore_region'] for example in examples)
+
+    # Bounded selection keeps the top of the full ranking
+    all_examples = hard_examples.mine_hard_examples(dataset, results, top_k=None, include_ignore_regions=True)
+    top_examples = hard_examples.mine_hard_examples(dataset, results, top_k=3, include_ignore_regions=True)
+    assert top_examples == [example for example in all_examples if example['rank'] <= 3]
+
+    # Boxes ranked by size
+    examples = hard_examples.mine_hard_examples(dataset, results, rank_by="size", top_k=5)
+    assert [example['rank'] for example in examples] == [1, 2, 3, 4, 5]
+    areas = [example['area'] for example in examples]
+    assert areas == sorted(areas, reverse=True)
+
+
+def test_cmd_hard_examples(synthetic_lars_path, synthetic_results_file, tmpdir):
+    json_file = os.path.join(tmpdir, "hard-examples.json")
+    csv_file = os.path.join(tmpdir, "hard-examples.csv")
+    for output_file in (json_file, csv_file):
+        toolkit_main([
+            "hard-examples",
+            synthetic_lars_path,
+            "val",
+            synthetic_results_file,
+            output_file,
+            "--outcomes",
+            "fp,fn,matched",
+            "--top-k",
+            "0",
+        ])
+
+    with open(json_file, "r") as fp:
+        report = json.load(fp)
+    with open(csv_file, "r", newline="") as fp:
+        rows = list(csv.DictReader(fp))
+
+    assert report['outcomes'] == ["fp", "fn", "matched"]
+    assert len(rows) == len(report['examples']) > 0
+    for row, example in zip(rows, report['examples']):
+        assert int(row['image_id']) == example['image_id']
+        assert row['sequence'] == example['sequence']
+        assert row['outcome'] == example['outcome']
+        assert float(row['area']) == example['area']
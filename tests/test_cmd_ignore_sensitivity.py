@@ -0,0 +1,50 @@
+import os
+import json
+
+import pytest
+
+from macvi_usv_odce_toolkit import evaluation
+from macvi_usv_odce_toolkit import matching
+from macvi_usv_odce_toolkit.dataset import LarsSubset
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def test_cmd_ignore_sensitivity(synthetic_lars_path, synthetic_results_file, tmpdir):
+    output_file = os.path.join(tmpdir, "sensitivity.json")
+    toolkit_main([
+        "ignore-sensitivity",
+        synthetic_lars_path,
+        "val",
+        synthetic_results_file,
+        "--thresholds",
+        "0,0.5,0.75,1",
+        "--output-file",
+        output_file,
+    ])
+    with open(output_file, "r") as fp:
+        report = json.load(fp)
+
+    # Official F-scores do not depend on the threshold
+    expected = evaluation.evaluate_detection_results(synthetic_lars_path, "val", synthetic_results_file)
+    assert report["official"] == pytest.approx(expected, abs=1e-12)
+
+    rows = report["thresholds"]
+    assert [row["threshold"] for row in rows] == [0, 0.5, 0.75, 1]
+
+    # Fewer detections lie in ignore regions as the threshold grows; none exceed full coverage
+    counts = [row["num_in_ignore_region"] for row in rows]
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] > 0 and counts[-1] == 0
+    assert rows[-1]["f_scores"] == report["official"]
+    assert all(row["num_ignored"] <= row["num_in_ignore_region"] for row in rows)
+
+    # Consistent with the informative flag of the frame-level evaluation at the default threshold
+    row = rows[[row["threshold"] for row in rows].index(matching.IGNORE_OVERLAP_THRESHOLD)]
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+    dataset = LarsSubset(synthetic_lars_path, "val")
+    num_flagged = sum(
+        int(result.det_in_ignore_region.sum())
+        for result in evaluation.iter_frame_results(dataset, results, ignore_regions=True)
+    )
+    assert row["num_in_ignore_region"] == num_flagged
@@ -0,0 +1,80 @@
+import os
+import json
+
+import pytest
+
+from macvi_usv_odce_toolkit import partial
+from macvi_usv_odce_toolkit.dataset import LarsSubset
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def _evaluate_shards(lars_path, results_file, tmpdir, num_shards, shard_by):
+    partial_files = []
+    for shard_index in range(num_shards):
+        partial_file = os.path.join(tmpdir, f"partial-{shard_by}-{shard_index}-of-{num_shards}.npz")
+        toolkit_main([
+            "evaluate",
+            lars_path,
+            "val",
+            results_file,
+            "--shard",
+            f"{shard_index}/{num_shards}",
+            "--shard-by",
+            shard_by,
+            "--output-file",
+            partial_file,
+        ])
+        partial_files.append(partial_file)
+    return partial_files
+
+
+@pytest.mark.parametrize("num_shards, shard_by", [(1, "sequence"), (3, "sequence"), (3, "frame"), (5, "frame")])
+def test_cmd_merge(num_shards, shard_by, synthetic_lars_path, synthetic_results_file, tmpdir):
+    expected_file = os.path.join(tmpdir, "evaluation-results.json")
+    toolkit_main(["evaluate", synthetic_lars_path, "val", synthetic_results_file, "--output-file", expected_file])
+
+    partial_files = _evaluate_shards(synthetic_lars_path, synthetic_results_file, tmpdir, num_shards, shard_by)
+
+    # Shards are disjoint, and cover all frames
+    dataset = LarsSubset(synthetic_lars_path, "val")
+    indices = [partial.shard_frames(dataset, i, num_shards, shard_by) for i in range(num_shards)]
+    assert sorted(index for shard in indices for index in shard) == list(range(len(dataset)))
+
+    output_file = os.path.join(tmpdir, "merged-results.json")
+    toolkit_main(["merge"] + partial_files[::-1] + ["--output-file", output_file])  # Order does not matter
+
+    with open(expected_file, "r") as fp:
+        expected_results = json.load(fp)
+    with open(output_file, "r") as fp:
+        results = json.load(fp)
+    assert results == expected_results
+
+
+def test_cmd_merge_checks_shards(synthetic_lars_path, synthetic_results_file, tmpdir):
+    partial_files = _evaluate_shards(synthetic_lars_path, synthetic_results_file, tmpdir, 3, "frame")
+    other_files = _evaluate_shards(synthetic_lars_path, synthetic_results_file, tmpdir, 2, "frame")
+
+    # Incomplete, overlapping, and mismatched shards
+    for files in (partial_files[:2], partial_files + partial_files[:1], partial_files[:2] + other_files[1:]):
+        with pytest.raises(SystemExit):
+            toolkit_main(["merge"] + files)
+
+    partials = [partial.load_partial(filename) for filename in partial_files]
+    with pytest.raises(ValueError, match="missing"):
+        partial.merge_partials(partials[1:])
+    with pytest.raises(ValueError, match="more than once"):
+        partial.merge_partials(partials + partials[1:2])
+    partials[0]['metadata']['results'] = "0" * 64
+    with pytest.raises(ValueError, match="'results' differs"):
+        partial.merge_partials(partials)
+
+    # Partial result files are small
+    assert all(os.path.getsize(filename) < 4096 for filename in partial_files)
+
+
+def test_parse_shard():
+    assert partial.parse_shard("0/1") == (0, 1)
+    assert partial.parse_shard("3/4") == (3, 4)
+    for value in ("4/4", "-1/2", "1", "a/b", "1/2/3"):
+        with pytest.raises(ValueError):
+            partial.parse_shard(value)
@@ -123,3 +123,113 @@ def test_cmd_prepare_and_unpack_submission_with_code_dir(
 
     # Compare expected output
     assert lines == reference_evaluation_stdout_lines
+
+
+def _synthetic_source_code_dir(tmpdir):
+    source_code_dir = str(tmpdir / "source-code")
+    os.makedirs(os.path.join(source_code_dir, "model"))
+    with open(os.path.join(source_code_dir, "train.py"), "w") as fp:
+        fp.write("print('train')\n")
+    with open(os.path.join(source_code_dir, "model", "net.py"), "w") as fp:
+        fp.write("print('net')\n")
+    return source_code_dir
+
+
+@pytest.mark.parametrize("coco_workers", (None, 2))
+def test_cmd_prepare_submission_concurrent(coco_workers, synthetic_lars_path, synthetic_results_file, tmpdir, capsys):
+    # With pycocotools workers, the shard pool is started while the archive is being built in another thread
+    source_code_dir = _synthetic_source_code_dir(tmpdir)
+    submission_archive = str(tmpdir / "submission.zip")
+    toolkit_main([
+        "prepare-submission",
+        synthetic_lars_path,
+        synthetic_results_file,
+        source_code_dir,
+        "--eval-set",
+        "val",
+        "--output-file",
+        submission_archive,
+        "--no-cache",
+    ] + (["--coco-workers", str(coco_workers)] if coco_workers else []))
+    stdout, _ = capsys.readouterr()
+
+    # Results are identical to those of the evaluate command
+    toolkit_main(["evaluate", synthetic_lars_path, "val", synthetic_results_file, "--no-cache"])
+    expected_stdout, _ = capsys.readouterr()
+    assert stdout == expected_stdout
+
+    with zipfile.ZipFile(submission_archive, "r") as archive:
+        assert sorted(archive.namelist()) == [
+            "detection_results.json",
+            "source_code/",
+            "source_code/source-code/",
+            "source_code/source-code/model/",
+            "source_code/source-code/model/net.py",
+            "source_code/source-code/train.py",
+        ]
+    assert os.listdir(tmpdir.strpath).count("submission.zip") == 1  # No leftover temporary files
+    assert not [name for name in os.listdir(tmpdir.strpath) if name.endswith(".tmp")]
+
+
+def test_cmd_prepare_submission_errors(synthetic_lars_path, synthetic_results_file, tmpdir, monkeypatch):
+    from macvi_usv_odce_toolkit import __main__ as toolkit_module
+
+    source_code_dir = _synthetic_source_code_dir(tmpdir)
+    submission_archive = str(tmpdir / "submission.zip")
+    args = [
+        "prepare-submission",
+        synthetic_lars_path,
+        synthetic_results_file,
+        source_code_dir,
+        "--eval-set",
+        "val",
+        "--output-file",
+        submission_archive,
+        "--no-cache",
+    ]
+
+    # Failed evaluation cancels the archive, and propagates the error
+    def _failing_evaluation(*args, **kwargs):
+        raise RuntimeError("evaluation failed")
+
+    with monkeypatch.context() as m:
+        m.setattr(toolkit_module, "_perform_full_evaluation", _failing_evaluation)
+        with pytest.raises(RuntimeError, match="evaluation failed"):
+            toolkit_main(args)
+    assert not [name for name in os.listdir(tmpdir.strpath) if name.startswith("submission.zip")]
+
+    # Failed archive construction is reported after the evaluation
+    def _failing_collection(*args, **kwargs):
+        raise OSError("unreadable file")
+
+    with monkeypatch.context() as m:
+        m.setattr(toolkit_module, "_collect_to_archive", _failing_collection)
+        with pytest.raises(SystemExit):
+            toolkit_main(args)
+    assert not [name for name in os.listdir(tmpdir.strpath) if name.startswith("submission.zip")]
+
+
+def test_cmd_prepare_submission_coco_workers(synthetic_lars_path, synthetic_results_file, tmpdir, capsys, caplog):
+    source_code_dir = _synthetic_source_code_dir(tmpdir)
+    submission_archive = str(tmpdir / "submission.zip")
+    toolkit_main([
+        "prepare-submission",
+        synthetic_lars_path,
+        synthetic_results_file,
+        source_code_dir,
+        "--eval-set",
+        "val",
+        "--output-file",
+        submission_archive,
+        "--no-cache",
+        "--coco-workers",
+        "2",
+    ])
+    stdout, _ = capsys.readouterr()
+    assert " - pycocotools workers: 2" in caplog.messages
+
+    # Sharded evaluation gives the same results as the single-process one
+    toolkit_main(["evaluate", synthetic_lars_path, "val", synthetic_results_file, "--no-cache"])
+    expected_stdout, _ = capsys.readouterr()
+    assert stdout == expected_stdout
+    assert os.path.isfile(submission_archive)
@@ -0,0 +1,61 @@
+import json
+
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+from macvi_usv_odce_toolkit import evaluation
+
+
+def test_cmd_rank(synthetic_lars_path, synthetic_results_file, tmpdir, capsys):
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+
+    # A copy (tie that cannot be broken), and a slightly shifted variant (tie at IoU 0.3, broken at a higher one)
+    copy_results_file = str(tmpdir / "copy-results.json")
+    with open(copy_results_file, "w") as fp:
+        json.dump(results, fp)
+
+    for annotation in results["annotations"]:
+        for detection in annotation["detections"]:
+            detection["bbox"][0] += 1
+    shifted_results_file = str(tmpdir / "shifted-results.json")
+    with open(shifted_results_file, "w") as fp:
+        json.dump(results, fp)
+
+    # Remove all detections; ranked last
+    for annotation in results["annotations"]:
+        annotation["detections"] = []
+    empty_results_file = str(tmpdir / "empty-results.json")
+    with open(empty_results_file, "w") as fp:
+        json.dump(results, fp)
+
+    output_file = str(tmpdir / "ranking.json")
+    toolkit_main([
+        "rank",
+        synthetic_lars_path,
+        "val",
+        empty_results_file,
+        shifted_results_file,
+        synthetic_results_file,
+        copy_results_file,
+        "--output-file",
+        output_file,
+    ])
+    capsys.readouterr()
+
+    with open(output_file, "r") as fp:
+        ranking = json.load(fp)
+
+    expected_f_score = evaluation.evaluate_detection_results(synthetic_lars_path, "val", synthetic_results_file)[0]
+    by_name = {entry["name"]: entry for entry in ranking}
+
+    # Scores at IoU 0.3 match the official evaluation, and all non-empty results are tied at it
+    assert by_name[synthetic_results_file]["f_score"] == expected_f_score
+    assert by_name[shifted_results_file]["f_score"] == expected_f_score
+
+    # Identical results share their rank; the tie with the shifted variant is broken at a higher threshold
+    assert by_name[synthetic_results_file]["rank"] == by_name[copy_results_file]["rank"]
+    assert by_name[synthetic_results_file]["tie_break_threshold"] is None
+    assert by_name[shifted_results_file]["tie_break_threshold"] > 0.3
+    assert sorted(entry["rank"] for entry in ranking[:3]) in ([1, 1, 3], [1, 2, 2])
+    assert ranking[3]["name"] == empty_results_file
+    assert ranking[3]["tie_break_threshold"] is None
+    assert list(ranking[3]["f_scores"]) == ["0.3"]  # Not tied, so never re-evaluated
@@ -0,0 +1,79 @@
+import os
+import json
+
+import cv2
+
+from macvi_usv_odce_toolkit import render
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def test_cmd_render(synthetic_lars_path, synthetic_results_file, tmpdir, monkeypatch):
+    rendered = []
+    render_frame = render.render_frame
+
+    def _render_frame(dataset, index, *args, **kwargs):
+        rendered.append(index)
+        return render_frame(dataset, index, *args, **kwargs)
+
+    monkeypatch.setattr(render, "render_frame", _render_frame)
+
+    output_dirs = [str(tmpdir / f"render-{run}") for run in range(2)]
+    for output_dir in output_dirs:
+        toolkit_main([
+            "render",
+            synthetic_lars_path,
+            "val",
+            synthetic_results_file,
+            output_dir,
+            "--worst",
+            "3",
+            "--thumbnail-width",
+            "160",
+            "--num-threads",
+            "2",
+        ])
+
+    # Second run is served from the thumbnail cache
+    assert len(rendered) == 3
+
+    for output_dir in output_dirs:
+        with open(os.path.join(output_dir, "frames.json"), "r") as fp:
+            frames = json.load(fp)
+        assert len(frames) == 3
+        errors = [frame["fp"] + frame["fn"] for frame in frames]
+        assert errors == sorted(errors, reverse=True)
+        for frame in frames:
+            image = cv2.imread(os.path.join(output_dir, frame["rendered_file"]))
+            assert image.shape == (120, 160, 3)
+
+    # Sequence filter
+    output_dir = str(tmpdir / "render-sequence")
+    toolkit_main(["render", synthetic_lars_path, "val", synthetic_results_file, output_dir, "--sequence", "seq001"])
+    with open(os.path.join(output_dir, "frames.json"), "r") as fp:
+        frames = json.load(fp)
+    assert [frame["file_name"][:6] for frame in frames] == ["seq001"] * 4
+
+
+def test_cmd_render_cache_eviction(synthetic_lars_path, synthetic_results_file, tmpdir):
+    cache_dir = os.path.join(os.environ["MACVI_USV_ODCE_CACHE_DIR"], render.RENDER_CACHE_DIR_NAME)
+    args = ["render", synthetic_lars_path, "val", synthetic_results_file, str(tmpdir / "render"), "--worst", "2"]
+
+    # Thumbnails of different widths are cached separately
+    toolkit_main(args + ["--thumbnail-width", "160"])
+    toolkit_main(args + ["--thumbnail-width", "320"])
+    assert len(os.listdir(cache_dir)) == 2
+
+    # The directory in use is kept, even if it alone exceeds the limit
+    toolkit_main(args + ["--thumbnail-width", "80", "--cache-max-size", "0"])
+    assert len(os.listdir(cache_dir)) == 1
+    images = os.listdir(os.path.join(cache_dir, os.listdir(cache_dir)[0]))
+    assert len(images) == 2
+    assert cv2.imread(os.path.join(cache_dir, os.listdir(cache_dir)[0], images[0])).shape[1] == 80
+
+    # Least recently used directories are evicted first
+    small_dir = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    small_size = sum(os.path.getsize(os.path.join(small_dir, image)) for image in images)
+    toolkit_main(args + ["--thumbnail-width", "160"])
+    toolkit_main(args + ["--thumbnail-width", "80"])  # Re-used from the cache
+    assert render.prune_render_cache(small_size) == 1
+    assert os.listdir(cache_dir) == [os.path.basename(small_dir)]
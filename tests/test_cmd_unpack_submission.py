@@ -0,0 +1,129 @@
+import os
+import json
+import zipfile
+
+import pytest
+
+import macvi_usv_odce_toolkit.evaluation
+from macvi_usv_odce_toolkit import utils
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def _create_submission_archive(filename, results_json_file, evaluation_results):
+    with zipfile.ZipFile(filename, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.write(results_json_file, "detection_results.json")
+        archive.writestr("evaluation_results.json", json.dumps(evaluation_results))
+        archive.writestr("source_code/", "")
+        archive.writestr("source_code/main.py", "print('hello')\n")
+
+
+def test_cmd_unpack_submission_no_extract(synthetic_lars_path, synthetic_results_file, tmpdir, capsys):
+    submission_archive = str(tmpdir / "submission.zip")
+    _create_submission_archive(submission_archive, synthetic_results_file, [0.5, 0.5, 0.5, 0.5])
+
+    # Evaluate from extracted archive (reference)
+    unpacked_submission_dir = str(tmpdir / "unpacked-submission")
+    toolkit_main([
+        "unpack-submission",
+        submission_archive,
+        unpacked_submission_dir,
+        "--lars-path",
+        synthetic_lars_path,
+        "--eval-set",
+        "val",
+    ])
+    reference_lines = capsys.readouterr()[0].splitlines()
+
+    # Evaluate directly from the archive; nothing should be extracted
+    streamed_submission_dir = str(tmpdir / "streamed-submission")
+    toolkit_main([
+        "unpack-submission",
+        submission_archive,
+        streamed_submission_dir,
+        "--no-extract",
+        "--lars-path",
+        synthetic_lars_path,
+        "--eval-set",
+        "val",
+    ])
+    lines = capsys.readouterr()[0].splitlines()
+
+    assert lines == reference_lines
+    assert not os.path.exists(streamed_submission_dir)
+
+
+def test_cmd_unpack_submission_source_code_only(synthetic_results_file, tmpdir, capsys):
+    submission_archive = str(tmpdir / "submission.zip")
+    _create_submission_archive(submission_archive, synthetic_results_file, [0.25, 0.5, 0.5, 0.5])
+
+    target_dir = str(tmpdir / "source")
+    toolkit_main(["unpack-submission", submission_archive, target_dir, "--no-extract", "--extract-source-code"])
+    lines = capsys.readouterr()[0].splitlines()
+
+    assert lines == ["Challenge results F1:", json.dumps({"F1": 25.0})]
+    assert os.path.isfile(os.path.join(target_dir, "source_code", "main.py"))
+    assert not os.path.exists(os.path.join(target_dir, "detection_results.json"))
+
+
+def test_cmd_unpack_submission_rejects_compression_bomb(tmpdir):
+    submission_archive = str(tmpdir / "submission.zip")
+    with zipfile.ZipFile(submission_archive, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("detection_results.json", b" " * (16 * 1024 * 1024))
+
+    with pytest.raises(SystemExit):
+        toolkit_main(["unpack-submission", submission_archive, "--no-extract", "--max-compression-ratio", "100"])
+
+
+@pytest.mark.parametrize("no_extract", (False, True))
+def test_cmd_unpack_submission_missing_results(no_extract, synthetic_lars_path, tmpdir, caplog):
+    submission_archive = str(tmpdir / "submission.zip")
+    with zipfile.ZipFile(submission_archive, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("evaluation_results.json", json.dumps([0.5, 0.5, 0.5, 0.5]))
+        archive.writestr("source_code/", "")
+
+    target_dir = str(tmpdir / "unpacked-submission")
+    with pytest.raises(SystemExit):
+        toolkit_main([
+            "unpack-submission",
+            submission_archive,
+            target_dir,
+            "--lars-path",
+            synthetic_lars_path,
+            "--eval-set",
+            "val",
+        ] + (["--no-extract"] if no_extract else []))
+
+    assert any("does not contain 'detection_results.json'" in message for message in caplog.messages)
+    assert not os.path.exists(target_dir)  # Rejected before extraction
+
+
+def test_cmd_unpack_submission_hashes_archive_member(synthetic_lars_path, synthetic_results_file, tmpdir, monkeypatch,
+                                                     capsys):
+    submission_archive = str(tmpdir / "submission.zip")
+    _create_submission_archive(submission_archive, synthetic_results_file, [0.5, 0.5, 0.5, 0.5])
+    args = ["unpack-submission", submission_archive, "--no-extract", "--lars-path", synthetic_lars_path, "--eval-set",
+            "val"]
+
+    # The archive member is hashed directly (in a streaming pass), without reading it into memory first
+    file_sha256 = utils.file_sha256
+    hashed_files = []
+
+    def _file_sha256(file, *args, **kwargs):
+        hashed_files.append(file)
+        return file_sha256(file, *args, **kwargs)
+
+    monkeypatch.setattr(utils, "file_sha256", _file_sha256)
+    toolkit_main(args)
+    lines = capsys.readouterr()[0].splitlines()
+
+    assert isinstance(hashed_files[0], zipfile.ZipExtFile)
+
+    # The results stored under the hash of the member's contents are found for the same (extracted) file
+    def _fail(*args, **kwargs):
+        raise AssertionError("Results should have been taken from the store!")
+
+    monkeypatch.setattr(macvi_usv_odce_toolkit.evaluation, "evaluate_detection_results", _fail)
+    target_dir = str(tmpdir / "unpacked-submission")
+    toolkit_main(["unpack-submission", submission_archive, target_dir, "--lars-path", synthetic_lars_path, "--eval-set",
+                  "val"])
+    assert capsys.readouterr()[0].splitlines() == lines
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+def _validate(lars_path, results_file, output_file):
+    exit_code = 0
+    try:
+        toolkit_main(["validate", lars_path, "val", results_file, "--output-file", output_file])
+    except SystemExit as e:
+        exit_code = e.code
+    with open(output_file, "r") as fp:
+        return exit_code, json.load(fp)
+
+
+def test_cmd_validate(synthetic_lars_path, synthetic_results_file, tmpdir, capsys):
+    output_file = str(tmpdir / "report.json")
+
+    # Valid results
+    exit_code, report = _validate(synthetic_lars_path, synthetic_results_file, output_file)
+    assert exit_code == 0
+    assert report["valid"]
+    assert not report["errors"]
+
+    # Introduce various errors
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+    frames = [annotation for annotation in results["annotations"] if annotation["detections"]]
+    frames[0]["detections"][0]["bbox"] = [10, 10, 0.4, 20]  # Zero width after rounding
+    frames[0]["detections"].append({"id": 1000, "bbox": [10, 10, "20", 20]})  # Malformed
+    frames[1]["detections"].append({"id": 1001, "bbox": [300, 200, 50, 50]})  # Extends outside the 320x240 image
+    missing = results["annotations"].pop()
+    invalid_results_file = str(tmpdir / "invalid-results.json")
+    with open(invalid_results_file, "w") as fp:
+        json.dump(results, fp)
+
+    exit_code, report = _validate(synthetic_lars_path, invalid_results_file, output_file)
+    assert exit_code != 0
+    assert not report["valid"]
+
+    errors = {issue["code"]: issue for issue in report["errors"]}
+    assert set(errors) == {"empty-bbox", "invalid-bbox", "missing-frame"}
+    assert errors["missing-frame"]["examples"] == [{"image_id": missing["image_id"], "file_name": missing["file_name"]}]
+    assert errors["empty-bbox"]["examples"][0]["image_id"] == frames[0]["image_id"]
+    assert errors["invalid-bbox"]["examples"] == [
+        {"image_id": frames[0]["image_id"], "detection_index": len(frames[0]["detections"]) - 1},
+    ]
+    warnings = {issue["code"]: issue for issue in report["warnings"]}
+    assert warnings["bbox-outside-image"]["count"] >= 1
+
+    # Evaluation fails fast
+    capsys.readouterr()
+    with pytest.raises(SystemExit):
+        toolkit_main(["evaluate", synthetic_lars_path, "val", invalid_results_file])
+    assert capsys.readouterr()[0] == ""
+
+
+def test_cmd_validate_wrong_subset(synthetic_lars_path, synthetic_results_file, tmpdir):
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+    for annotation in results["annotations"]:
+        annotation["image_id"] += 10000
+    results_file = str(tmpdir / "results.json")
+    with open(results_file, "w") as fp:
+        json.dump(results, fp)
+
+    exit_code, report = _validate(synthetic_lars_path, results_file, str(tmpdir / "report.json"))
+    assert exit_code != 0
+    assert [issue["code"] for issue in report["errors"]] == ["wrong-subset"]
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import socket
+import subprocess
+import zipfile
+
+import pytest
+
+import macvi_usv_odce_toolkit.evaluation
+from macvi_usv_odce_toolkit import worker
+from macvi_usv_odce_toolkit.__main__ import main as toolkit_main
+
+
+@pytest.mark.parametrize("shared_memory", (
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(sys.version_info < (3, 8), reason="Requires Python 3.8 or newer.")),
+))
+def test_cmd_worker(shared_memory, synthetic_lars_path, synthetic_results_file, tmpdir):
+    inbox_path = str(tmpdir / "inbox")
+    outbox_path = str(tmpdir / "outbox")
+    os.makedirs(inbox_path)
+
+    # Two valid submissions, and one without results file
+    for name in ("team-a.zip", "team-b.zip"):
+        with zipfile.ZipFile(os.path.join(inbox_path, name), mode="w") as archive:
+            archive.write(synthetic_results_file, "detection_results.json")
+    with zipfile.ZipFile(os.path.join(inbox_path, "broken.zip"), mode="w") as archive:
+        archive.writestr("source_code/", "")
+
+    toolkit_main([
+        "worker",
+        inbox_path,
+        outbox_path,
+        synthetic_lars_path,
+        "val",
+        "--num-workers",
+        "2",
+        "--poll-interval",
+        "0.05",
+        "--exit-when-idle",
+    ] + (["--shared-memory"] if shared_memory else []))
+
+    expected_results = macvi_usv_odce_toolkit.evaluation.evaluate_detection_results(
+        synthetic_lars_path,
+        "val",
+        synthetic_results_file,
+    )
+
+    for name in ("team-a", "team-b"):
+        with open(os.path.join(outbox_path, name + ".json"), "r") as fp:
+            result = json.load(fp)
+        assert result["status"] == "ok"
+        assert result["attempts"] == 1
+        assert result["results"] == pytest.approx(expected_results)
+        assert os.path.isfile(os.path.join(outbox_path, name + ".log"))
+        assert os.path.isfile(os.path.join(outbox_path, "processed", name + ".zip"))
+
+    # Broken submission fails permanently, without retries
+    with open(os.path.join(outbox_path, "broken.json"), "r") as fp:
+        result = json.load(fp)
+    assert result["status"] == "error"
+    assert result["attempts"] == 1
+    assert os.path.isfile(os.path.join(outbox_path, "failed", "broken.zip"))
+
+    # Inbox is drained
+    assert not [name for name in os.listdir(inbox_path) if name.endswith(".zip")]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Liveness of claiming workers is checked only on POSIX systems.")
+def test_worker_requeues_stale_claims(synthetic_lars_path, synthetic_results_file, tmpdir):
+    inbox_path = str(tmpdir / "inbox")
+    outbox_path = str(tmpdir / "outbox")
+
+    # Claims of a crashed worker on this host, of a running worker on this host, and of a worker on another host
+    crashed = subprocess.Popen([sys.executable, "-c", "pass"])
+    crashed.wait()
+    claims = {
+        f"{socket.gethostname()}-{crashed.pid}": "crashed.zip",
+        f"{socket.gethostname()}-{os.getppid()}": "running.zip",
+        "other-host.invalid-1": "remote.zip",
+    }
+    for claim_dir, name in claims.items():
+        os.makedirs(os.path.join(inbox_path, worker.CLAIMED_DIR_NAME, claim_dir))
+        with zipfile.ZipFile(os.path.join(inbox_path, worker.CLAIMED_DIR_NAME, claim_dir, name), mode="w") as archive:
+            archive.write(synthetic_results_file, "detection_results.json")
+
+    counts = worker.run_worker(
+        inbox_path,
+        outbox_path,
+        synthetic_lars_path,
+        "val",
+        num_workers=1,
+        poll_interval=0.05,
+        exit_when_idle=True,
+    )
+
+    # Only the crashed worker's claim is requeued and processed
+    assert counts == {'ok': 1, 'failed': 0}
+    assert os.path.isfile(os.path.join(outbox_path, "processed", "crashed.zip"))
+    claimed_root = os.path.join(inbox_path, worker.CLAIMED_DIR_NAME)
+    assert not os.path.exists(os.path.join(claimed_root, f"{socket.gethostname()}-{crashed.pid}"))
+    for claim_dir, name in list(claims.items())[1:]:
+        assert os.path.isfile(os.path.join(claimed_root, claim_dir, name))
+
+
+def test_pool_worker_does_not_cache_masks(synthetic_lars_path):
+    # Each pool process would otherwise keep all decoded ignore masks
+    worker._initialize_pool_worker(synthetic_lars_path, "val")
+    try:
+        assert not worker._worker_dataset.cache_masks
+    finally:
+        worker._worker_dataset = None
@@ -0,0 +1,91 @@
+import copy
+import json
+import contextlib
+
+import numpy as np
+import pytest
+
+import pycocotools.coco
+import pycocotools.cocoeval
+
+from macvi_usv_odce_toolkit import coco_adapter
+from macvi_usv_odce_toolkit import evaluation
+
+from conftest import _synthetic_detection_results, _write_synthetic_lars_subset
+
+
+def _stock_stats(dataset_dict, results_list):
+    with contextlib.redirect_stdout(None):
+        coco_dataset = pycocotools.coco.COCO()
+        coco_dataset.dataset = dataset_dict
+        coco_dataset.createIndex()
+        coco_results = coco_dataset.loadRes(results_list)
+        coco_evaluation = pycocotools.cocoeval.COCOeval(coco_dataset, coco_results, iouType='bbox')
+        coco_evaluation.params.iouThrs = np.array([0.3, 0.3])
+        coco_evaluation.evaluate()
+        coco_evaluation.accumulate()
+        coco_evaluation.summarize()
+    return coco_evaluation.stats
+
+
+def _lean_evaluation(dataset_dict, results_list, **evaluate_kwargs):
+    with contextlib.redirect_stdout(None):
+        coco_dataset = coco_adapter.LeanCOCO(dataset_dict)
+        coco_results = coco_dataset.loadRes(results_list)
+        coco_evaluation = coco_adapter.LeanCOCOeval(coco_dataset, coco_results, iouType='bbox')
+        coco_evaluation.params.iouThrs = np.array([0.3, 0.3])
+        coco_evaluation.evaluate(**evaluate_kwargs)
+        coco_evaluation.accumulate()
+        coco_evaluation.summarize()
+    return coco_evaluation
+
+
+def _lean_stats(dataset_dict, results_list):
+    return _lean_evaluation(dataset_dict, results_list).stats
+
+
+def _synthetic_coco_structures(tmpdir, seed):
+    lars_path = str(tmpdir / "lars")
+    dataset = _write_synthetic_lars_subset(lars_path, "val", num_sequences=3, frames_per_sequence=5, seed=seed)
+    results = _synthetic_detection_results(dataset, seed=seed + 100)
+    results_file = str(tmpdir / "results.json")
+    with open(results_file, "w") as fp:
+        json.dump(results, fp)
+    return evaluation.convert_to_coco_structures(lars_path, "val", results_file)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_lean_adapter_matches_stock_pycocotools(seed, tmpdir, capsys):
+    dataset_dict, results_list = _synthetic_coco_structures(tmpdir, seed)
+
+    expected = _stock_stats(copy.deepcopy(dataset_dict), copy.deepcopy(results_list))
+    stats = _lean_stats(dataset_dict, results_list)
+
+    indices = list(coco_adapter.STATS_PRECISION_INDICES + coco_adapter.STATS_RECALL_INDICES)
+    assert np.array_equal(stats[indices], expected[indices])
+    assert capsys.readouterr()[0] == ""  # Nothing leaks to stdout
+
+
+@pytest.mark.parametrize("num_workers, num_shards", [(2, None), (3, 4), (2, 100)])
+def test_sharded_evaluation_matches_single_process(num_workers, num_shards, tmpdir, capsys):
+    dataset_dict, results_list = _synthetic_coco_structures(tmpdir, seed=7)
+
+    expected = _lean_evaluation(copy.deepcopy(dataset_dict), copy.deepcopy(results_list))
+    sharded = _lean_evaluation(dataset_dict, results_list, num_workers=num_workers, num_shards=num_shards)
+
+    # Bit-identical statistics and accumulated arrays
+    assert np.array_equal(sharded.stats, expected.stats, equal_nan=True)
+    for name in ('precision', 'recall', 'scores'):
+        assert np.array_equal(sharded.eval[name], expected.eval[name])
+
+    # Per-image results in the original order
+    assert len(sharded.evalImgs) == len(expected.evalImgs)
+    for eval_img, expected_eval_img in zip(sharded.evalImgs, expected.evalImgs):
+        assert (eval_img is None) == (expected_eval_img is None)
+        if eval_img is not None:
+            assert eval_img['image_id'] == expected_eval_img['image_id']
+            assert eval_img['aRng'] == expected_eval_img['aRng']
+            assert eval_img['dtIds'] == expected_eval_img['dtIds']
+            assert np.array_equal(eval_img['dtMatches'], expected_eval_img['dtMatches'])
+    assert list(sharded.ious) == list(expected.ious)
+    assert capsys.readouterr()[0] == ""  # Nothing leaks to stdout
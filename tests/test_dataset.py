@@ -0,0 +1,76 @@
+import os
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+import macvi_usv_odce_toolkit.dataset
+from macvi_usv_odce_toolkit.dataset import LarsSubset, subset_fingerprint
+from macvi_usv_odce_toolkit import evaluation
+
+
+def _assert_same_ground_truth(subset_a, subset_b):
+    assert subset_a.annotations == subset_b.annotations
+    for name in ("image_sizes", "gt_boxes", "gt_areas", "gt_iscrowd", "gt_categories", "gt_offsets"):
+        assert np.array_equal(getattr(subset_a, name), getattr(subset_b, name))
+        assert getattr(subset_a, name).dtype == getattr(subset_b, name).dtype
+
+
+def test_ground_truth_cache(synthetic_lars_path, isolated_cache_dir, monkeypatch):
+    reference = LarsSubset(synthetic_lars_path, "val", gt_cache=False)
+    assert not os.path.exists(isolated_cache_dir)
+
+    # First load prepares the ground truth and stores it in the cache
+    subset = LarsSubset(synthetic_lars_path, "val")
+    cache_files = os.listdir(isolated_cache_dir)
+    assert len(cache_files) == 1
+    _assert_same_ground_truth(subset, reference)
+
+    # Second load uses the cache, without parsing the annotations
+    def _fail(*args, **kwargs):
+        raise AssertionError("Annotations file should not be parsed!")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(macvi_usv_odce_toolkit.dataset.json, "load", _fail)
+        cached = LarsSubset(synthetic_lars_path, "val")
+    _assert_same_ground_truth(cached, reference)
+
+    # Cache is invalidated by changes to the annotations file...
+    with open(subset.annotations_file, "r") as fp:
+        annotations = json.load(fp)
+    annotations["annotations"][0]["segments_info"] = []
+    with open(subset.annotations_file, "w") as fp:
+        json.dump(annotations, fp)
+
+    modified = LarsSubset(synthetic_lars_path, "val")
+    assert modified.gt_offsets[1] == 0
+    assert len(os.listdir(isolated_cache_dir)) == 2
+
+    # ... and by toolkit version
+    monkeypatch.setattr(macvi_usv_odce_toolkit.dataset, "__version__", "0.0-test")
+    with monkeypatch.context() as patch:
+        patch.setattr(macvi_usv_odce_toolkit.dataset.json, "load", _fail)
+        with pytest.raises(AssertionError, match="should not be parsed"):
+            LarsSubset(synthetic_lars_path, "val")
+
+
+def test_zipped_dataset(synthetic_lars_path, synthetic_results_file, tmpdir):
+    # Archive with the dataset under a top-level directory, as in the distribution archive
+    archive_file = str(tmpdir / "lars.zip")
+    with zipfile.ZipFile(archive_file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for root, _, files in os.walk(synthetic_lars_path):
+            for name in files:
+                path = os.path.join(root, name)
+                archive.write(path, os.path.join("lars_v1.0.0", os.path.relpath(path, synthetic_lars_path)))
+
+    subset = LarsSubset(synthetic_lars_path, "val", gt_cache=False)
+    zipped_subset = LarsSubset(archive_file, "val", gt_cache=False)
+
+    _assert_same_ground_truth(zipped_subset, subset)
+    for index in range(len(subset)):
+        assert np.array_equal(zipped_subset.ignore_mask(index), subset.ignore_mask(index))
+    assert subset_fingerprint(archive_file, "val") == subset_fingerprint(synthetic_lars_path, "val")
+
+    assert evaluation.evaluate_detection_results(archive_file, "val", synthetic_results_file) == \
+        evaluation.evaluate_detection_results(synthetic_lars_path, "val", synthetic_results_file)
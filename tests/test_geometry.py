@@ -0,0 +1,50 @@
+import numpy as np
+import cv2
+
+from macvi_usv_odce_toolkit import geometry
+from macvi_usv_odce_toolkit.dataset import load_camera_calibration
+from macvi_usv_odce_toolkit.danger_zone_mask import construct_mask_from_danger_zone
+
+
+def _write_calibration(filename, focal_length=600.0):
+    storage = cv2.FileStorage(filename, cv2.FILE_STORAGE_WRITE)
+    camera_matrix = np.array([[focal_length, 0, 640], [0, focal_length, 360], [0, 0, 1]], dtype=np.float64)
+    storage.write('M1', camera_matrix)
+    storage.write('M2', camera_matrix)
+    storage.write('D1', np.zeros((1, 5)))
+    storage.write('D2', np.zeros((1, 5)))
+    storage.write('R', np.identity(3))
+    storage.write('T', np.array([[-0.5], [0], [0]]))
+    storage.startWriteStruct('imageSize', cv2.FileNode_SEQ)
+    storage.write('', 1280)
+    storage.write('', 720)
+    storage.endWriteStruct()
+    storage.release()
+
+
+def test_calibration_registry(tmpdir):
+    filename = str(tmpdir / "calibration.yaml")
+    _write_calibration(filename)
+
+    registry = geometry.CalibrationRegistry({'seq01': filename, 'seq02': filename})
+
+    # Masks match those constructed from the calibration directly
+    calibration = load_camera_calibration(filename)
+    for roll, pitch in ((0.0, 0.0), (2.5, -1.5), (-4.0, 3.0)):
+        expected = construct_mask_from_danger_zone(
+            roll, pitch, 0.7, 15, calibration['M1'], calibration['D1'], *calibration['imageSize'])
+        for sequence in ('seq01', 'seq02'):
+            assert np.array_equal(registry.danger_zone_mask(sequence, roll, pitch, 0.7, 15), expected)
+
+    # Calibration file is parsed once, and shared by the sequences
+    assert registry.num_loads == 1
+    assert registry.sequence_geometry('seq01') is registry.sequence_geometry('seq02')
+    assert not registry.sequence_geometry('seq01').camera_matrix.flags.writeable
+    assert registry.arc(80) is registry.arc(80)
+
+    # Modified calibration file is picked up only after invalidation
+    _write_calibration(filename, focal_length=900.0)
+    assert registry.sequence_geometry('seq01').camera_matrix[0, 0] == 600.0
+    registry.invalidate(filename)
+    assert registry.sequence_geometry('seq01').camera_matrix[0, 0] == 900.0
+    assert registry.num_loads == 2
@@ -0,0 +1,158 @@
+import json
+import contextlib
+
+import numpy as np
+import pytest
+
+from macvi_usv_odce_toolkit.dataset import LarsSubset
+from macvi_usv_odce_toolkit import coco_adapter
+from macvi_usv_odce_toolkit import evaluation
+from macvi_usv_odce_toolkit import utils
+from macvi_usv_odce_toolkit import matching
+
+from conftest import _random_bbox, _synthetic_detection_results, _write_synthetic_lars_subset
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_frame_level_evaluation_matches_pycocotools(seed, tmpdir):
+    lars_path = str(tmpdir / "lars")
+    dataset = _write_synthetic_lars_subset(lars_path, "val", num_sequences=3, frames_per_sequence=5, seed=seed)
+    results = _synthetic_detection_results(dataset, seed=seed + 100)
+
+    rng = np.random.RandomState(seed)
+    if seed % 2:
+        # Exceed the per-frame detection limit in one of the frames
+        annotation = results["annotations"][rng.randint(len(results["annotations"]))]
+        annotation["detections"] += [{"id": 1000 + i, "bbox": _random_bbox(rng, 320, 240)} for i in range(150)]
+    else:
+        # Duplicated detections
+        for annotation in results["annotations"]:
+            annotation["detections"] = annotation["detections"] * 2
+
+    results_file = str(tmpdir / "results.json")
+    with open(results_file, "w") as fp:
+        json.dump(results, fp)
+
+    expected = evaluation.evaluate_detection_results(lars_path, "val", results_file)
+
+    subset = LarsSubset(lars_path, "val")
+    accumulator = matching.FScoreAccumulator()
+    for index, detections in enumerate(evaluation.pair_results_with_frames(subset, results)):
+        boxes = evaluation.detections_to_boxes(detections)
+        accumulator.add(evaluation.evaluate_frame_detections(subset, index, boxes, ignore_regions=False))
+
+    # Results must be bit-identical
+    assert accumulator.f_scores() == tuple(expected)
+
+
+def test_streaming_evaluation_partial_results(synthetic_lars_path, synthetic_results_file):
+    subset = LarsSubset(synthetic_lars_path, "val", cache_masks=False)
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+
+    expected = evaluation.evaluate_detection_results(synthetic_lars_path, "val", synthetic_results_file)
+
+    num_frames = 0
+    for frame_result, accumulator in evaluation.stream_detection_results(subset, results):
+        num_frames += 1
+        assert frame_result.index == num_frames - 1
+        assert accumulator.num_frames == num_frames
+        assert len(accumulator.f_scores()) == 4  # Partial F-scores are available at any point
+
+    assert num_frames == len(subset)
+    assert accumulator.f_scores() == tuple(expected)
+
+
+def test_in_memory_evaluation(synthetic_lars_path, synthetic_results_file):
+    subset = LarsSubset(synthetic_lars_path, "val", cache_masks=False)
+    with open(synthetic_results_file, "r") as fp:
+        results = json.load(fp)
+
+    expected = evaluation.evaluate_detection_results(synthetic_lars_path, "val", synthetic_results_file)
+
+    # Arrays of boxes, keyed by image ID
+    detections = {
+        entry["image_id"]: np.array([detection["bbox"] for detection in entry["detections"]]).reshape(-1, 4)
+        for entry in results["annotations"]
+    }
+    assert evaluation.evaluate_detections(subset, detections) == tuple(expected)
+
+    # Scores order the frame's detections; frames without detections can be omitted
+    rng = np.random.RandomState(0)
+    scored_detections = {}
+    for image_id, boxes in detections.items():
+        if not len(boxes):
+            continue
+        scores = np.linspace(1, 0, len(boxes))  # Original order
+        order = rng.permutation(len(boxes))
+        scored_detections[image_id] = {"boxes": boxes[order], "scores": scores[order]}
+    assert evaluation.evaluate_detections(subset, scored_detections) == tuple(expected)
+
+    with pytest.raises(ValueError):
+        evaluation.evaluate_detections(subset, {-1: np.zeros((0, 4))})
+
+
+def _pycocotools_class_f_scores(dataset_dict, results_list):
+    # Per-category F-scores from pycocotools, with categories kept on both sides
+    with contextlib.redirect_stdout(None):
+        coco_dataset = coco_adapter.LeanCOCO(dataset_dict)
+        coco_results = coco_dataset.loadRes(results_list)
+        coco_evaluation = coco_adapter.LeanCOCOeval(coco_dataset, coco_results, iouType='bbox')
+        coco_evaluation.params.iouThrs = np.array([0.3, 0.3])
+        coco_evaluation.evaluate()
+        coco_evaluation.accumulate()
+
+    f_scores = {}
+    for category_index, category_id in enumerate(coco_evaluation.params.catIds):
+        values = []
+        for area_index in range(len(matching.AREA_RANGES)):
+            stats = []
+            for name in ('precision', 'recall'):
+                s = coco_evaluation.eval[name][..., category_index, area_index, -1]
+                s = s[s > -1]
+                stats.append(np.mean(s) if len(s) else 0)
+            values.append(utils.f_score(*stats))
+        f_scores[category_id] = values
+    return f_scores
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_class_aware_evaluation_matches_pycocotools(seed, tmpdir):
+    lars_path = str(tmpdir / "lars")
+    dataset = _write_synthetic_lars_subset(lars_path, "val", num_sequences=3, frames_per_sequence=5, seed=seed)
+    results = _synthetic_detection_results(dataset, seed=seed + 100)
+
+    if seed % 2:
+        # Exceed the per-frame detection limit, overall and for one of the classes
+        rng = np.random.RandomState(seed)
+        annotation = results["annotations"][rng.randint(len(results["annotations"]))]
+        annotation["detections"] += [
+            {"id": 1000 + i, "bbox": _random_bbox(rng, 320, 240), "category_id": 1 if i < 120 else 2}
+            for i in range(150)
+        ]
+
+    results_file = str(tmpdir / "results.json")
+    with open(results_file, "w") as fp:
+        json.dump(results, fp)
+
+    subset = LarsSubset(lars_path, "val")
+    report = evaluation.evaluate_classes(subset, results)
+
+    # Class-agnostic F-scores are the official ones
+    assert tuple(report["f_scores"]) == tuple(evaluation.evaluate_detection_results(lars_path, "val", results_file))
+
+    # Per-class F-scores are bit-identical to those of pycocotools with categories
+    expected = _pycocotools_class_f_scores(*evaluation.convert_to_coco_structures(
+        lars_path,
+        "val",
+        results_file,
+        class_aware=True,
+    ))
+    assert [entry["category_id"] for entry in report["classes"]] == sorted(expected)
+    for entry in report["classes"]:
+        assert entry["f_scores"] == [float(value) for value in expected[entry["category_id"]]]
+
+    # Detections without category are rejected
+    results["annotations"][0]["detections"].append({"id": 9999, "bbox": [0, 0, 10, 10]})
+    with pytest.raises(ValueError, match="category_id"):
+        evaluation.evaluate_classes(subset, results)
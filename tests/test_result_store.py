@@ -0,0 +1,26 @@
+import os
+
+from macvi_usv_odce_toolkit import result_store
+
+
+def test_result_store_eviction(tmpdir):
+    filename = str(tmpdir / "store.sqlite")
+    keys = [result_store.make_key(f"{i:064x}", "val:0", {"iou_threshold": 0.3}) for i in range(5)]
+    assert len(set(keys)) == len(keys)
+    assert result_store.make_key(f"{0:064x}", "val:0", {"iou_threshold": 0.5}) != keys[0]
+
+    with result_store.ResultStore(filename, max_entries=3) as store:
+        for i, key in enumerate(keys[:3]):
+            store.put(key, [i, 0.5, 0.25, 0.125])
+
+        assert store.get(keys[0]) == [0, 0.5, 0.25, 0.125]  # Marks the entry as recently used
+        store.put(keys[3], [3, 0, 0, 0])
+        assert len(store) == 3
+        assert store.get(keys[1]) is None  # Least recently used entry was evicted
+        assert store.get(keys[0]) is not None
+
+    # Entries persist
+    assert os.path.isfile(filename)
+    with result_store.ResultStore(filename, max_entries=3) as store:
+        assert store.get(keys[3]) == [3, 0, 0, 0]
+        assert store.get(keys[4]) is None
@@ -0,0 +1,37 @@
+import collections
+
+import numpy as np
+
+from macvi_usv_odce_toolkit import sampling
+from macvi_usv_odce_toolkit.dataset import sequence_name
+
+
+class _Subset:
+    # Minimal stand-in for LarsSubset: sample_frames() only needs the frame annotations
+    def __init__(self, sequence_lengths):
+        self.annotations = [
+            {'image_id': len(sequence_lengths) * 1000 + frame, 'file_name': f"seq{sequence:02d}_{frame:05d}.png"}
+            for sequence, length in enumerate(sequence_lengths)
+            for frame in range(length)
+        ]
+
+
+def test_sample_frames_stratified():
+    dataset = _Subset([50, 30, 15, 5])
+
+    indices, strata = sampling.sample_frames(dataset, 0.2, seed=3)
+    assert len(indices) == 20
+    assert np.all(np.diff(indices) > 0)
+
+    # Proportional allocation per sequence
+    counts = collections.Counter(sequence_name(dataset.annotations[index]['file_name']) for index in indices)
+    assert [counts[f"seq{sequence:02d}"] for sequence in range(4)] == [10, 6, 3, 1]
+    assert np.array_equal(np.bincount(strata), [10, 6, 3, 1])
+
+    # Deterministic for a given seed
+    assert np.array_equal(sampling.sample_frames(dataset, 0.2, seed=3)[0], indices)
+    assert not np.array_equal(sampling.sample_frames(dataset, 0.2, seed=4)[0], indices)
+
+    assert sampling.sample_size(100, 7) == 7
+    assert sampling.sample_size(100, 1.0) == 100
+    assert sampling.sample_size(100, 0.001) == 1
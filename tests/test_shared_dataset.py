@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import signal
+import subprocess
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from macvi_usv_odce_toolkit.dataset import LarsSubset
+
+pytest.importorskip("multiprocessing.shared_memory", reason="Requires Python 3.8 or newer.")
+from macvi_usv_odce_toolkit.shared_dataset import SharedLarsSubset  # noqa: E402
+
+
+def _summarize_attached(manifest):
+    dataset = SharedLarsSubset.attach(manifest)
+    try:
+        ignore_mask = dataset.ignore_mask(1)
+        assert not ignore_mask.flags.writeable
+        return (
+            len(dataset),
+            dataset.annotations[-1]['file_name'],
+            dataset.frame_ground_truth(1)[0].tolist(),
+            int(ignore_mask.sum()),
+        )
+    finally:
+        dataset.close()
+
+
+def test_shared_dataset(synthetic_lars_path):
+    reference = LarsSubset(synthetic_lars_path, "val")
+
+    with SharedLarsSubset.create(synthetic_lars_path, "val") as dataset:
+        assert dataset.owner
+        assert dataset.annotations == reference.annotations
+        for index in range(len(reference)):
+            for shared, expected in zip(dataset.frame_ground_truth(index), reference.frame_ground_truth(index)):
+                assert np.array_equal(shared, expected)
+            assert np.array_equal(dataset.ignore_mask(index), reference.ignore_mask(index))
+        assert not dataset.gt_boxes.flags.writeable
+
+        # Attach from other processes; their exit must not remove the segment
+        with multiprocessing.get_context("spawn").Pool(2) as pool:
+            summaries = pool.map(_summarize_attached, [dataset.manifest] * 2)
+        assert summaries[0] == summaries[1] == (
+            len(reference),
+            reference.annotations[-1]['file_name'],
+            reference.frame_ground_truth(1)[0].tolist(),
+            int(reference.ignore_mask(1).sum()),
+        )
+        manifest = dataset.manifest
+        SharedLarsSubset.attach(manifest).close()
+
+    # The owner removes the segment
+    with pytest.raises(FileNotFoundError):
+        SharedLarsSubset.attach(manifest)
+
+
+# Owner process: publishes the subset, lets a forked worker attach to it, reports the segment name, and waits to be
+# killed
+_OWNER_SCRIPT = """
+import sys
+import time
+import multiprocessing
+
+from macvi_usv_odce_toolkit.shared_dataset import SharedLarsSubset
+
+def _attach(manifest):
+    SharedLarsSubset.attach(manifest).close()
+
+if __name__ == '__main__':
+    dataset = SharedLarsSubset.create(sys.argv[1], 'val')
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        pool.map(_attach, [dataset.manifest])
+    print(dataset.manifest['name'], flush=True)
+    time.sleep(60)
+"""
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm") or not hasattr(signal, "SIGKILL"), reason="Requires POSIX /dev/shm.")
+def test_shared_dataset_removed_when_owner_is_killed(synthetic_lars_path):
+    package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_path, os.environ.get("PYTHONPATH")])))
+    owner = subprocess.Popen(
+        [sys.executable, "-c", _OWNER_SCRIPT, synthetic_lars_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,  # Resource tracker warns about the leaked segment
+        env=env,
+    )
+    try:
+        segment_name = owner.stdout.readline().decode().strip().lstrip("/")
+        assert segment_name
+        segment_file = os.path.join("/dev/shm", segment_name)
+        assert os.path.exists(segment_file)
+    finally:
+        owner.kill()
+        owner.wait()
+
+    # The owner's resource tracker removes the segment, even though a worker has attached to it
+    deadline = time.monotonic() + 10
+    while os.path.exists(segment_file) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not os.path.exists(segment_file)
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+import pycocotools.mask
+
+from macvi_usv_odce_toolkit import mask_pyramid
+from macvi_usv_odce_toolkit import matching
+from macvi_usv_odce_toolkit import utils
+
+
+def _random_boxes(rng, count, integer):
+    xy = rng.uniform(0, 1920, size=(count, 2))
+    wh = rng.uniform(1, 200, size=(count, 2)) ** rng.uniform(0.5, 1.0, size=(count, 2))
+    boxes = np.concatenate([xy, wh], axis=1)
+    return np.round(boxes) if integer else boxes
+
+
+@pytest.mark.parametrize("integer", (False, True))
+def test_sparse_iou_matches_pycocotools(integer):
+    rng = np.random.RandomState(42)
+    boxes1 = _random_boxes(rng, 500, integer)
+    boxes2 = _random_boxes(rng, 700, integer)
+    iscrowd = rng.rand(len(boxes2)) < 0.1
+
+    expected = pycocotools.mask.iou(boxes1, boxes2, iscrowd.astype(int).tolist())
+
+    idx1, idx2, values = utils.compute_sparse_iou(boxes1, boxes2, iscrowd)
+    ious = np.zeros_like(expected)
+    ious[idx1, idx2] = values
+
+    assert np.array_equal(ious, expected)
+    assert len(values) == np.count_nonzero(expected)  # Only overlapping pairs are computed
+
+
+def test_pruned_frame_evaluation_matches_brute_force():
+    rng = np.random.RandomState(7)
+    gt_boxes = _random_boxes(rng, 2000, True)
+    gt_areas = gt_boxes[:, 2] * gt_boxes[:, 3] * rng.uniform(0.5, 1.0, size=len(gt_boxes))
+    gt_iscrowd = rng.rand(len(gt_boxes)) < 0.05
+    det_boxes = gt_boxes[rng.permutation(len(gt_boxes))[:100]] + rng.uniform(-5, 5, size=(100, 4))
+
+    brute_force = matching.compute_ious(det_boxes, gt_boxes, gt_iscrowd, prune=False)
+    pruned = matching.compute_ious(det_boxes, gt_boxes, gt_iscrowd, prune=True)
+    assert np.array_equal(pruned, brute_force)
+
+    gt_ignore = gt_iscrowd | (gt_areas > 96**2)
+    assert np.array_equal(
+        matching.match_detections(pruned, gt_ignore, gt_iscrowd),
+        matching.match_detections(brute_force, gt_ignore, gt_iscrowd),
+    )
+
+
+@pytest.mark.parametrize("integer", (False, True))
+def test_iou_matrix_matches_pycocotools(integer):
+    rng = np.random.RandomState(3)
+    boxes1 = _random_boxes(rng, 300, integer)
+    boxes2 = _random_boxes(rng, 400, integer)
+    boxes1[:50] = boxes2[:50] + rng.uniform(-3, 3, size=(50, 4))  # Ensure plenty of overlaps
+    iscrowd = rng.rand(len(boxes2)) < 0.1
+
+    expected = pycocotools.mask.iou(boxes1, boxes2, iscrowd.astype(int).tolist())
+
+    assert np.array_equal(utils.compute_iou_matrix(boxes1, boxes2, iscrowd), expected)
+    assert np.array_equal(utils.compute_iou_matrix(boxes1, boxes2, iscrowd, chunk_size=1000), expected)
+    assert np.allclose(utils.compute_iou_matrix(boxes1, boxes2, iscrowd, dtype=np.float32), expected, atol=1e-4)
+
+    thresholded = utils.compute_thresholded_iou_matrix(boxes1, boxes2, 0.3, iscrowd)
+    assert np.array_equal(thresholded, np.where(expected > 0.3, expected, 0))
+
+    # Thin wrappers
+    annotations = [{'bbox': box.tolist()} for box in boxes2[:20]]
+    assert utils.compute_iou_overlaps(boxes1[0].tolist(), annotations) == [
+        x if x > 0.3 else 0 for x in pycocotools.mask.iou(boxes1[:1], boxes2[:20], [0] * 20)[0].tolist()
+    ]
+    assert utils.compute_iou(boxes1[0].tolist(), boxes2[0].tolist()) == expected[0, 0]
+
+
+def test_iou_matrices_batched_over_frames():
+    rng = np.random.RandomState(5)
+    boxes1 = [_random_boxes(rng, rng.randint(0, 30), True) / 8 for _ in range(25)]
+    boxes2 = [_random_boxes(rng, rng.randint(0, 30), True) / 8 for _ in range(25)]
+    iscrowd = [rng.rand(len(boxes)) < 0.2 for boxes in boxes2]
+
+    for chunk_size in (None, 2000):
+        ious = utils.compute_iou_matrices(boxes1, boxes2, iscrowd, chunk_size=chunk_size)
+        for frame_boxes1, frame_boxes2, frame_iscrowd, frame_ious in zip(boxes1, boxes2, iscrowd, ious):
+            assert np.array_equal(frame_ious, utils.compute_iou_matrix(frame_boxes1, frame_boxes2, frame_iscrowd))
+
+
+@pytest.mark.parametrize("block_sizes", (mask_pyramid.DEFAULT_BLOCK_SIZES, (7, 3)))
+@pytest.mark.parametrize("dtype", (np.uint8, bool))
+def test_mask_pyramid_matches_bbox_in_mask(block_sizes, dtype):
+    rng = np.random.RandomState(11)
+    height, width = 203, 317  # Not a multiple of the block sizes
+    mask = np.zeros((height, width), dtype=dtype)
+    mask[:60, :] = 1
+    mask[100:180, 150:260] = 1
+    mask[60:100, :100] |= (rng.rand(40, 100) < 0.5).astype(dtype)  # Noisy region boundary
+
+    boxes = np.concatenate([
+        rng.uniform(-20, width, size=(300, 2)),
+        rng.uniform(0, 120, size=(300, 2)),
+    ], axis=1)
+    edge_cases = [
+        [150, 100, 110, 80],  # Exactly the ignore region
+        [150, 100, 110, 160],  # Half in the ignore region, half outside
+        [0, 0, width, height],  # Whole mask
+        [width - 5, height - 5, 50, 50],  # Beyond the border
+        [-3, 10, 20, 20],  # Negative coordinates
+        [10, 10, 0, 5],  # Empty boxes
+        [10, 10, 0.4, 5],
+        [2.5, 3.5, 10.5, 11.5],  # Rounded half to even
+    ]
+    boxes = np.concatenate([boxes, edge_cases])
+
+    for thr in (0.0, 0.5, 0.75, 1.0):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = np.array([utils.bbox_in_mask(mask, box, thr=thr) for box in boxes], dtype=bool)
+            pyramid = mask_pyramid.MaskPyramid(mask, block_sizes)
+            assert np.array_equal(pyramid.boxes_in_mask(boxes, thr=thr), expected)
+            assert np.array_equal(mask_pyramid.boxes_in_mask(mask, boxes, thr=thr, block_sizes=block_sizes), expected)
+        assert pyramid.num_exact_sums < len(boxes) // 4  # Most boxes are decided by the pyramid levels